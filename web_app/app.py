@@ -1,40 +1,67 @@
-from flask import Flask, render_template, request, jsonify
-import re
-import google.generativeai as genai
-import pandas as pd
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 from PIL import Image
 import io
 import json
+import logging
 import os
+import time
 from datetime import datetime
-import base64
 from dotenv import load_dotenv
 from flask_cors import CORS
+from werkzeug.datastructures import FileStorage
+
+# Load .env before importing modules that read their settings at import time
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+from modules.backends import create_backend_from_env
+from modules.classifier import (
+    AUTO_DOC_TYPE, CLASSIFY_MIN_CONFIDENCE, classification_prompt, classification_schema,
+    classify_locally, parse_classification, unclassified,
+)
+from modules.extraction_engine import extraction_engine
+from modules.document_crop import normalise_document
+from modules.image_decode import TARGET_SIZE, decode_upload, spool_upload
+from modules.image_encoding import encode_for_model
+from modules.job_queue import DEFAULT_JOB_DB_PATH, JobManager, JobStore, create_task_queue_from_env
+from modules.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ERRORS, PAYLOAD_BYTES, REQUEST_SECONDS, registry, timed
+from modules.model_provider import ModelProvider
+from modules.mrz import MRZ_DOC_TYPES, read_mrz
+from modules.page_ingest import PageUpload, UnreadableUpload, expand_pages
+from modules.quality import QualityRejected, screen_image
+from modules.rate_limit import create_governor_from_env, is_throttle_error
+from modules.request_log import (
+    configure_logging, current_request_id, new_request_id, request_id_bound, reset_request_id, set_request_id,
+)
+from modules.resilience import CallTimeout, create_caller_from_env
+from modules.result_cache import ExtractionCache, create_cache_from_env
+from modules.schemas import batch_schema, build_schema, coerce_record, parse_model_json, parse_stats
+
+configure_logging()
+logger = logging.getLogger("extract")
 
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_REQUEST_MB", "200")) * 1024 * 1024
 CORS(app)
 
-load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
-
 # Configure Gemini API - Using environment variable from .env file
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    print("✅ API key configured successfully")
-    
-    # Validate API key by testing basic connectivity
-    try:
-        test_response = model.generate_content("test")
-        print("✅ Gemini API connectivity verified")
-    except Exception as e:
-        print(f"❌ API key validation failed: {e}")
-        print("→ Verify your API key at https://aistudio.google.com/app/apikey")
-        model = None
-else:
-    print("❌ No API key found. Check your .env file for GEMINI_API_KEY")
-    model = None
+# The model is built lazily on first use; nothing here touches the network
+model_provider = ModelProvider(GEMINI_API_KEY)
+
+# Model calls go through a pluggable backend (EXTRACTION_BACKEND=gemini|fixture|fake)
+extraction_backend = create_backend_from_env(model_provider)
+if extraction_backend.name == "gemini" and not GEMINI_API_KEY:
+    logger.error("No API key found. Check your .env file for GEMINI_API_KEY")
+
+# Process-wide rate limit and adaptive concurrency for model calls
+call_governor = create_governor_from_env()
+
+# Per-call deadlines, jittered retries and optional hedging
+model_caller = create_caller_from_env()
+
+# Persistent result cache shared by all requests in this process
+result_cache = create_cache_from_env()
 
 # Define custom prompts for different document types
 PROMPTS = {
@@ -109,43 +136,479 @@ PROMPTS = {
 }
 
 
-def image_to_base64(image):
-    """Convert PIL image to base64 string"""
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+# Typed response schema per document type, derived from each prompt's JSON template
+RESPONSE_SCHEMAS = {doc_type: build_schema(prompt) for doc_type, prompt in PROMPTS.items()}
+STRUCTURED_OUTPUT = os.getenv("MODEL_STRUCTURED_OUTPUT", "true").strip().lower() in ("1", "true", "yes", "on")
 
+# Read passport MRZs locally and skip the model when every check digit validates and the caller
+# asked for mrz_only (needs tesseract, which is probed on the first passport)
+MRZ_FAST_PATH = os.getenv("MRZ_FAST_PATH", "true").strip().lower() in ("1", "true", "yes", "on")
 
-def extract_with_gemini(image, document_type):
-    """Extract data using Gemini 1.5 Flash"""
-    if model is None:
-        return {"error": "API not configured. Check server logs for details."}, False
-        
+
+def model_error_message(e):
+    """User-facing message for a failed model call or unparseable response"""
+    error_msg = str(e)
+    if "API_KEY_INVALID" in error_msg or "expired" in error_msg.lower():
+        return "API key invalid or expired. Please check your configuration."
+    elif isinstance(e, CallTimeout):
+        return "Model API timed out. Please retry."
+    elif is_throttle_error(e):
+        return "Model API rate limit reached. Please retry shortly."
+    elif "JSONDecodeError" in str(type(e)) or "ValueError" in str(type(e)):
+        return "Invalid response format from API"
+    else:
+        return f"API call failed: {error_msg}"
+
+
+def model_error_category(e):
+    """Metric label for a failed model call, mirroring model_error_message"""
+    error_msg = str(e)
+    if "API_KEY_INVALID" in error_msg or "expired" in error_msg.lower():
+        return "auth"
+    elif isinstance(e, CallTimeout):
+        return "timeout"
+    elif is_throttle_error(e):
+        return "rate_limit"
+    elif "JSONDecodeError" in str(type(e)) or "ValueError" in str(type(e)):
+        return "parse"
+    return "model"
+
+
+def encode_payload(image, purpose, **kwargs):
+    """Encode an image for the model as an inline part, recording encode time and payload size"""
+    with timed("encode"):
+        mime_type, payload, _ = encode_for_model(image, **kwargs)
+    PAYLOAD_BYTES.observe(len(payload), kind=purpose)
+    return {"mime_type": mime_type, "data": payload}
+
+
+def try_mrz_fast_path(image, document_type, mrz=None):
+    """Passport record read from a valid MRZ, or None when the model is needed
+
+    mrz is a record classification already read (False when it found no
+    valid zone), so the zone is not OCR'd twice.
+    The MRZ has no place of birth, issue date, authority or Japanese-only
+    fields; those come back as None and are listed under "fields_not_in_mrz".
+    """
+    if not MRZ_FAST_PATH or document_type not in MRZ_DOC_TYPES:
+        return None
+    if mrz is None:
+        with timed("mrz_ocr"):
+            mrz = read_mrz(image)
+    if not mrz:
+        return None
+    fields = RESPONSE_SCHEMAS[document_type]["properties"]
+    record = {field: mrz.get(field) for field in fields}
+    record["extraction_source"] = "mrz"
+    record["fields_not_in_mrz"] = [field for field in fields if record[field] is None]
+    return record
+
+
+def extract_with_gemini(image, document_type, use_cache=True, mrz=None, mrz_only=False):
+    """Extract data with the configured backend (Gemini 1.5 Flash by default), serving repeat images from the result cache
+
+    With mrz_only the caller needs just the MRZ fields, so a passport whose
+    MRZ validates skips the model.
+    """
     prompt = PROMPTS[document_type]
+    cache_key = ExtractionCache.make_key(image, document_type, prompt)
+    if use_cache:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached, True
+
+    mrz_record = try_mrz_fast_path(image, document_type, mrz) if mrz_only else None
+    if mrz_record is not None:
+        return mrz_record, True
+
+    if not extraction_backend.available:
+        ERRORS.inc(category="unconfigured")
+        return {"error": "API not configured. Check server logs for details."}, False
+
     try:
-        image_content = {"mime_type": "image/png", "data": image_to_base64(image)}
-        response = model.generate_content([prompt, image_content])
-        response_text = response.text.strip()
-        cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-        extracted_data = json.loads(cleaned_text)
+        image_content = encode_payload(image, "extract")
+        schema = RESPONSE_SCHEMAS[document_type]
+
+        def call_model(timeout):
+            with timed("model_call"):
+                return extraction_backend.generate(
+                    prompt, image_content, document_type, timeout=timeout,
+                    response_schema=schema if STRUCTURED_OUTPUT else None,
+                )
+
+        response_text = model_caller.call(call_model, slot=call_governor.slot)
+        with timed("parse"):
+            extracted_data = parse_model_json(response_text)
+        if isinstance(extracted_data, dict):
+            coerce_record(extracted_data, schema)
+            result_cache.put(cache_key, extracted_data)
         return extracted_data, True
     except Exception as e:
-        error_msg = str(e)
-        if "API_KEY_INVALID" in error_msg or "expired" in error_msg.lower():
-            return {"error": "API key invalid or expired. Please check your configuration."}, False
-        elif "JSONDecodeError" in str(type(e)) or "ValueError" in str(type(e)):
-            return {"error": "Invalid response format from API"}, False
-        else:
-            return {"error": f"API call failed: {error_msg}"}, False
+        ERRORS.inc(category=model_error_category(e))
+        logger.warning("Extraction failed", extra={"document_type": document_type, "error": str(e)})
+        return {"error": model_error_message(e)}, False
+
+
+# Document-type classification for doc_type=auto uploads
+CLASSIFY_PROMPT = classification_prompt(PROMPTS)
+CLASSIFY_SCHEMA = classification_schema(PROMPTS)
+CLASSIFY_PAYLOAD_MAX_BYTES = int(os.getenv("CLASSIFY_PAYLOAD_MAX_BYTES", "80000"))
+
+
+def classify_with_gemini(image, filename=None, use_cache=True):
+    """Pick the PROMPTS key for an image: local heuristics first, a small model call when they are unsure"""
+    local = classify_locally(image, filename)
+    if local is not None and local["confidence"] >= CLASSIFY_MIN_CONFIDENCE:
+        return local
+
+    cache_key = ExtractionCache.make_key(image, AUTO_DOC_TYPE, CLASSIFY_PROMPT)
+    if use_cache:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    if not extraction_backend.available:
+        return local or unclassified()
+
+    try:
+        image_content = encode_payload(image, "classify", max_bytes=CLASSIFY_PAYLOAD_MAX_BYTES)
+
+        def call_model(timeout):
+            with timed("classify_call"):
+                return extraction_backend.generate(
+                    CLASSIFY_PROMPT, image_content, AUTO_DOC_TYPE, timeout=timeout,
+                    response_schema=CLASSIFY_SCHEMA if STRUCTURED_OUTPUT else None,
+                )
+
+        classification = parse_classification(parse_model_json(model_caller.call(call_model, slot=call_governor.slot)), PROMPTS)
+    except Exception as e:
+        if local is None:
+            raise
+        ERRORS.inc(category="classification")
+        logger.warning("Classification model call failed, keeping the local guess", extra={"error": str(e)})
+        return local
+
+    if classification["document_type"] is None:
+        return local or classification
+    result_cache.put(cache_key, classification)
+    return classification
+
+
+# Images of the same document type packed into one model request (1 disables batching)
+MODEL_BATCH_SIZE = int(os.getenv("MODEL_BATCH_SIZE", "4"))
+
+BATCH_PROMPT_SUFFIX = """
+
+You will receive {count} separate document images, labelled "Image 1" to "Image {count}". Extract each image independently using the fields above and return ONLY a valid JSON array of exactly {count} objects in image order, no extra text or markdown. Add an "image_index" field (1 to {count}) to every object so it can be matched to its image."""
+
+
+def demultiplex_batch(parsed, count):
+    """Map a batched response back to its images; returns a list with None for unmatched slots"""
+    if isinstance(parsed, dict):
+        parsed = next((value for value in parsed.values() if isinstance(value, list)), None)
+    if not isinstance(parsed, list):
+        return [None] * count
+
+    records = [record for record in parsed if isinstance(record, dict)]
+    slots = [None] * count
+    indices = [record.get("image_index") for record in records]
+    if all(isinstance(i, int) and 1 <= i <= count for i in indices) and len(set(indices)) == len(indices):
+        for record in records:
+            slots[record["image_index"] - 1] = record
+    elif len(records) == count:
+        slots = records
+    for record in slots:
+        if record is not None:
+            record.pop("image_index", None)
+    return slots
+
+
+def extract_batch_with_gemini(images, document_type, use_cache=True, mrz_records=None, mrz_only=False):
+    """Extract several images of one document type in a single model request
+
+    Returns one (data, success) pair per image. Cached images and, with
+    mrz_only, passports read from their MRZ are skipped; any image the batched response does not
+    cover, or a batch whose response cannot be parsed, falls back to
+    individual calls. A failed batch call fails each of its images.
+    mrz_records lines up with images: zones already read during classification.
+    """
+    prompt = PROMPTS[document_type]
+    outcomes = [None] * len(images)
+    keys = [ExtractionCache.make_key(image, document_type, prompt) for image in images]
+    if use_cache:
+        for i, key in enumerate(keys):
+            cached = result_cache.get(key)
+            if cached is not None:
+                outcomes[i] = (cached, True)
+    for i, outcome in enumerate(outcomes):
+        if outcome is None and mrz_only:
+            mrz_record = try_mrz_fast_path(images[i], document_type, mrz_records[i] if mrz_records else None)
+            if mrz_record is not None:
+                outcomes[i] = (mrz_record, True)
+
+    pending = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    if len(pending) > 1 and extraction_backend.available:
+        image_parts = [encode_payload(images[i], "extract") for i in pending]
+        batch_prompt = prompt + BATCH_PROMPT_SUFFIX.format(count=len(pending))
+        schema = RESPONSE_SCHEMAS[document_type]
+
+        def call_model(timeout):
+            with timed("batch_model_call"):
+                return extraction_backend.generate_batch(
+                    batch_prompt, image_parts, document_type, timeout=timeout,
+                    response_schema=batch_schema(schema) if STRUCTURED_OUTPUT else None,
+                )
+
+        try:
+            response_text = model_caller.call(call_model, slot=call_governor.slot)
+        except Exception as e:
+            # The call already had its retries; repeating it image by image would only multiply the load
+            ERRORS.inc(category=model_error_category(e))
+            logger.warning("Batched extraction failed", extra={"document_type": document_type, "error": str(e)})
+            for i in pending:
+                outcomes[i] = ({"error": model_error_message(e)}, False)
+            return outcomes
+        try:
+            with timed("parse"):
+                records = demultiplex_batch(parse_model_json(response_text), len(pending))
+        except ValueError as e:
+            ERRORS.inc(category="batch_fallback")
+            logger.warning("Unparseable batch response, falling back to single calls", extra={"error": str(e)})
+            records = [None] * len(pending)
+        for i, record in zip(pending, records):
+            if record is not None:
+                coerce_record(record, schema)
+                result_cache.put(keys[i], record)
+                outcomes[i] = (record, True)
+
+    # The fast path has already run on every image left here
+    for i, outcome in enumerate(outcomes):
+        if outcome is None:
+            outcomes[i] = extract_with_gemini(images[i], document_type, use_cache=False)
+    return outcomes
 
 
 def preprocess_image(image):
-    """Preprocess image for better analysis"""
-    if image.mode != "RGB":
-        image = image.convert("RGB")
-    max_size = (1024, 1024)
-    image.thumbnail(max_size, Image.LANCZOS)
-    return image
+    """Orient, crop and deskew the document, then resize to the pixel budget; returns (image, crop info)"""
+    image, crop = normalise_document(image, max(TARGET_SIZE))
+    image.thumbnail(TARGET_SIZE, Image.LANCZOS)
+    return image, crop
+
+
+def prepare_upload(file):
+    """Decode (or rasterise, for a document page), preprocess and quality-screen an upload
+
+    Returns (image, decode_stats), with the quality scores under
+    decode_stats["quality"]; raises QualityRejected for unusable images.
+    """
+    if isinstance(file, UnreadableUpload):
+        raise file.error
+    with timed("decode"):
+        if isinstance(file, PageUpload):
+            image, decode_stats = file.render()
+        else:
+            image, decode_stats = decode_upload(file.stream)
+    PAYLOAD_BYTES.observe(decode_stats["upload_bytes"], kind="upload")
+    # Screened before cropping: unusable images skip the crop, and fill is measured against the whole frame
+    with timed("quality"):
+        decode_stats["quality"] = screen_image(image)
+    with timed("preprocess"):
+        image, decode_stats["crop"] = preprocess_image(image)
+    return image, decode_stats
+
+
+def file_ref(file):
+    """Filename, plus page provenance for pages of a multi-page document"""
+    ref = {"filename": file.filename}
+    if isinstance(file, PageUpload):
+        ref.update(file.provenance())
+    return ref
+
+
+def build_result(file, doc_type, extracted_data, success, decode_stats):
+    """Shape one file's extraction outcome into the /extract response entry"""
+    if success:
+        if isinstance(extracted_data, dict):
+            extracted_data["document_type"] = doc_type
+            extracted_data.update(file_ref(file))
+            extracted_data["quality"] = decode_stats.pop("quality", None)
+            extracted_data["decode_stats"] = decode_stats
+            extracted_data["timestamp"] = datetime.now().strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+            return extracted_data
+        ERRORS.inc(category="parse")
+        return dict(file_ref(file), error="Invalid data format")
+    return dict(file_ref(file), error=extracted_data.get("error", "Failed to extract data"))
+
+
+def error_result(file, e):
+    result = dict(file_ref(file), error=str(e))
+    if isinstance(e, QualityRejected):
+        result["quality"] = e.scores
+        ERRORS.inc(category="quality")
+    elif isinstance(e, (ValueError, OSError)):
+        ERRORS.inc(category="invalid_upload")
+    else:
+        ERRORS.inc(category="internal")
+        logger.exception("Unexpected error processing %s", file.filename, exc_info=e)
+    return result
+
+
+def unclassified_result(file, classification):
+    ERRORS.inc(category="unclassified")
+    return dict(
+        file_ref(file),
+        error="Could not determine the document type; choose it explicitly and retry",
+        classification=classification,
+    )
+
+
+def process_uploaded_file(file, doc_type, use_cache=True, mrz_only=False):
+    """Decode, preprocess and extract a single uploaded file (classifying it first for doc_type=auto)"""
+    try:
+        image, decode_stats = prepare_upload(file)
+        classification = None
+        if doc_type == AUTO_DOC_TYPE:
+            classification = classify_with_gemini(image, file.filename, use_cache)
+            if classification["document_type"] is None:
+                return unclassified_result(file, classification)
+            doc_type = classification["document_type"]
+        # Classification always reads the MRZ first; without a record there is none worth reading again
+        mrz = classification.pop("mrz_record", False) if classification else None
+        extracted_data, success = extract_with_gemini(image, doc_type, use_cache, mrz=mrz, mrz_only=mrz_only)
+        result = build_result(file, doc_type, extracted_data, success, decode_stats)
+        if classification is not None:
+            result["classification"] = classification
+        return result
+    except Exception as e:
+        return error_result(file, e)
+
+
+def prepare_group(files):
+    """Decode a group of uploads, starting every page rasterisation before waiting on any"""
+    for file in files:
+        if isinstance(file, PageUpload):
+            file.prefetch()
+    prepared = []
+    for file in files:
+        try:
+            prepared.append(prepare_upload(file))
+        except Exception as e:
+            prepared.append(e)
+    return prepared
+
+
+def iter_extract_uploads(uploads, doc_type, use_cache=True, mrz_only=False):
+    """Yield (upload index, result) as files finish
+
+    uploads may include PageUpload items from expand_pages. With
+    MODEL_BATCH_SIZE > 1 or doc_type=auto, uploads are grouped by document
+    type and sent in groups of up to MODEL_BATCH_SIZE images per model
+    request, with the groups running concurrently. Each group decodes its
+    own images, so only the groups in flight are held in memory; auto
+    batches decode and classify everything first and keep the images until
+    their group has run.
+    """
+    if doc_type != AUTO_DOC_TYPE and (MODEL_BATCH_SIZE <= 1 or len(uploads) <= 1):
+        yield from extraction_engine.iter_completed(
+            lambda file: process_uploaded_file(file, doc_type, use_cache, mrz_only), uploads, on_error=error_result
+        )
+        return
+
+    images = {}
+    classifications = {}
+    mrz_records = {}
+    by_type = {doc_type: list(range(len(uploads)))}
+    if doc_type == AUTO_DOC_TYPE:
+        by_type = {}
+
+        def prepare_and_classify(i):
+            image, decode_stats = prepare_upload(uploads[i])
+            return image, decode_stats, classify_with_gemini(image, uploads[i].filename, use_cache)
+
+        outcomes = extraction_engine.map(prepare_and_classify, range(len(uploads)), on_error=lambda i, e: e)
+        for i, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                yield i, error_result(uploads[i], outcome)
+            elif outcome[2]["document_type"] is None:
+                yield i, unclassified_result(uploads[i], outcome[2])
+            else:
+                images[i] = outcome[:2]
+                mrz_records[i] = outcome[2].pop("mrz_record", False)
+                classifications[i] = outcome[2]
+                by_type.setdefault(outcome[2]["document_type"], []).append(i)
+
+    def run_group(typed_group):
+        group_type, group = typed_group
+        pending = [i for i in group if i not in images]
+        for i, outcome in zip(pending, prepare_group([uploads[i] for i in pending])):
+            images[i] = outcome
+
+        results = []
+        ready = []
+        for i in group:
+            if isinstance(images[i], Exception):
+                results.append((i, error_result(uploads[i], images.pop(i))))
+            else:
+                ready.append(i)
+        outcomes = extract_batch_with_gemini(
+            [images[i][0] for i in ready], group_type, use_cache, [mrz_records.pop(i, None) for i in ready], mrz_only
+        )
+        for i, (data, success) in zip(ready, outcomes):
+            result = build_result(uploads[i], group_type, data, success, images.pop(i)[1])
+            if i in classifications:
+                result["classification"] = classifications[i]
+            results.append((i, result))
+        return results
+
+    def on_group_error(typed_group, e):
+        for i in typed_group[1]:
+            images.pop(i, None)
+            mrz_records.pop(i, None)
+        return [(i, error_result(uploads[i], e)) for i in typed_group[1]]
+
+    size = max(1, MODEL_BATCH_SIZE)
+    groups = [
+        (group_type, indexes[k:k + size])
+        for group_type, indexes in by_type.items()
+        for k in range(0, len(indexes), size)
+    ]
+    for _, group_results in extraction_engine.iter_completed(run_group, groups, on_error=on_group_error):
+        yield from group_results
+
+
+@app.before_request
+def start_request():
+    g.request_started = time.perf_counter()
+    g.request_id_token = set_request_id(new_request_id(request.headers.get("X-Request-ID")))
+
+
+@app.after_request
+def finish_request(response):
+    """Echo the request id and observe the total time once the body (streamed or not) has been sent"""
+    request_id = current_request_id()
+    response.headers["X-Request-ID"] = request_id
+    started = g.get("request_started", time.perf_counter())
+    endpoint, method, path, status = request.endpoint or "unmatched", request.method, request.path, response.status_code
+
+    def observe():
+        elapsed = time.perf_counter() - started
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=status)
+        if endpoint not in ("metrics", "health", "static"):
+            with request_id_bound(request_id):
+                logger.info("Request finished", extra={
+                    "method": method, "path": path, "status": status, "duration_ms": round(elapsed * 1000, 1),
+                })
+
+    response.call_on_close(observe)
+    return response
+
+
+@app.teardown_request
+def end_request(_exc):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        reset_request_id(token)
 
 
 @app.route("/")
@@ -153,60 +616,183 @@ def index():
     return render_template("index.html", doc_types=PROMPTS.keys())
 
 
-@app.route("/extract", methods=["POST"])
-def extract():
-    print(f"DEBUG: Inside /extract. GEMINI_API_KEY: {GEMINI_API_KEY[:5]}..., Model: {model}")
+STREAM_MIMETYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+def requested_stream_format():
+    """Streaming format asked for via ?stream=sse|ndjson or the Accept header, else None"""
+    stream_format = (request.args.get("stream") or request.form.get("stream") or "").lower()
+    if stream_format in STREAM_MIMETYPES:
+        return stream_format
+    accept = request.headers.get("Accept", "")
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    return None
+
+
+def stream_results(completed, total, stream_format):
+    """Emit each file's result as soon as it finishes, tagged with its upload index"""
+    for index, result in completed:
+        payload = json.dumps({"index": index, "total": total, "result": result}, ensure_ascii=False)
+        if stream_format == "sse":
+            yield f"event: result\ndata: {payload}\n\n"
+        else:
+            yield payload + "\n"
+    if stream_format == "sse":
+        yield f"event: done\ndata: {json.dumps({'total': total})}\n\n"
+
+
+def parse_extract_request():
+    """Validate an extraction upload; returns (uploads, doc_type, use_cache, mrz_only, error_response)"""
     if "file" not in request.files:
-        return jsonify({"error": "No file part"}), 400
+        return None, None, None, None, (jsonify({"error": "No file part"}), 400)
     files = request.files.getlist("file")
     if not files or all(file.filename == "" for file in files):
-        return jsonify({"error": "No selected files"}), 400
+        return None, None, None, None, (jsonify({"error": "No selected files"}), 400)
 
     doc_type = request.form.get("doc_type")
-    if not doc_type or doc_type not in PROMPTS:
-        return jsonify({"error": "Invalid document type"}), 400
+    if not doc_type or (doc_type not in PROMPTS and doc_type != AUTO_DOC_TYPE):
+        return None, None, None, None, (jsonify({"error": "Invalid document type"}), 400)
 
-    results = []
+    use_cache = request.form.get("no_cache", "").lower() not in ("1", "true", "yes")
+    mrz_only = request.form.get("mrz_only", "").lower() in ("1", "true", "yes")
+    uploads = [file for file in files if file.filename]
+    return uploads, doc_type, use_cache, mrz_only, None
 
-    for file in files:
-        if file.filename:
-            try:
-                image = Image.open(file.stream)
-                image = preprocess_image(image)
-
-                extracted_data, success = extract_with_gemini(image, doc_type)
-
-                if success:
-                    if isinstance(extracted_data, dict):
-                        extracted_data["document_type"] = doc_type
-                        extracted_data["filename"] = file.filename
-                        extracted_data["timestamp"] = datetime.now().strftime(
-                            "%Y-%m-%d %H:%M:%S"
-                        )
-                        results.append(extracted_data)
-                    else:
-                        results.append(
-                            {"filename": file.filename, "error": "Invalid data format"}
-                        )
-                else:
-                    results.append(
-                        {
-                            "filename": file.filename,
-                            "error": extracted_data.get(
-                                "error", "Failed to extract data"
-                            ),
-                        }
-                    )
-            except Exception as e:
-                results.append({"filename": file.filename, "error": str(e)})
+
+@app.route("/extract", methods=["POST"])
+def extract():
+    uploads, doc_type, use_cache, mrz_only, error_response = parse_extract_request()
+    if error_response:
+        return error_response
+    logger.info("Extraction requested", extra={"doc_type": doc_type, "files": len(uploads), "backend": extraction_backend.name})
+
+    stream_format = requested_stream_format()
+    if stream_format:
+        # The response outlives the view, so detach uploads from the request body first
+        uploads = expand_pages([spool_upload(file) for file in uploads])
+        completed = iter_extract_uploads(uploads, doc_type, use_cache, mrz_only)
+        return Response(
+            stream_with_context(stream_results(completed, len(uploads), stream_format)),
+            mimetype=STREAM_MIMETYPES[stream_format],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    uploads = expand_pages(uploads)
+    results = [None] * len(uploads)
+    for index, result in iter_extract_uploads(uploads, doc_type, use_cache, mrz_only):
+        results[index] = result
 
     return jsonify(results)
 
 
+def process_queued_file(filename, data, doc_type, use_cache):
+    """Job worker entry point: run the /extract pipeline on spooled upload bytes
+
+    A multi-page document stays one job file, with one result per page under "pages".
+    """
+    items = expand_pages([FileStorage(stream=io.BytesIO(data), filename=filename)])
+    if len(items) == 1 and not isinstance(items[0], PageUpload):
+        return process_uploaded_file(items[0], doc_type, use_cache)
+    pages = [process_uploaded_file(item, doc_type, use_cache) for item in items]
+    return {"filename": filename, "page_count": len(pages), "pages": pages}
+
+
+job_manager = JobManager(
+    process_queued_file,
+    task_queue=create_task_queue_from_env(),
+    store=JobStore(
+        os.getenv("JOB_DB_PATH", DEFAULT_JOB_DB_PATH),
+        stale_seconds=int(os.getenv("JOB_STALE_SECONDS", "3600")),
+    ),
+    workers=int(os.getenv("JOB_WORKERS", str(extraction_engine.max_workers))),
+)
+
+
+@app.route("/extract/jobs", methods=["POST"])
+def submit_extract_job():
+    """Queue a batch for background extraction and return its job id immediately
+
+    Jobs always run the full extraction; mrz_only applies to /extract.
+    """
+    uploads, doc_type, use_cache, _, error_response = parse_extract_request()
+    if error_response:
+        return error_response
+
+    job_id = job_manager.submit(
+        doc_type, [(file.filename, file.read()) for file in uploads], use_cache
+    )
+    return jsonify({
+        "job_id": job_id,
+        "status_url": f"/extract/jobs/{job_id}",
+        "total": len(uploads),
+    }), 202
+
+
+@app.route("/extract/jobs/<job_id>")
+def extract_job_status(job_id):
+    """Per-file progress and results of a queued extraction job"""
+    job = job_manager.status(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route("/health")
+def health():
+    """Cached backend connectivity check; 503 when the API is unreachable or unconfigured"""
+    status = extraction_backend.health()
+    return jsonify(status), 200 if status["status"] == "ok" else 503
+
+
+@app.route("/api/limits")
+def model_limits():
+    """Current model-call concurrency limit, queue depth, rate budget, retry/hedge and parse counters"""
+    return jsonify(dict(call_governor.snapshot(), resilience=model_caller.stats(), parsing=parse_stats()))
+
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    """Hit/miss counters and size of the extraction result cache"""
+    return jsonify(result_cache.stats())
+
+
+def pipeline_counters():
+    """Existing cache, governor, retry and parser counters, read at scrape time"""
+    cache = result_cache.stats()
+    limits = call_governor.snapshot()
+    calls = model_caller.stats()
+    yield "cache_lookups", "counter", "Result cache lookups by outcome", [
+        ({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"]),
+    ]
+    yield "cache_entries", "gauge", "Entries in the result cache", [({}, cache["entries"])]
+    yield "model_calls_in_flight", "gauge", "Model calls currently running", [({}, limits["in_flight"])]
+    yield "model_call_queue_depth", "gauge", "Model calls waiting for a concurrency slot", [({}, limits["queue_depth"])]
+    yield "model_concurrency_limit", "gauge", "Current adaptive concurrency limit", [({}, limits["concurrency_limit"])]
+    yield "model_throttled", "counter", "Model calls rejected by the provider rate limit", [({}, limits["throttled_total"])]
+    yield "model_call_events", "counter", "Model call attempts, retries, timeouts and hedges", [
+        ({"event": event}, calls[event]) for event in ("attempts", "retries", "timeouts", "hedges", "hedge_wins")
+    ]
+    yield "json_parse", "counter", "Model responses by JSON parse outcome", [
+        ({"outcome": outcome}, count) for outcome, count in parse_stats().items()
+    ]
+
+
+registry.register_collector(pipeline_counters)
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage and request latencies, errors, payload sizes and pipeline counters"""
+    return Response(registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 # Import and register new API endpoints
 from modules.api_endpoints import register_routes
 
-register_routes(app)
+register_routes(app, extract_uploads=iter_extract_uploads, document_types=PROMPTS)
 
 # Create necessary directories
 os.makedirs("generated_forms", exist_ok=True)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark /extract batch wall-clock time against a fake model with injected latency
+
+Concurrent time does not reach 1x latency. It is bounded below by
+ceil(files / workers) model rounds plus the per-file decode/crop/encode work,
+which is CPU-bound and holds the GIL, so it adds up across files rather than
+overlapping (one core, 8 files at 1 s: 8.8x sequential, 1.7x concurrent with
+8 workers, 2.5x with the default EXTRACT_MAX_WORKERS=4). The zero-latency run
+printed first measures that local share.
+
+Usage (from web_app/):
+    python bench/bench_concurrent_extract.py --files 8 --latency 0.5
+"""
+
+import argparse
+import io
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["GEMINI_API_KEY"] = ""  # never touch the real API from a benchmark
+os.environ["EXTRACTION_CACHE_ENABLED"] = "false"  # measure model calls, not cache hits
+os.environ["MODEL_BATCH_SIZE"] = "1"  # one call per file, so only concurrency is measured
+os.environ["MODEL_CONCURRENCY_INITIAL"] = "16"  # start the AIMD limiter above the pool size
+os.environ["QUALITY_GATE_ENABLED"] = "false"  # the synthetic flat-colour images would all be rejected
+
+from PIL import Image
+
+import app as web_app
+from modules.backends import FakeBackend
+from modules.extraction_engine import ExtractionEngine
+
+
+def make_upload(index):
+    image = Image.new("RGB", (1600, 1000), (200, 200 - index % 50, 180))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    buffer.seek(0)
+    return buffer, f"passport_{index}.jpg"
+
+
+def run_batch(client, file_count):
+    data = {
+        "doc_type": "US Passport",
+        "file": [make_upload(i) for i in range(file_count)],
+    }
+    start = time.perf_counter()
+    response = client.post("/extract", data=data, content_type="multipart/form-data")
+    elapsed = time.perf_counter() - start
+    results = response.get_json()
+    assert response.status_code == 200, response.status_code
+    assert [r["filename"] for r in results] == [f"passport_{i}.jpg" for i in range(file_count)]
+    return elapsed, sum(1 for r in results if "error" not in r)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to --files")
+    args = parser.parse_args()
+
+    client = web_app.app.test_client()
+    workers = args.workers or args.files
+
+    web_app.extraction_backend = FakeBackend(latency_ms=0)
+    web_app.extraction_engine = ExtractionEngine(max_workers=1)
+    local, _ = run_batch(client, args.files)
+    web_app.extraction_engine.shutdown()
+
+    web_app.extraction_backend = FakeBackend(latency_ms=args.latency * 1000)
+    print(f"{args.files} files, {args.latency:.2f}s fake model latency; "
+          f"{local:.2f}s of local pipeline work per batch with an instant model")
+    for label, max_workers in (("sequential", 1), (f"concurrent x{workers}", workers)):
+        web_app.extraction_engine = ExtractionEngine(max_workers=max_workers)
+        elapsed, ok = run_batch(client, args.files)
+        web_app.extraction_engine.shutdown()
+        rounds = math.ceil(args.files / max_workers)
+        print(f"  {label:<16} {elapsed:6.2f}s  ({elapsed / args.latency:4.1f}x latency, {rounds} model rounds, "
+              f"{ok}/{args.files} ok)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmark document crop/deskew against the legacy whole-frame thumbnail
+
+Synthetic fixtures place a passport data page on a textured table at a
+random perspective, covering about 30% of the frame (some rotated by 90
+degrees), plus tight scans where the page is the whole frame and the
+portrait photo is the largest rectangle in it; those must not be cropped. For each pipeline and pixel budget the script reports preprocess
+time, payload bytes, how many payload pixels land on the document and the
+PSNR of the rectified document against the pristine page (a pixel-level
+proxy for field legibility, measured after fine registration). --live also sends every payload through the
+configured extraction backend and scores the fields against ground truth.
+
+Usage (from web_app/):
+    python bench/bench_document_crop.py [--count 8] [--tight 4] [--budgets 1024,768,640] [--live]
+    python bench/bench_document_crop.py --fixtures DIR   # photos, optional <name>.json ground truth
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from modules.document_crop import cv2, normalise_document
+from modules.image_encoding import encode_for_model
+
+PAGE_SIZE = (1250, 880)  # TD3 data page, 125 x 88 mm at 10 px/mm
+SCORED_FIELDS = ("passport_number", "surname", "given_names", "date_of_birth", "date_of_expiration")
+
+
+def render_page(rng):
+    """Pristine data page plus the field values printed on it"""
+    truth = {
+        "passport_number": f"{rng.randrange(10**8, 10**9)}",
+        "surname": rng.choice(["DOE", "TANAKA", "GARCIA", "NGUYEN", "MUELLER"]),
+        "given_names": rng.choice(["JANE", "HIROSHI", "MARIA ELENA", "AN", "LUKAS"]),
+        "date_of_birth": f"{rng.randrange(1950, 2005)}-0{rng.randrange(1, 10)}-1{rng.randrange(0, 10)}",
+        "date_of_expiration": f"{rng.randrange(2026, 2036)}-0{rng.randrange(1, 10)}-2{rng.randrange(0, 9)}",
+    }
+    page = Image.new("RGB", PAGE_SIZE, (232, 226, 210))
+    draw = ImageDraw.Draw(page)
+    label, value = ImageFont.load_default(size=20), ImageFont.load_default(size=34)
+    draw.rectangle((50, 150, 380, 600), fill=(rng.randrange(110, 190), 130, 120))
+    draw.text((50, 40), "PASSPORT", font=ImageFont.load_default(size=48), fill=(30, 40, 90))
+    rows = [("Passport No.", truth["passport_number"]), ("Surname", truth["surname"]),
+            ("Given names", truth["given_names"]), ("Date of birth", truth["date_of_birth"]),
+            ("Date of expiration", truth["date_of_expiration"])]
+    for row, (name, text) in enumerate(rows):
+        y = 150 + row * 90
+        draw.text((430, y), name, font=label, fill=(90, 90, 110))
+        draw.text((430, y + 26), text, font=value, fill=(15, 15, 25))
+    mrz = f"P<USA{truth['surname']}<<{truth['given_names'].replace(' ', '<')}".ljust(44, "<")
+    draw.text((50, 700), mrz, font=value, fill=(0, 0, 0))
+    draw.text((50, 760), f"{truth['passport_number']}<USA".ljust(44, "<"), font=value, fill=(0, 0, 0))
+    return page, truth
+
+
+def _perspective_coeffs(source, target):
+    """PIL PERSPECTIVE coefficients mapping target (output) points back to source points"""
+    matrix = []
+    for (x, y), (u, v) in zip(target, source):
+        matrix.append([x, y, 1, 0, 0, 0, -u * x, -u * y])
+        matrix.append([0, 0, 0, x, y, 1, -v * x, -v * y])
+    return np.linalg.solve(np.array(matrix, dtype=float), np.array(source, dtype=float).ravel())
+
+
+def photograph(page, rng, frame=(3000, 2250), coverage=0.3, rotate=False):
+    """Page lying on a table, seen at a slight angle; returns (photo, page corners in the photo)"""
+    if rotate:
+        page = page.transpose(Image.ROTATE_90)
+    noise = Image.effect_noise(frame, 60).convert("RGB")
+    table = Image.blend(Image.new("RGB", frame, (120, 85, 60)), noise, 0.3)
+
+    width = math.sqrt(coverage * frame[0] * frame[1] * page.width / page.height)
+    height = width * page.height / page.width
+    cx, cy = frame[0] / 2 + rng.uniform(-300, 300), frame[1] / 2 + rng.uniform(-200, 200)
+    jitter = lambda: (rng.uniform(-0.06, 0.06) * width, rng.uniform(-0.06, 0.06) * height)
+    corners = []
+    for sx, sy in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+        dx, dy = jitter()
+        corners.append((cx + sx * width / 2 + dx, cy + sy * height / 2 + dy))
+
+    source = [(0, 0), (page.width, 0), (page.width, page.height), (0, page.height)]
+    warped = page.transform(frame, Image.PERSPECTIVE, _perspective_coeffs(source, corners), Image.BICUBIC)
+    mask = Image.new("L", page.size, 255).transform(frame, Image.PERSPECTIVE, _perspective_coeffs(source, corners))
+    table.paste(warped, (0, 0), mask)
+    return table.filter(ImageFilter.GaussianBlur(0.7)), corners
+
+
+def legacy_preprocess(image, budget):
+    image = image.convert("RGB")
+    image.thumbnail((budget, budget), Image.LANCZOS)
+    return image
+
+
+def crop_preprocess(image, budget):
+    image, info = normalise_document(image, budget)
+    image.thumbnail((budget, budget), Image.LANCZOS)
+    return image, info
+
+
+def polygon_area(points):
+    xs, ys = zip(*points)
+    return abs(sum(xs[i] * ys[i - 1] - xs[i - 1] * ys[i] for i in range(len(points)))) / 2
+
+
+def psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)) ** 2)
+    return 99.0 if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def aligned_psnr(rectified, page):
+    """PSNR after an ECC homography refinement, so a pixel or two of misregistration
+    (harmless for reading text) does not swamp the resolution loss being measured"""
+    reference = np.asarray(page.convert("L"), dtype=np.float32)
+    candidate = np.asarray(rectified.convert("L"), dtype=np.float32)
+    if cv2 is not None:
+        warp = np.eye(3, dtype=np.float32)
+        criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 100, 1e-6)
+        try:
+            _, warp = cv2.findTransformECC(reference, candidate, warp, cv2.MOTION_HOMOGRAPHY, criteria, None, 5)
+            candidate = cv2.warpPerspective(candidate, warp, page.size, flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP)
+        except cv2.error:
+            pass
+    # Score the interior: a few pixels of table at the outline say nothing about legibility
+    my, mx = int(0.02 * reference.shape[0]), int(0.02 * reference.shape[1])
+    return psnr(candidate[my:-my, mx:-mx], reference[my:-my, mx:-mx])
+
+
+def rectified_psnr(payload, frame_size, corners, page):
+    """Warp the page region of a whole-frame payload (using the true corners) and compare to the page"""
+    scale = payload.width / frame_size[0]
+    target = [(0, 0), (page.width, 0), (page.width, page.height), (0, page.height)]
+    scaled = [(x * scale, y * scale) for x, y in corners]
+    rectified = payload.transform(page.size, Image.PERSPECTIVE, _perspective_coeffs(scaled, target), Image.BICUBIC)
+    return aligned_psnr(rectified, page)
+
+
+def cropped_psnr(payload, info, corners, page):
+    """Map a cropped payload back onto the page through its detected corners and compare to the page
+
+    Both pipelines are scored the same way, at page resolution, from the
+    corners each one actually used.
+    """
+    photo_to_page = np.linalg.inv(np.append(_perspective_coeffs(corners, _page_corners(page)), 1).reshape(3, 3))
+    # Reported corners are pixel centres; the page geometry uses pixel edges
+    detected = np.hstack([np.array(info["corners"], dtype=float) + 0.5, np.ones((4, 1))]) @ photo_to_page.T
+    detected = [(x / w, y / w) for x, y, w in detected]
+    if info["rotation"]:
+        payload = payload.rotate(-info["rotation"], expand=True)
+    rectified = payload.transform(page.size, Image.PERSPECTIVE, _perspective_coeffs(_page_corners(payload), detected), Image.BICUBIC)
+    return aligned_psnr(rectified, page)
+
+
+def _page_corners(image):
+    return [(0, 0), (image.width, 0), (image.width, image.height), (0, image.height)]
+
+
+def field_accuracy(extracted, truth):
+    hits = sum(1 for field in SCORED_FIELDS if str(extracted.get(field, "")).strip().upper() == truth[field].upper())
+    return hits / len(SCORED_FIELDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--tight", type=int, default=4, help="tightly framed scans (page fills the frame)")
+    parser.add_argument("--budgets", default="1024,768,640")
+    parser.add_argument("--fixtures", help="directory of real photos (optional <name>.json ground truth)")
+    parser.add_argument("--live", action="store_true", help="score extracted fields with the configured backend")
+    args = parser.parse_args()
+    budgets = [int(b) for b in args.budgets.split(",")]
+
+    extract = None
+    if args.live:
+        import app as web_app
+        extract = lambda image: web_app.extract_with_gemini(image, "US Passport", use_cache=False)[0]
+
+    fixtures = []
+    if args.fixtures:
+        for name in sorted(os.listdir(args.fixtures)):
+            try:
+                photo = Image.open(os.path.join(args.fixtures, name))
+                photo.load()
+            except OSError:
+                continue
+            truth_path = os.path.join(args.fixtures, os.path.splitext(name)[0] + ".json")
+            truth = None
+            if os.path.exists(truth_path):
+                with open(truth_path, encoding="utf-8") as f:
+                    truth = json.load(f)
+            fixtures.append({"name": name, "photo": photo, "page": None, "truth": truth})
+    else:
+        rng = random.Random(11)
+        for i in range(args.count):
+            page, truth = render_page(rng)
+            rotated = i % 4 == 3
+            photo, corners = photograph(page, rng, rotate=rotated)
+            fixtures.append({
+                "name": f"synthetic_{i}", "photo": photo, "page": page, "truth": truth,
+                "corners": corners, "rotated": rotated,
+            })
+        for i in range(args.tight):
+            page, truth = render_page(rng)
+            rotated = i % 2 == 1
+            photo = page.transpose(Image.ROTATE_90) if rotated else page.copy()
+            fixtures.append({
+                "name": f"tight_{i}", "photo": photo, "page": page, "truth": truth,
+                "corners": _page_corners(photo), "rotated": rotated, "tight": True,
+            })
+
+    print(f"{len(fixtures)} fixtures{' (live extraction)' if extract else ''}")
+    print(f"  {'pipeline':<16} {'ms':>7} {'payload KB':>11} {'doc px':>9} {'PSNR dB':>8} {'upright':>8}"
+          + (f" {'fields':>7}" if extract else ""))
+    for budget in budgets:
+        for pipeline in ("legacy", "crop"):
+            times, sizes, doc_pixels, scores, upright, accuracy, kept_whole = [], [], [], [], [], [], []
+            for fixture in fixtures:
+                photo, page = fixture["photo"], fixture["page"]
+                start = time.perf_counter()
+                if pipeline == "legacy":
+                    payload, info = legacy_preprocess(photo.copy(), budget), None
+                else:
+                    payload, info = crop_preprocess(photo.copy(), budget)
+                times.append((time.perf_counter() - start) * 1000)
+                _, data, _ = encode_for_model(payload)
+                sizes.append(len(data) / 1024)
+
+                if fixture.get("tight") and pipeline == "crop":
+                    kept_whole.append(info["method"] == "frame")
+                if page is not None:
+                    if pipeline == "legacy" or info["method"] == "frame":
+                        corners = fixture["corners"]
+                        share = polygon_area(corners) / (photo.width * photo.height)
+                        doc_pixels.append(payload.width * payload.height * share)
+                        seen = page.transpose(Image.ROTATE_90) if fixture["rotated"] else page
+                        rotation = info["rotation"] if info else 0
+                        unturned = payload.rotate(-rotation, expand=True) if rotation else payload
+                        scores.append(rectified_psnr(unturned, photo.size, corners, seen))
+                        upright.append(rotation == (270 if fixture["rotated"] else 0))
+                    elif info["method"] == "perspective":
+                        seen = page.transpose(Image.ROTATE_90) if fixture["rotated"] else page
+                        doc_pixels.append(payload.width * payload.height)
+                        scores.append(cropped_psnr(payload, info, fixture["corners"], seen))
+                        upright.append(info["rotation"] == (270 if fixture["rotated"] else 0))
+                    else:
+                        doc_pixels.append(0)
+                        upright.append(False)
+                if extract and fixture["truth"]:
+                    accuracy.append(field_accuracy(extract(payload), fixture["truth"]))
+
+            row = (f"  {pipeline + ' @' + str(budget):<16} {statistics.median(times):7.1f} {statistics.mean(sizes):11.1f}"
+                   f" {statistics.mean(doc_pixels) / 1000 if doc_pixels else 0:8.0f}k"
+                   f" {statistics.mean(scores) if scores else float('nan'):8.2f}"
+                   f" {sum(upright):>4}/{len(upright):<3}")
+            if extract:
+                row += f" {statistics.mean(accuracy) * 100 if accuracy else float('nan'):6.1f}%"
+            if kept_whole:
+                row += f"  tight scans kept whole {sum(kept_whole)}/{len(kept_whole)}"
+            print(row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite: /extract, form generation and downloads through the Flask test client
+
+Uploads are synthetic phone-style passport photos (see bench_document_crop)
+or the images in --fixtures; model calls go to the fake backend with the
+configured latency, jitter, long tail and error rate. Each scenario reports
+throughput, p50/p95/p99 request latency, peak RSS, process CPU and per-stage
+wall/CPU time from the app's own metrics, and the whole run is saved as JSON
+so two commits can be compared with --compare.
+
+The batch scenario renders on the form worker pool (FORM_WORKERS), so run it
+with different worker counts to check scaling with cores.
+
+Usage (from web_app/):
+    python bench/bench_end_to_end.py                              # full suite
+    python bench/bench_end_to_end.py --repeat 3 --latency-ms 50 --tail-rate 0.05 --tail-ms 2000
+    python bench/bench_end_to_end.py --only extract --files 1,8
+    python bench/bench_end_to_end.py --compare bench/results/<earlier run>.json
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.environ["GEMINI_API_KEY"] = ""  # never touch the real API from a benchmark
+os.environ["EXTRACTION_BACKEND"] = "fake"
+os.environ.setdefault("LOG_LEVEL", "ERROR")  # per-request and per-field log lines would bury the report
+
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff", ".pdf")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is the lifetime peak (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ResourceSampler:
+    """Peak RSS and process CPU time (all threads) over a with-block"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, current_rss_bytes())
+
+    def __enter__(self):
+        self.start_rss = current_rss_bytes()
+        self.peak_rss = self.start_rss
+        self._cpu_start = sum(os.times()[:2])
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss_bytes())
+        self.cpu_seconds = sum(os.times()[:2]) - self._cpu_start
+        return False
+
+
+def stage_snapshot():
+    """(calls, wall seconds, cpu seconds) per pipeline stage so far"""
+    from modules.metrics import STAGE_CPU_SECONDS, STAGE_SECONDS
+
+    cpu = {dict(key)["stage"]: value for key, value in STAGE_CPU_SECONDS.values().items()}
+    return {
+        dict(key)["stage"]: (count, total, cpu.get(dict(key)["stage"], 0.0))
+        for key, (count, total) in STAGE_SECONDS.totals().items()
+    }
+
+
+def stage_delta(before, after):
+    stages = {}
+    for stage, (count, wall, cpu) in sorted(after.items()):
+        count0, wall0, cpu0 = before.get(stage, (0, 0.0, 0.0))
+        if count > count0:
+            calls = count - count0
+            stages[stage] = {
+                "calls": calls,
+                "wall_ms_mean": round((wall - wall0) / calls * 1000, 2),
+                "wall_ms_total": round((wall - wall0) * 1000, 1),
+                "cpu_ms_total": round((cpu - cpu0) * 1000, 1),
+            }
+    return stages
+
+
+def synthetic_uploads(count, seed):
+    """JPEG-encoded phone-style photos of synthetic passport pages, plus their printed fields"""
+    from bench_document_crop import photograph, render_page
+
+    rng = random.Random(seed)
+    uploads = []
+    for index in range(count):
+        page, truth = render_page(rng)
+        photo, _ = photograph(page, rng, rotate=index % 4 == 3)
+        buffer = io.BytesIO()
+        photo.save(buffer, format="JPEG", quality=88)
+        uploads.append((f"passport_{index}.jpg", buffer.getvalue(), truth))
+    return uploads
+
+
+def fixture_uploads(directory):
+    uploads = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_SUFFIXES):
+            with open(os.path.join(directory, name), "rb") as handle:
+                uploads.append((name, handle.read(), {}))
+    if not uploads:
+        raise SystemExit(f"No images found in {directory}")
+    return uploads
+
+
+def member_record(truth, index):
+    """Passport record in the shape /extract returns, for the forms endpoint"""
+    return {
+        "surname": truth.get("surname", f"SURNAME{index}"),
+        "given_names": truth.get("given_names", f"GIVEN{index}"),
+        "passport_number": truth.get("passport_number", f"TK{1000000 + index}"),
+        "date_of_birth": truth.get("date_of_birth", "1985-04-12"),
+        "date_of_expiration": truth.get("date_of_expiration", "2031-04-11"),
+        "nationality": "JAPAN",
+        "place_of_birth": "TOKYO",
+        "issuing_authority": "MINISTRY OF FOREIGN AFFAIRS",
+    }
+
+
+class Suite:
+    def __init__(self, client, uploads, args):
+        self.client = client
+        self.uploads = uploads
+        self.args = args
+        self.download_paths = []
+
+    def extract(self, file_count, round_index):
+        data = {
+            "doc_type": self.args.doc_type,
+            "file": [
+                (io.BytesIO(self.uploads[(round_index + i) % len(self.uploads)][1]),
+                 self.uploads[(round_index + i) % len(self.uploads)][0])
+                for i in range(file_count)
+            ],
+        }
+        if not self.args.cache:
+            data["no_cache"] = "true"
+        response = self.client.post("/extract", data=data, content_type="multipart/form-data")
+        results = response.get_json() if response.status_code == 200 else []
+        failed = sum(1 for result in results if "error" in result) + (file_count - len(results))
+        response.close()
+        return file_count, failed
+
+    def family(self, member_count, offset):
+        members = {}
+        for number in range(member_count):
+            truth = self.uploads[(offset + number) % len(self.uploads)][2]
+            key = "primary" if number == 0 else f"accompanying{number}"
+            members[key] = member_record(truth, number)
+        return members
+
+    def forms(self, member_count, round_index):
+        members = self.family(member_count, round_index)
+        response = self.client.post("/api/generate-japanese-forms", json={"members": members})
+        body = response.get_json(silent=True) or {}
+        response.close()
+        if response.status_code == 200:
+            self.download_paths.append((body["pdf_path"], body["word_path"]))
+            return 1, 0
+        return 1, 1
+
+    def forms_batch(self, family_count, round_index):
+        families = [
+            {"id": f"family_{i}", "members": self.family(1 + (round_index + i) % 4, round_index + i)}
+            for i in range(family_count)
+        ]
+        response = self.client.post("/api/generate-japanese-forms/batch", json={"families": families})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+        response.close()
+        return family_count, family_count - sum(1 for line in lines if "job_id" in line["result"])
+
+    def family_serial(self, member_count, round_index):
+        """The browser's old flow: one /extract per member, then the extracted records posted to the forms endpoint"""
+        members = {}
+        for number in range(member_count):
+            name, content, _ = self.uploads[(round_index + number) % len(self.uploads)]
+            data = {"doc_type": self.args.doc_type, "file": [(io.BytesIO(content), name)]}
+            if not self.args.cache:
+                data["no_cache"] = "true"
+            response = self.client.post("/extract", data=data, content_type="multipart/form-data")
+            results = response.get_json(silent=True) or [{}]
+            response.close()
+            members["primary" if number == 0 else f"accompanying{number}"] = results[0]
+        response = self.client.post("/api/generate-japanese-forms", json={"members": members})
+        response.close()
+        return 1, 0 if response.status_code == 200 else 1
+
+    def family_oneshot(self, member_count, round_index):
+        """Every member's scan in one request to the passport-to-forms endpoint"""
+        data = {"doc_type": self.args.doc_type}
+        for number in range(member_count):
+            name, content, _ = self.uploads[(round_index + number) % len(self.uploads)]
+            data["primary" if number == 0 else f"accompanying{number}"] = (io.BytesIO(content), name)
+        if not self.args.cache:
+            data["no_cache"] = "true"
+        response = self.client.post("/api/generate-japanese-forms/from-passports", data=data,
+                                    content_type="multipart/form-data")
+        response.close()
+        return 1, 0 if response.status_code == 200 else 1
+
+    def download(self, fmt, round_index):
+        if not self.download_paths:
+            self.forms(1, round_index)
+        pdf_path, word_path = self.download_paths[round_index % len(self.download_paths)]
+        response = self.client.get(pdf_path if fmt == "pdf" else word_path)
+        ok = response.status_code == 200 and len(response.get_data()) > 0
+        response.close()
+        return 1, 0 if ok else 1
+
+
+def run_scenario(name, operation, args):
+    """Warm up, then run args.repeat rounds from args.clients concurrent clients"""
+    for round_index in range(args.warmup):
+        operation(round_index)
+
+    latencies = []
+    items = failed = 0
+
+    def timed_round(round_index):
+        start = time.perf_counter()
+        outcome = operation(round_index)
+        return time.perf_counter() - start, outcome
+
+    stages_before = stage_snapshot()
+    with ResourceSampler() as sampler:
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            for elapsed, (round_items, round_failed) in pool.map(timed_round, range(args.repeat)):
+                latencies.append(elapsed)
+                items += round_items
+                failed += round_failed
+        wall = time.perf_counter() - wall_start
+
+    return {
+        "requests": len(latencies),
+        "items": items,
+        "failed_items": failed,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(latencies) / wall, 3),
+        "items_per_second": round(items / wall, 3),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2),
+        },
+        "peak_rss_mb": round(sampler.peak_rss / 1048576, 1),
+        "rss_growth_mb": round((sampler.peak_rss - sampler.start_rss) / 1048576, 1),
+        "cpu_seconds": round(sampler.cpu_seconds, 3),
+        "cpu_utilisation": round(sampler.cpu_seconds / wall, 3),
+        "stages": stage_delta(stages_before, stage_snapshot()),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(results):
+    print(f"\n  {'scenario':<14} {'req':>4} {'items/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'fail':>5} {'peak MB':>8} {'cpu s':>7}")
+    for name, scenario in results["scenarios"].items():
+        latency = scenario["latency_ms"]
+        print(f"  {name:<14} {scenario['requests']:>4} {scenario['items_per_second']:>8.2f} "
+              f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} "
+              f"{scenario['failed_items']:>5} {scenario['peak_rss_mb']:>8.1f} {scenario['cpu_seconds']:>7.2f}")
+
+    print(f"\n  {'scenario':<14} {'stage':<18} {'calls':>6} {'wall ms/call':>13} {'cpu ms total':>13}")
+    for name, scenario in results["scenarios"].items():
+        for stage, stats in scenario["stages"].items():
+            print(f"  {name:<14} {stage:<18} {stats['calls']:>6} {stats['wall_ms_mean']:>13.2f} {stats['cpu_ms_total']:>13.1f}")
+
+
+def compare(results, baseline_path, tolerance):
+    """Print per-scenario changes against an earlier run, flagging regressions beyond tolerance"""
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    print(f"\nAgainst {os.path.basename(baseline_path)} (commit {baseline['meta'].get('commit')}):")
+    print(f"  {'scenario':<14} {'p50':>9} {'p95':>9} {'p99':>9} {'items/s':>9} {'peak MB':>9}")
+    regressions = 0
+    for name, scenario in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        changes = [
+            scenario["latency_ms"][key] / before["latency_ms"][key] - 1 if before["latency_ms"][key] else 0.0
+            for key in ("p50", "p95", "p99")
+        ]
+        throughput = scenario["items_per_second"] / before["items_per_second"] - 1 if before["items_per_second"] else 0.0
+        memory = scenario["peak_rss_mb"] / before["peak_rss_mb"] - 1 if before["peak_rss_mb"] else 0.0
+        flagged = changes[0] > tolerance or changes[1] > tolerance or throughput < -tolerance
+        regressions += flagged
+        cells = " ".join(f"{change:>+8.1%}" for change in changes + [throughput, memory])
+        print(f"  {name:<14} {cells}{'  <- regression' if flagged else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", choices=("extract", "forms", "batch", "family", "download"), action="append",
+                        help="run only these scenario groups (repeatable)")
+    parser.add_argument("--files", default="1,8,32", help="files per /extract request")
+    parser.add_argument("--members", default="1,2,4,8", help="members per form-generation request")
+    parser.add_argument("--batch-families", default="50", help="families per batch form request (1-4 members each)")
+    parser.add_argument("--family-members", default="4", help="members per family for scan-to-forms turnaround")
+    parser.add_argument("--repeat", type=int, default=5, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured requests per scenario")
+    parser.add_argument("--clients", type=int, default=1, help="concurrent clients per scenario")
+    parser.add_argument("--doc-type", default="Japanese Passport")
+    parser.add_argument("--fixtures", help="directory of real document images to upload instead of synthetic photos")
+    parser.add_argument("--fixture-count", type=int, default=8, help="synthetic photos to generate")
+    parser.add_argument("--seed", type=int, default=7, help="seed for fixtures and the fake backend")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake model base latency")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="uniform jitter added to every call")
+    parser.add_argument("--tail-rate", type=float, default=0.02, help="share of calls that also take --tail-ms")
+    parser.add_argument("--tail-ms", type=float, default=1500.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake calls that fail (retried by the app)")
+    parser.add_argument("--cache", action="store_true", help="leave the result cache on (off by default)")
+    parser.add_argument("--output", help="results file (default bench/results/e2e_<commit>_<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    for name in ("fixtures", "output", "compare"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    # Generated forms and the result cache go to a scratch directory, not the working tree
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.environ.setdefault("EXTRACTION_CACHE_PATH", os.path.join(workdir, "cache.sqlite3"))
+    os.environ.setdefault("JOB_DB_PATH", os.path.join(workdir, "jobs.sqlite3"))
+    os.chdir(workdir)
+
+    import app as web_app
+    from modules.backends import FakeBackend
+
+    web_app.extraction_backend = FakeBackend(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        tail_rate=args.tail_rate, tail_ms=args.tail_ms, seed=args.seed,
+    )
+    client = web_app.app.test_client()
+
+    started = time.perf_counter()
+    uploads = fixture_uploads(args.fixtures) if args.fixtures else synthetic_uploads(args.fixture_count, args.seed)
+    print(f"{len(uploads)} fixtures ready in {time.perf_counter() - started:.1f}s; "
+          f"fake model {args.latency_ms:.0f}+{args.jitter_ms:.0f} ms, {args.tail_rate:.0%} tail of {args.tail_ms:.0f} ms, "
+          f"{args.error_rate:.0%} errors; {args.repeat} requests x {args.clients} client(s) per scenario")
+
+    suite = Suite(client, uploads, args)
+    groups = set(args.only or ("extract", "forms", "batch", "family", "download"))
+    scenarios = []
+    if "extract" in groups:
+        for count in (int(n) for n in args.files.split(",")):
+            scenarios.append((f"extract_{count}", lambda i, count=count: suite.extract(count, i)))
+    if "forms" in groups:
+        for count in (int(n) for n in args.members.split(",")):
+            scenarios.append((f"forms_{count}", lambda i, count=count: suite.forms(count, i)))
+    if "batch" in groups:
+        for count in (int(n) for n in args.batch_families.split(",")):
+            scenarios.append((f"forms_batch_{count}", lambda i, count=count: suite.forms_batch(count, i)))
+    if "family" in groups:
+        for count in (int(n) for n in args.family_members.split(",")):
+            scenarios.append((f"family_serial_{count}", lambda i, count=count: suite.family_serial(count, i)))
+            scenarios.append((f"family_oneshot_{count}", lambda i, count=count: suite.family_oneshot(count, i)))
+    if "download" in groups:
+        scenarios.append(("download_pdf", lambda i: suite.download("pdf", i)))
+        scenarios.append(("download_word", lambda i: suite.download("word", i)))
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": {},
+    }
+    for name, operation in scenarios:
+        print(f"  running {name} ...", flush=True)
+        results["scenarios"][name] = run_scenario(name, operation, args)
+
+    print_report(results)
+
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"e2e_{results['meta']['commit'] or 'unknown'}_{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(results, handle, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark model payload encoding: legacy PNG + base64 versus the size-aware encoder
+
+Reports encode time, payload size and PSNR against the preprocessed image
+(a pixel-level proxy for extraction parity). Pass --fixtures DIR to run on
+real scans; otherwise synthetic ID-card-like images are generated.
+
+Usage (from web_app/):
+    python bench/bench_image_encoding.py [--fixtures DIR] [--budget 350000]
+"""
+
+import argparse
+import base64
+import io
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from modules.image_encoding import encode_for_model
+
+
+def synthetic_fixtures(count=6, seed=7):
+    """Photographed-card stand-ins: noisy gradient background, text lines and a portrait block"""
+    rng = random.Random(seed)
+    fixtures = []
+    for i in range(count):
+        image = Image.radial_gradient("L").resize((1024, 720)).convert("RGB")
+        image = Image.blend(image, Image.effect_noise((1024, 720), 40).convert("RGB"), 0.35)
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((60, 120, 300, 440), fill=(rng.randrange(90, 200), 120, 110))
+        for line in range(14):
+            y = 110 + line * 38
+            draw.text((340, y), f"FIELD {line}: {rng.randrange(10**8, 10**9)} DOE<<JANE", fill=(20, 20, 30))
+        draw.text((60, 640), "P<USADOE<<JANE<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<", fill=(0, 0, 0))
+        fixtures.append((f"synthetic_{i}", image.filter(ImageFilter.GaussianBlur(0.6))))
+    return fixtures
+
+
+def load_fixtures(directory):
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        try:
+            image = Image.open(os.path.join(directory, name))
+        except OSError:
+            continue
+        image = image.convert("RGB")
+        image.thumbnail((1024, 1024), Image.LANCZOS)
+        fixtures.append((name, image))
+    return fixtures
+
+
+def psnr(reference, data):
+    decoded = Image.open(io.BytesIO(data)).convert("RGB")
+    if decoded.size != reference.size:
+        decoded = decoded.resize(reference.size, Image.LANCZOS)
+    histogram = Image.frombytes(
+        "L", reference.size, bytes(abs(a - b) for a, b in zip(reference.convert("L").tobytes(), decoded.convert("L").tobytes()))
+    ).histogram()
+    mse = sum(value * value * count for value, count in enumerate(histogram)) / (reference.size[0] * reference.size[1])
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def legacy_png_base64(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", help="directory of sample scans")
+    parser.add_argument("--budget", type=int, default=350000, help="payload byte budget")
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "WEBP"])
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else synthetic_fixtures()
+    print(f"{'fixture':<22}{'png+b64 ms':>11}{'bytes':>10}{'new ms':>9}{'bytes':>10}{'q':>4}{'PSNR dB':>9}")
+    totals = [0.0, 0, 0.0, 0]
+    for name, image in fixtures:
+        legacy_time, legacy = timed(lambda: legacy_png_base64(image))
+        new_time, (_, data, info) = timed(lambda: encode_for_model(image, args.budget, args.format))
+        totals[0] += legacy_time
+        totals[1] += len(legacy)
+        totals[2] += new_time
+        totals[3] += len(data)
+        print(f"{name[:21]:<22}{legacy_time * 1000:>11.1f}{len(legacy):>10}{new_time * 1000:>9.1f}"
+              f"{len(data):>10}{info['quality']:>4}{psnr(image, data):>9.1f}")
+    print(f"{'total':<22}{totals[0] * 1000:>11.1f}{totals[1]:>10}{totals[2] * 1000:>9.1f}{totals[3]:>10}")
+
+
+if __name__ == "__main__":
+    main()
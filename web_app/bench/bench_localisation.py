@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark nationality/place-of-birth localisation in map_passport_to_form_fields
+
+Compares the old inline dictionaries (rebuilt on every call, five countries and
+three places) with the data-driven index: per-member mapping time for exact
+hits, misspellings (first lookup and cached) and unknown values, plus how many
+of a mixed sample of passport values each one translates.
+
+Usage (from web_app/):
+    python bench/bench_localisation.py [--number 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.localisation import DEFAULT_LOCALISATION_PATH, LocalisationIndex
+from modules.pdf_generator import JapaneseFormGenerator
+
+SAMPLE_NATIONALITIES = [
+    "UNITED STATES OF AMERICA", "USA", "JAPAN", "JAPANESE", "UNITED KINGDOM", "GBR", "D", "CANADA", "AUSTRALIA",
+    "KOREA, REPUBLIC OF", "CHINESE", "PHILIPPINES", "VIET NAM", "FRANCE", "BRASIL", "TURKIYE", "XXA", "PHILLIPINES",
+]
+SAMPLE_PLACES = [
+    "CALIFORNIA, U.S.A.", "NEW YORK", "TEXAS", "GEORGIA, USA", "SAN FRANCISCO, CA", "TOKYO", "OSAKA-FU", "HYOGO",
+    "UNITED STATES", "SEOUL, KOREA", "MANILA, PHILIPPINES", "LONDON, UNITED KINGDOM", "MASSACHUSETS", "ZURICH",
+]
+
+CASES = {
+    "exact": {"nationality": "UNITED STATES OF AMERICA", "place_of_birth": "CALIFORNIA, U.S.A."},
+    "code": {"nationality": "USA", "place_of_birth": "NY"},
+    "misspelt": {"nationality": "PHILLIPINES", "place_of_birth": "MASSACHUSETS"},
+    "unknown": {"nationality": "ATLANTIS", "place_of_birth": "EL DORADO"},
+}
+
+
+def legacy_map(passport_data):
+    """The mapping as it was: dict literals built per call, exact upper-case match only"""
+    nationality_en = passport_data.get('nationality', '')
+    nationality_map = {
+        'UNITED STATES': 'アメリカ合衆国',
+        'JAPAN': '日本',
+        'UNITED KINGDOM': 'イギリス',
+        'CANADA': 'カナダ',
+        'AUSTRALIA': 'オーストラリア',
+    }
+    place_of_birth = passport_data.get('place_of_birth', '')
+    place_map = {
+        'UNITED STATES': 'アメリカ合衆国',
+        'CALIFORNIA': 'カリフォルニア州',
+        'NEW YORK': 'ニューヨーク州',
+    }
+    return (nationality_map.get(nationality_en.upper(), nationality_en),
+            place_map.get(place_of_birth.upper(), place_of_birth))
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="calls per timing")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = LocalisationIndex.from_file(DEFAULT_LOCALISATION_PATH)
+    print(f"index built in {(time.perf_counter() - started) * 1000:.1f} ms: "
+          f"{len(index.nationalities)} nationality keys, {len(index.places)} place keys")
+
+    legacy_hits = sum(legacy_map({"nationality": v})[0] != v for v in SAMPLE_NATIONALITIES) + \
+        sum(legacy_map({"place_of_birth": v})[1] != v for v in SAMPLE_PLACES)
+    index_hits = sum(index.nationality(v) != v for v in SAMPLE_NATIONALITIES) + \
+        sum(index.place(v) != v for v in SAMPLE_PLACES)
+    total = len(SAMPLE_NATIONALITIES) + len(SAMPLE_PLACES)
+    print(f"translated: legacy {legacy_hits}/{total}, index {index_hits}/{total}\n")
+
+    generator = JapaneseFormGenerator()
+    base = {"surname": "TANAKA", "given_names": "HANAKO", "passport_number": "TK1234567",
+            "date_of_birth": "1985-04-12", "date_of_expiration": "2031-04-11", "issuing_authority": "MOFA"}
+
+    print(f"  {'case':<10} {'legacy lookup':>14} {'index lookup':>13} {'first (uncached)':>17} {'member mapping':>15}")
+    for name, values in CASES.items():
+        record = dict(base, **values)
+        legacy = per_call_us(lambda: legacy_map(record), args.number)
+        fresh = LocalisationIndex.from_file(DEFAULT_LOCALISATION_PATH)
+        started = time.perf_counter()
+        fresh.nationality(values["nationality"]), fresh.place(values["place_of_birth"])
+        first = (time.perf_counter() - started) * 1e6
+        lookup = per_call_us(lambda: (index.nationality(values["nationality"]), index.place(values["place_of_birth"])),
+                             args.number)
+        member = per_call_us(lambda: generator.map_passport_to_form_fields(record), args.number // 4)
+        print(f"  {name:<10} {legacy:>11.2f} us {lookup:>10.2f} us {first:>14.1f} us {member:>12.2f} us")
+
+
+if __name__ == "__main__":
+    main()
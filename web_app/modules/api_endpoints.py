@@ -3,18 +3,80 @@ Enhanced API endpoints for Japanese visa form generation
 Works with existing API key from app.py
 """
 
-from flask import request, jsonify, send_file, render_template
-import os
+from flask import Response, request, jsonify, send_file, render_template, stream_with_context
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
+import io
 import json
+import logging
+import multiprocessing
+import threading
 
-def register_routes(app):
-    """Register new API routes"""
+from modules.artifact_store import create_artifact_store_from_env
+from modules.form_workers import FORM_WORKERS_PREWARM, MAX_BATCH_FAMILIES, prewarm, render_families
+from modules.metrics import ERRORS, registry
+from modules.page_ingest import expand_pages
+
+logger = logging.getLogger(__name__)
+
+# Upload field names of the one-shot endpoint, in form order: the primary applicant and up to 7 accompanying members
+MEMBER_ROLES = ["primary"] + [f"accompanying{i}" for i in range(1, 8)]
+DEFAULT_PASSPORT_TYPE = "US Passport"
+
+
+def valid_member_data(members_data):
+    """Members with a non-empty passport record"""
+    return {
+        member_key: member_data
+        for member_key, member_data in (members_data or {}).items()
+        if member_data and isinstance(member_data, dict)
+    }
+
+
+def forms_response(job_id, result):
+    """Client-facing summary of one generated family"""
+    return {
+        "success": True,
+        "job_id": job_id,
+        "pdf_path": f"/api/download/pdf/{job_id}",
+        "word_path": f"/api/download/word/{job_id}",
+        "email_subject": result.get("email_subject", ""),
+        "email_body": result.get("email_body", ""),
+        "members_processed": result["members_processed"]
+    }
+
+
+def register_routes(app, extract_uploads=None, document_types=()):
+    """Register new API routes
+
+    extract_uploads(uploads, doc_type, use_cache) is the app's extraction
+    pipeline, yielding (index, result) as files finish; with it the one-shot
+    passport-to-forms endpoint is registered too.
+    """
     
-    # Ensure directories exist
-    if not os.path.exists('generated_forms'):
-        os.makedirs('generated_forms')
+    # Generated forms live in per-job directories, found again by job id on download
+    artifacts = create_artifact_store_from_env()
+
+    def artifact_counters():
+        stats = artifacts.stats()
+        yield "artifact_jobs", "gauge", "Generated form jobs tracked by this process", [({}, stats["jobs"])]
+        yield "artifact_bytes", "gauge", "Bytes of generated forms tracked by this process", [({}, stats["bytes"])]
+        yield "artifact_evictions", "counter", "Generated form jobs removed by TTL or size cap", [({}, stats["evicted"])]
+        yield "artifact_memory_bytes", "gauge", "Bytes of generated forms held in memory", [({}, stats["memory_bytes"])]
+        yield "artifact_spills", "counter", "In-memory jobs written to disk to stay within the memory budget", [({}, stats["spilled"])]
+
+    registry.register_collector(artifact_counters)
+
+    def store_artifacts(job_id, result):
+        """Keep a rendered job's files (bytes or paths) for download; bytes are not returned to the client"""
+        if artifacts.in_memory:
+            artifacts.put(job_id, pdf=result.pop("pdf_bytes", None), word=result.pop("word_bytes", None))
+        else:
+            artifacts.register(job_id, pdf=result["pdf_path"], word=result["word_path"])
+
+    # Spawned workers re-import the app; only the serving process starts the pool
+    if FORM_WORKERS_PREWARM and multiprocessing.parent_process() is None:
+        threading.Thread(target=prewarm, name="form-worker-prewarm", daemon=True).start()
     
     @app.route('/visa-form')
     def visa_form_page():
@@ -41,77 +103,179 @@ def register_routes(app):
         try:
             data = request.get_json()
             members_data = data.get('members', {})
-            form_type = data.get('form_type', 'japanese_visa_family')
             
             if not members_data:
                 return jsonify({"error": "No member data provided"}), 400
 
             # Filter out empty member data
-            valid_members = {}
-            for member_key, member_data in members_data.items():
-                if member_data and isinstance(member_data, dict):
-                    valid_members[member_key] = member_data
+            valid_members = valid_member_data(members_data)
             
             if not valid_members:
                 return jsonify({"error": "No valid member data provided"}), 400
 
-            # Generate forms using shared model from app.py
+            # Generate forms using shared model from app.py; the job id tags the output files
             from modules.pdf_generator import generate_japanese_forms_from_passports
-            result = generate_japanese_forms_from_passports(valid_members)
-            
-            # Create temporary download links
             job_id = str(uuid.uuid4())
+            result = generate_japanese_forms_from_passports(valid_members, job_id=job_id, output_dir=artifacts.job_dir(job_id),
+                                                            in_memory=artifacts.in_memory)
+            store_artifacts(job_id, result)
             
-            return jsonify({
-                "success": True,
-                "job_id": job_id,
-                "pdf_path": f"/api/download/pdf/{job_id}",
-                "word_path": f"/api/download/word/{job_id}",
-                "email_subject": result.get("email_subject", ""),
-                "email_body": result.get("email_body", ""),
-                "members_processed": result["members_processed"]
-            })
+            return jsonify(forms_response(job_id, result))
 
         except Exception as e:
-            print(f"Error generating forms: {e}")
+            ERRORS.inc(category="forms")
+            logger.exception("Error generating forms")
             return jsonify({"error": str(e)}), 500
 
+    @app.route('/api/generate-japanese-forms/batch', methods=['POST'])
+    def generate_japanese_forms_batch():
+        """
+        Generate forms for many families at once on the form worker pool
+
+        Expected JSON:
+        {
+            "families": [
+                {"id": "optional client reference", "members": {"primary": {...}, "accompanying1": {...}}},
+                ...
+            ]
+        }
+
+        Streams one NDJSON line per family as soon as its PDF and DOCX are
+        written: {"index", "id", "total", "result"}, where result has the same
+        shape as /api/generate-japanese-forms (or an "error").
+        """
+        data = request.get_json(silent=True) or {}
+        families = data.get('families')
+        if not isinstance(families, list) or not families:
+            return jsonify({"error": "No families provided"}), 400
+        if len(families) > MAX_BATCH_FAMILIES:
+            return jsonify({"error": f"At most {MAX_BATCH_FAMILIES} families per batch"}), 413
+
+        total = len(families)
+        invalid = {}
+        jobs = []  # (family index, job id)
+        work = []  # (members, job id, output directory)
+        for index, family in enumerate(families):
+            members = valid_member_data(family.get('members') if isinstance(family, dict) else None)
+            if not members:
+                invalid[index] = {"error": "No valid member data provided"}
+                continue
+            job_id = str(uuid.uuid4())
+            jobs.append((index, job_id))
+            work.append((members, job_id, artifacts.job_dir(job_id)))
+
+        def family_id(index):
+            family = families[index]
+            return family.get('id') if isinstance(family, dict) else None
+
+        def line(index, result):
+            return json.dumps({"index": index, "id": family_id(index), "total": total, "result": result}, ensure_ascii=False) + "\n"
+
+        def generate():
+            for index, result in invalid.items():
+                ERRORS.inc(category="forms")
+                yield line(index, result)
+            for position, outcome in render_families(work, in_memory=artifacts.in_memory):
+                index, job_id = jobs[position]
+                if isinstance(outcome, Exception):
+                    ERRORS.inc(category="forms")
+                    logger.error("Error generating forms for family %d: %s", index, outcome)
+                    yield line(index, {"error": str(outcome)})
+                else:
+                    store_artifacts(job_id, outcome)
+                    yield line(index, forms_response(job_id, outcome))
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    if extract_uploads is not None:
+        @app.route('/api/generate-japanese-forms/from-passports', methods=['POST'])
+        def generate_japanese_forms_from_scans():
+            """
+            Extract every member's passport and generate the forms in one request
+
+            Multipart fields: one passport scan per role ("primary", required, and
+            "accompanying1" .. "accompanying7"), plus optional doc_type (default
+            US Passport), no_cache and preview. A scanned PDF or multi-page TIFF
+            is read from its first page. The scans are extracted concurrently and the
+            forms are filled as soon as the last one lands. Returns the
+            /api/generate-japanese-forms response plus the extracted "members";
+            when any scan fails nothing is generated and the per-member results
+            come back with a 422. With preview=true only the extracted members are
+            returned, for review before posting them to /api/generate-japanese-forms.
+            """
+            unknown = sorted(key for key in request.files if key not in MEMBER_ROLES)
+            if unknown:
+                return jsonify({"error": f"Unknown member fields: {', '.join(unknown)}"}), 400
+            roles, uploads = [], []
+            for role in MEMBER_ROLES:
+                files = [file for file in request.files.getlist(role) if file.filename]
+                if files:
+                    roles.append(role)
+                    # Same page expansion as /extract; the passport is page 1 of a scanned document
+                    uploads.append(expand_pages([files[0]])[0])
+            if 'primary' not in roles:
+                return jsonify({"error": "A primary applicant passport is required"}), 400
+
+            doc_type = request.form.get('doc_type') or DEFAULT_PASSPORT_TYPE
+            if doc_type not in document_types:
+                return jsonify({"error": "Invalid document type"}), 400
+            use_cache = request.form.get("no_cache", "").lower() not in ("1", "true", "yes")
+            preview = request.form.get("preview", "").lower() in ("1", "true", "yes")
+
+            extracted = {}
+            for index, result in extract_uploads(uploads, doc_type, use_cache):
+                extracted[roles[index]] = result
+            members = {role: extracted[role] for role in roles}
+            failed = [role for role, result in members.items() if not isinstance(result, dict) or 'error' in result]
+            if failed:
+                ERRORS.inc(category="forms")
+                return jsonify({"error": f"Could not read the passport of: {', '.join(failed)}", "members": members}), 422
+            if preview:
+                return jsonify({"success": True, "members": members})
+
+            try:
+                from modules.pdf_generator import generate_japanese_forms_from_passports
+                job_id = str(uuid.uuid4())
+                result = generate_japanese_forms_from_passports(members, job_id=job_id, output_dir=artifacts.job_dir(job_id),
+                                                                in_memory=artifacts.in_memory)
+                store_artifacts(job_id, result)
+            except Exception as e:
+                ERRORS.inc(category="forms")
+                logger.exception("Error generating forms")
+                return jsonify({"error": str(e), "members": members}), 500
+
+            response = forms_response(job_id, result)
+            response["members"] = members
+            return jsonify(response)
+
     @app.route('/api/download/<format>/<job_id>')
     def download_generated_form(format, job_id):
         """Download generated form in specified format"""
         try:
+            if format not in ('pdf', 'word'):
+                return jsonify({"error": f"Unknown format: {format}"}), 400
+
+            artifact = artifacts.get(job_id, format)
+            if artifact is None:
+                return jsonify({"error": "Generated file not found or expired"}), 404
+
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            search_dir = 'generated_forms'
-            files = []
-            
-            if os.path.exists(search_dir):
-                for file in os.listdir(search_dir):
-                    if format == 'pdf' and file.endswith('.pdf'):
-                        files.append(file)
-                    elif format == 'word' and file.endswith('.docx'):
-                        files.append(file)
-            
-            if files:
-                latest_file = sorted(files)[-1]
-                file_path = os.path.join(search_dir, latest_file)
-                
-                if format == 'pdf':
-                    mimetype = 'application/pdf'
-                    filename = f'japanese_visa_application_{timestamp}.pdf'
-                else:  # word/docx
-                    mimetype = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                    filename = f'japanese_visa_application_{timestamp}.docx'
-                
-                if os.path.exists(file_path):
-                    return send_file(file_path, 
-                                   as_attachment=True, 
-                                   download_name=filename,
-                                   mimetype=mimetype)
-                else:
-                    return jsonify({"error": "Generated file not found"}), 404
-            else:
-                return jsonify({"error": "No generated files found"}), 404
+            if format == 'pdf':
+                mimetype = 'application/pdf'
+                filename = f'japanese_visa_application_{timestamp}.pdf'
+            else:  # word/docx
+                mimetype = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                filename = f'japanese_visa_application_{timestamp}.docx'
+
+            # Jobs held in memory are streamed from their buffer, spilled ones from disk
+            return send_file(io.BytesIO(artifact) if isinstance(artifact, bytes) else artifact,
+                           as_attachment=True,
+                           download_name=filename,
+                           mimetype=mimetype)
 
         except Exception as e:
-            return jsonify({"error": f"Download failed: {str(e)}"}), 500
\ No newline at end of file
+            return jsonify({"error": f"Download failed: {str(e)}"}), 500
@@ -0,0 +1,259 @@
+"""
+Job-scoped store for generated forms
+Every job writes its PDF and DOCX into a directory named after its job id, and
+the store keeps a job id -> file index, so a download is a dictionary lookup
+(or, for jobs written by another process, one stat of a known path) instead of
+a scan of everything ever generated. Old jobs are removed after a TTL and the
+oldest jobs go first once the directory exceeds its size cap.
+Optionally (single-process deployments only, off by default) jobs rendered in
+memory are held as bytes in a bounded LRU and served without touching the
+disk; the least recently used ones spill into their job directory (or are
+dropped when spilling is off) once the memory budget is used up
+"""
+
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Union
+
+DEFAULT_ARTIFACT_DIR = "generated_forms"
+
+# Artifact kinds by download format and the file extension each is stored under
+ARTIFACT_EXTENSIONS = {"pdf": ".pdf", "word": ".docx"}
+
+# Job ids become directory names, so only plain tokens are accepted
+_VALID_JOB_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class ArtifactStore:
+    """Job id -> generated files, with TTL and total-size eviction"""
+
+    def __init__(
+        self,
+        root: str = DEFAULT_ARTIFACT_DIR,
+        ttl_seconds: int = 24 * 3600,
+        max_bytes: int = 2 * 1024 ** 3,
+        sweep_interval: int = 60,
+        memory_max_bytes: int = 0,
+        spill: bool = True,
+    ):
+        self.root = os.path.abspath(root)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        # job id -> {"files": {kind: path}, "bytes": int, "created_at": float}, oldest first
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.memory_max_bytes = memory_max_bytes
+        self.spill = spill
+        # job id -> {"data": {kind: bytes}, "bytes": int, "created_at": float}, least recently used first
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._memory_bytes = 0
+        # Jobs taken out of the LRU and not yet on disk, still served from memory
+        self._spilling: Dict[str, Dict[str, Any]] = {}
+        self._spilled = 0
+        self._evicted = 0
+        self._last_sweep = 0.0
+        self._lock = Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def valid_job_id(job_id: str) -> bool:
+        return bool(job_id and _VALID_JOB_ID.match(job_id))
+
+    @property
+    def in_memory(self) -> bool:
+        """Whether jobs should be rendered into buffers and handed to put()"""
+        return self.memory_max_bytes > 0
+
+    def job_dir(self, job_id: str) -> str:
+        """Directory a job writes its outputs into"""
+        if not self.valid_job_id(job_id):
+            raise ValueError(f"Invalid job id: {job_id!r}")
+        return os.path.join(self.root, job_id)
+
+    def register(self, job_id: str, created_at: Optional[float] = None, **files: Optional[str]):
+        """Record a finished job's files (kind=path) and evict expired or excess jobs"""
+        files = {kind: os.path.abspath(path) for kind, path in files.items() if path}
+        size = sum(os.path.getsize(path) for path in files.values() if os.path.isfile(path))
+        with self._lock:
+            previous = self._jobs.pop(job_id, None)
+            if previous:
+                self._bytes -= previous["bytes"]
+            self._jobs[job_id] = {"files": files, "bytes": size, "created_at": created_at or time.time()}
+            self._bytes += size
+            self._evict_locked()
+        self.maybe_sweep()
+
+    def put(self, job_id: str, **data: Optional[bytes]):
+        """Hold a finished job's rendered files (kind=bytes) in memory, spilling older jobs past the budget"""
+        data = {kind: content for kind, content in data.items() if content is not None}
+        size = sum(len(content) for content in data.values())
+        if size > self.memory_max_bytes:
+            self._write(job_id, data, time.time())  # would evict everything else; goes straight to disk
+            return
+        with self._lock:
+            previous = self._memory.pop(job_id, None)
+            if previous:
+                self._memory_bytes -= previous["bytes"]
+            self._memory[job_id] = {"data": data, "bytes": size, "created_at": time.time()}
+            self._memory_bytes += size
+            overflow = []
+            while self._memory_bytes > self.memory_max_bytes:
+                old_id, old = self._memory.popitem(last=False)
+                self._memory_bytes -= old["bytes"]
+                if self.spill and time.time() - old["created_at"] <= self.ttl_seconds:
+                    self._spilling[old_id] = old
+                    overflow.append((old_id, old))
+                else:
+                    self._evicted += 1
+        for old_id, old in overflow:
+            try:
+                self._write(old_id, old["data"], old["created_at"])
+            finally:
+                with self._lock:
+                    self._spilling.pop(old_id, None)
+                    self._spilled += 1
+
+    def _write(self, job_id: str, data: Dict[str, bytes], created_at: float):
+        directory = self.job_dir(job_id)
+        os.makedirs(directory, exist_ok=True)
+        files = {}
+        for kind, content in data.items():
+            path = os.path.join(directory, job_id + ARTIFACT_EXTENSIONS[kind])
+            with open(path, "wb") as f:
+                f.write(content)
+            files[kind] = path
+        self.register(job_id, created_at=created_at, **files)
+
+    def get(self, job_id: str, kind: str) -> Optional[Union[bytes, str]]:
+        """A job's artifact as bytes (held in memory) or a file path; None when unknown, expired or missing"""
+        if not self.valid_job_id(job_id) or kind not in ARTIFACT_EXTENSIONS:
+            return None
+        now = time.time()
+        with self._lock:
+            if job_id in self._spilling:
+                return self._spilling[job_id]["data"].get(kind)
+            held = self._memory.get(job_id)
+            if held is not None:
+                if now - held["created_at"] > self.ttl_seconds:
+                    del self._memory[job_id]
+                    self._memory_bytes -= held["bytes"]
+                    self._evicted += 1
+                else:
+                    self._memory.move_to_end(job_id)
+                    return held["data"].get(kind)
+            entry = self._jobs.get(job_id)
+            if entry is not None and now - entry["created_at"] > self.ttl_seconds:
+                self._drop_locked(job_id)
+                entry = None
+        if entry is not None:
+            path = entry["files"].get(kind)
+            return path if path and os.path.isfile(path) else None
+        return self._find_on_disk(job_id, kind, now)
+
+    def _find_on_disk(self, job_id: str, kind: str, now: float) -> Optional[str]:
+        """Jobs written by another app process (or before a restart) are found in their own directory"""
+        directory = os.path.join(self.root, job_id)
+        try:
+            if now - os.stat(directory).st_mtime > self.ttl_seconds:
+                return None
+            names = os.listdir(directory)
+        except OSError:
+            return None
+        matches = sorted(name for name in names if name.endswith(ARTIFACT_EXTENSIONS[kind]))
+        return os.path.join(directory, matches[-1]) if matches else None
+
+    def _drop_locked(self, job_id: str):
+        entry = self._jobs.pop(job_id, None)
+        if entry is None:
+            return
+        self._bytes -= entry["bytes"]
+        self._evicted += 1
+        shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+
+    def _evict_locked(self):
+        cutoff = time.time() - self.ttl_seconds
+        while self._jobs:
+            job_id, entry = next(iter(self._jobs.items()))
+            if entry["created_at"] >= cutoff and self._bytes <= self.max_bytes:
+                break
+            self._drop_locked(job_id)
+
+    def maybe_sweep(self):
+        """Run sweep() at most once per sweep_interval"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+        self.sweep()
+
+    def sweep(self) -> int:
+        """Apply the TTL and size cap to everything on disk, including other processes' jobs; returns entries removed"""
+        now = time.time()
+        entries = []
+        try:
+            with os.scandir(self.root) as scan:
+                for entry in scan:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            with os.scandir(entry.path) as files:
+                                size = sum(f.stat().st_size for f in files if f.is_file(follow_symlinks=False))
+                        else:
+                            size = entry.stat().st_size
+                        entries.append((entry.stat().st_mtime, size, entry))
+                    except OSError:
+                        continue
+        except OSError:
+            return 0
+
+        removed = 0
+        total = sum(size for _mtime, size, _entry in entries)
+        for mtime, size, entry in sorted(entries, key=lambda item: item[0]):
+            if now - mtime <= self.ttl_seconds and total <= self.max_bytes:
+                break
+            with self._lock:
+                if entry.name in self._jobs:
+                    self._drop_locked(entry.name)
+                elif entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    self._evicted += 1
+                else:
+                    try:
+                        os.remove(entry.path)  # loose files from before job directories
+                    except OSError:
+                        continue
+                    self._evicted += 1
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "jobs": len(self._jobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "evicted": self._evicted,
+                "memory_jobs": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_max_bytes": self.memory_max_bytes,
+                "spilled": self._spilled,
+            }
+
+
+def create_artifact_store_from_env() -> ArtifactStore:
+    """Build the store from ARTIFACT_* environment variables"""
+    return ArtifactStore(
+        root=os.getenv("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR),
+        ttl_seconds=int(os.getenv("ARTIFACT_TTL", str(24 * 3600))),
+        max_bytes=int(float(os.getenv("ARTIFACT_MAX_MB", "2048")) * 1024 * 1024),
+        sweep_interval=int(os.getenv("ARTIFACT_SWEEP_INTERVAL", "60")),
+        memory_max_bytes=int(float(os.getenv("ARTIFACT_MEMORY_MB", "0")) * 1024 * 1024),
+        spill=os.getenv("ARTIFACT_SPILL", "true").strip().lower() in ("1", "true", "yes", "on"),
+    )
@@ -0,0 +1,240 @@
+"""
+Extraction backends
+The model call behind extract_with_gemini is pluggable so the pipeline can run
+against Gemini, replayed fixtures, or a deterministic fake with configurable latency
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from modules.schemas import template_fields
+
+
+class ExtractionBackend:
+    """Turns a prompt plus one image part into the model's raw response text
+
+    When response_schema is given, backends that support it constrain the
+    response to JSON matching that schema.
+    """
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str, image_part: Dict[str, Any], doc_type: str,
+                 timeout: Optional[float] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        raise NotImplementedError
+
+    def generate_batch(self, prompt: str, image_parts: List[Dict[str, Any]], doc_type: str,
+                       timeout: Optional[float] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Like generate, for several labelled images answered as one JSON array"""
+        raise NotImplementedError
+
+    def health(self) -> Dict[str, Any]:
+        return {"status": "ok", "backend": self.name}
+
+
+class GeminiBackend(ExtractionBackend):
+    """Calls the shared Gemini model from a ModelProvider"""
+
+    name = "gemini"
+
+    def __init__(self, model_provider):
+        self.model_provider = model_provider
+
+    @property
+    def available(self) -> bool:
+        return self.model_provider.get() is not None
+
+    def generate(self, prompt: str, image_part: Dict[str, Any], doc_type: str,
+                 timeout: Optional[float] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        return self._generate([prompt, image_part], timeout, response_schema)
+
+    def generate_batch(self, prompt: str, image_parts: List[Dict[str, Any]], doc_type: str,
+                       timeout: Optional[float] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        contents = [prompt]
+        for number, image_part in enumerate(image_parts, 1):
+            contents.extend([f"Image {number}:", image_part])
+        return self._generate(contents, timeout, response_schema)
+
+    def _generate(self, contents, timeout, response_schema):
+        request_options = {"timeout": timeout} if timeout else None
+        generation_config = None
+        if response_schema is not None:
+            generation_config = {"response_mime_type": "application/json", "response_schema": response_schema}
+        response = self.model_provider.get().generate_content(
+            contents, generation_config=generation_config, request_options=request_options
+        )
+        return response.text
+
+    def health(self) -> Dict[str, Any]:
+        return dict(self.model_provider.health(), backend=self.name)
+
+
+_SAMPLE_VALUES = {
+    "passport_number": "TZ1234567",
+    "card_number": "SRC1234567890",
+    "license_number": "D1234567",
+    "surname": "DOE",
+    "given_names": "JANE",
+    "nationality": "UNITED STATES",
+    "place_of_birth": "CALIFORNIA",
+    "country_of_birth": "JAPAN",
+    "sex": "F",
+    "issuing_authority": "UNITED STATES DEPARTMENT OF STATE",
+    "state": "CA",
+}
+
+
+def sample_record(prompt: str, seed: int = 0, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Deterministic, well-formed record for the fields a prompt asks for
+
+    Enum fields in the response schema cycle through their choices by seed.
+    """
+    properties = (schema or {}).get("properties", {})
+    record = {}
+    for field, declared in template_fields(prompt).items():
+        choices = properties.get(field, {}).get("enum")
+        if choices:
+            record[field] = choices[seed % len(choices)]
+        elif declared == "number":
+            record[field] = 0.9
+        elif declared == "boolean":
+            record[field] = True
+        elif declared == "YYYY-MM-DD":
+            year = {"date_of_issue": 2020, "date_of_expiration": 2030}.get(field, 1970 + seed % 40)
+            record[field] = f"{year}-0{1 + seed % 9}-1{seed % 10}"
+        else:
+            record[field] = _SAMPLE_VALUES.get(field, field.replace("_", " ").upper())
+    return record
+
+
+class FixtureReplayBackend(ExtractionBackend):
+    """Replays recorded responses from a fixture directory
+
+    Lookup order: <sha256 of the image payload>.json, then <doc type>.json
+    (lowercase, non-alphanumerics as underscores), then default.json.
+    """
+
+    name = "fixture"
+
+    def __init__(self, fixture_dir: str):
+        if not os.path.isdir(fixture_dir):
+            raise ValueError(f"Fixture directory not found: {fixture_dir}")
+        self.fixture_dir = fixture_dir
+        self._cache: Dict[str, Optional[str]] = {}
+        self._lock = Lock()
+
+    def _load(self, name: str) -> Optional[str]:
+        with self._lock:
+            if name not in self._cache:
+                path = os.path.join(self.fixture_dir, name + ".json")
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        self._cache[name] = f.read()
+                else:
+                    self._cache[name] = None
+            return self._cache[name]
+
+    def generate(self, prompt: str, image_part: Dict[str, Any], doc_type: str,
+                 timeout: Optional[float] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        data = image_part["data"]
+        digest = hashlib.sha256(data if isinstance(data, bytes) else data.encode()).hexdigest()
+        for name in (digest, re.sub(r"[^a-z0-9]+", "_", doc_type.lower()).strip("_"), "default"):
+            text = self._load(name)
+            if text is not None:
+                return text
+        raise FileNotFoundError(f"No fixture for {doc_type} ({digest[:12]}) in {self.fixture_dir}")
+
+    def generate_batch(self, prompt: str, image_parts: List[Dict[str, Any]], doc_type: str,
+                       timeout: Optional[float] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        records = []
+        for number, image_part in enumerate(image_parts, 1):
+            record = json.loads(self.generate(prompt, image_part, doc_type, timeout, response_schema))
+            record["image_index"] = number
+            records.append(record)
+        return json.dumps(records)
+
+
+class FakeBackend(ExtractionBackend):
+    """Offline stand-in that sleeps for a configurable latency and returns a sample record
+
+    Latency is latency_ms plus uniform jitter, plus tail_ms on a tail_rate
+    share of calls to model a slow long tail; error_rate injects failures
+    with a quota-style message so error handling can be exercised. A seed
+    makes the latency and error sequence reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_message: str = "429 Resource has been exhausted (e.g. check quota).",
+                 seed: Optional[int] = None, tail_rate: float = 0.0, tail_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.error_rate = error_rate
+        self.error_message = error_message
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self.calls = 0
+
+    def _call(self, timeout: Optional[float]) -> int:
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+            if self._random.random() < self.tail_rate:
+                delay += self.tail_ms / 1000
+            fail = self._random.random() < self.error_rate
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Fake model call exceeded {timeout:.1f}s timeout")
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(self.error_message)
+        return call
+
+    def generate(self, prompt: str, image_part: Dict[str, Any], doc_type: str,
+                 timeout: Optional[float] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        return json.dumps(sample_record(prompt, self._call(timeout), response_schema))
+
+    def generate_batch(self, prompt: str, image_parts: List[Dict[str, Any]], doc_type: str,
+                       timeout: Optional[float] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        call = self._call(timeout)
+        return json.dumps([
+            dict(sample_record(prompt, call + number), image_index=number)
+            for number in range(1, len(image_parts) + 1)
+        ])
+
+
+def create_backend_from_env(model_provider) -> ExtractionBackend:
+    """Select the backend with EXTRACTION_BACKEND (gemini, fixture or fake)"""
+    backend = os.getenv("EXTRACTION_BACKEND", "gemini").strip().lower()
+    if backend == "gemini":
+        return GeminiBackend(model_provider)
+    if backend == "fixture":
+        fixture_dir = os.getenv("FIXTURE_DIR", "").strip()
+        if not fixture_dir:
+            raise ValueError("EXTRACTION_BACKEND=fixture needs FIXTURE_DIR, a directory of recorded responses")
+        return FixtureReplayBackend(fixture_dir)
+    if backend == "fake":
+        seed = os.getenv("FAKE_SEED")
+        return FakeBackend(
+            latency_ms=float(os.getenv("FAKE_LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv("FAKE_JITTER_MS", "0")),
+            error_rate=float(os.getenv("FAKE_ERROR_RATE", "0")),
+            seed=int(seed) if seed else None,
+            tail_rate=float(os.getenv("FAKE_TAIL_RATE", "0")),
+            tail_ms=float(os.getenv("FAKE_TAIL_MS", "0")),
+        )
+    raise ValueError(f"Unknown EXTRACTION_BACKEND: {backend}")
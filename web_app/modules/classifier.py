@@ -0,0 +1,105 @@
+"""
+Document-type classification for mixed uploads
+Cheap local signals (a validated passport MRZ, filename keywords) are tried
+first; app.py falls back to a small model call when they are not confident
+enough. Every result carries the chosen PROMPTS key, a confidence and the
+method that produced it
+"""
+
+import os
+import re
+from typing import Any, Dict, Iterable, Optional
+
+from modules.mrz import read_mrz
+
+AUTO_DOC_TYPE = "auto"
+
+# Local guesses below this confidence are confirmed with the model
+CLASSIFY_MIN_CONFIDENCE = float(os.getenv("CLASSIFY_MIN_CONFIDENCE", "0.8"))
+
+# Issuing-state code on line 1 of a passport MRZ -> document type
+_MRZ_ISSUERS = {
+    "USA": "US Passport",
+    "JPN": "Japanese Passport",
+}
+
+# Filename keywords -> document type; a filename matching more than one type is ignored
+_FILENAME_HINTS = (
+    (re.compile(r"green[\s_-]*card|permanent[\s_-]*resident|\bprc\b|\bi[\s_-]*551\b"), "US Permanent Resident Card"),
+    (re.compile(r"driver|licen[cs]e|\bdl\b"), "US Driver's License"),
+    (re.compile(r"passport.*(?:japan|\bjpn?\b)|(?:japan|\bjpn?\b).*passport|旅券|パスポート"), "Japanese Passport"),
+    (re.compile(r"passport.*\busa?\b|\busa?\b.*passport"), "US Passport"),
+)
+# Below CLASSIFY_MIN_CONFIDENCE: a filename alone never skips the model, it only wins when the model fails
+_FILENAME_CONFIDENCE = 0.6
+
+
+def unclassified(method: str = "none") -> Dict[str, Any]:
+    return {"document_type": None, "confidence": 0.0, "method": method}
+
+
+def classify_by_mrz(image) -> Optional[Dict[str, Any]]:
+    """Passport type from the issuing state of a fully validated MRZ
+
+    The validated record comes back under "mrz_record" so extraction can use
+    it without a second OCR pass; pop it before returning the classification.
+    """
+    record = read_mrz(image)
+    if record is None:
+        return None
+    doc_type = _MRZ_ISSUERS.get(record["machine_readable_zone"][2:5])
+    if doc_type is None:
+        return None
+    return {"document_type": doc_type, "confidence": 0.99, "method": "mrz", "mrz_record": record}
+
+
+def classify_by_filename(filename: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Document type suggested by keywords in the upload's filename"""
+    name = re.sub(r"\.[a-z0-9]+$", "", (filename or "").lower()).replace("_", " ")
+    matches = {doc_type for pattern, doc_type in _FILENAME_HINTS if pattern.search(name)}
+    if len(matches) != 1:
+        return None
+    return {"document_type": matches.pop(), "confidence": _FILENAME_CONFIDENCE, "method": "filename"}
+
+
+def classify_locally(image, filename: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Best local guess, strongest signal first; None when nothing matched"""
+    return classify_by_mrz(image) or classify_by_filename(filename)
+
+
+def classification_prompt(doc_types: Iterable[str]) -> str:
+    choices = "\n".join(f"- {doc_type}" for doc_type in doc_types)
+    return f"""You are an expert at identifying identity documents. Decide which of the following document types this image shows:
+{choices}
+
+Return ONLY a valid JSON object with the following fields, no extra text or markdown:
+{{
+  "document_type": "one of the document types above, exactly as written",
+  "confidence": "number"
+}}"""
+
+
+def classification_schema(doc_types: Iterable[str]) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "document_type": {"type": "string", "format": "enum", "enum": list(doc_types)},
+            "confidence": {"type": "number"},
+        },
+        "required": ["document_type", "confidence"],
+    }
+
+
+def parse_classification(parsed: Any, doc_types: Iterable[str]) -> Dict[str, Any]:
+    """Validate a model classification against the known document types"""
+    if not isinstance(parsed, dict):
+        return unclassified("model")
+    by_name = {doc_type.lower(): doc_type for doc_type in doc_types}
+    doc_type = by_name.get(str(parsed.get("document_type", "")).strip().lower())
+    if doc_type is None:
+        return unclassified("model")
+    try:
+        confidence = min(1.0, max(0.0, float(parsed.get("confidence", 0.0))))
+    except (TypeError, ValueError):
+        confidence = 0.0
+    return {"document_type": doc_type, "confidence": round(confidence, 3), "method": "model"}
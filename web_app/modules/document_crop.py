@@ -0,0 +1,250 @@
+"""
+Document crop, deskew and orientation normalisation
+Runs on the decoded image before the final resize so the pixel budget is
+spent on the document rather than the table it lies on. EXIF orientation is
+applied first; with OpenCV installed the document quadrilateral is found and
+perspective-corrected, otherwise the frame is cropped to the bounding box of
+its edges. Portrait results of landscape-format IDs are turned upright
+"""
+
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+try:
+    import cv2
+except ImportError:  # optional dependency
+    cv2 = None
+
+DOCUMENT_CROP_ENABLED = os.getenv("DOCUMENT_CROP_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# The document must cover at least this share of the frame to be cropped to
+CROP_MIN_AREA = float(os.getenv("CROP_MIN_AREA", "0.1"))
+
+_DETECT_SIZE = 512
+_BOX_MARGIN = 0.02
+# A quadrilateral must enclose this share of the edge bounding box: on a tightly framed scan the
+# largest rectangle is the portrait photo, and cropping to it would drop every line of text
+_QUAD_MIN_CONTENT = 0.75
+# Content reaching this close (share of the side) to three or more frame borders means the frame is the document
+_FRAME_BORDER = 0.1
+
+
+def document_box(gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box (x0, y0, x1, y1) of strong edges, trimmed to their 2nd-98th percentile"""
+    gx = np.abs(np.diff(gray, axis=1))
+    gy = np.abs(np.diff(gray, axis=0))
+    threshold = max(20.0, float(gx.mean() + gx.std()))
+    ys, xs = np.nonzero((gx[:-1, :] > threshold) | (gy[:, :-1] > threshold))
+    if xs.size < 50:
+        return None
+    x0, x1 = np.percentile(xs, (2, 98)).astype(int)
+    y0, y1 = np.percentile(ys, (2, 98)).astype(int)
+    return x0, y0, x1 + 1, y1 + 1
+
+
+def _downscale(image: Image.Image) -> Tuple[float, np.ndarray]:
+    scale = min(1.0, _DETECT_SIZE / max(image.size))
+    small = image.convert("L").resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.BILINEAR)
+    return scale, np.asarray(small)
+
+
+def frame_is_document(box: Optional[Tuple[int, int, int, int]], shape: Tuple[int, int]) -> bool:
+    """True for a tight scan: the content runs to the frame on at least three sides"""
+    if box is None:
+        return False
+    height, width = shape
+    x0, y0, x1, y1 = box
+    gaps = (x0 / width, y0 / height, 1 - x1 / width, 1 - y1 / height)
+    return sum(gap <= _FRAME_BORDER for gap in gaps) >= 3
+
+
+def _order_corners(points: np.ndarray) -> np.ndarray:
+    """Corners as top-left, top-right, bottom-right, bottom-left"""
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)], points[np.argmin(diffs)],
+        points[np.argmax(sums)], points[np.argmax(diffs)],
+    ], dtype=np.float32)
+
+
+def _intersect(line_a, line_b) -> Optional[np.ndarray]:
+    (pa, da), (pb, db) = line_a, line_b
+    denominator = da[0] * db[1] - da[1] * db[0]
+    if abs(denominator) < 1e-6:
+        return None
+    t = ((pb[0] - pa[0]) * db[1] - (pb[1] - pa[1]) * db[0]) / denominator
+    return pa + t * da
+
+
+def refine_corners(image: Image.Image, corners: np.ndarray, search: int) -> np.ndarray:
+    """Snap a coarse quadrilateral to the document outline at full resolution
+
+    Along each side, the strongest gradient within +/- search pixels of the
+    normal is located (with sub-pixel peak interpolation), a robust line is
+    fitted through those points and adjacent lines are intersected.
+    """
+    x0, y0 = np.maximum(np.floor(corners.min(axis=0)) - search - 2, 0).astype(int)
+    x1, y1 = np.minimum(np.ceil(corners.max(axis=0)) + search + 3, image.size).astype(int)
+    gray = np.asarray(image.crop((x0, y0, x1, y1)).convert("L"), dtype=np.float32)
+    magnitude = cv2.magnitude(cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3), cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3))
+    local = corners - (x0, y0)
+    offsets = np.arange(-search, search + 1, dtype=np.float32)
+
+    lines = []
+    for start, end in zip(local, np.roll(local, -1, axis=0)):
+        direction = (end - start) / max(np.linalg.norm(end - start), 1e-6)
+        normal = np.array([-direction[1], direction[0]], dtype=np.float32)
+        points = start + np.linspace(0.1, 0.9, 48)[:, None] * (end - start)
+        samples = points[:, None, :] + offsets[None, :, None] * normal
+        xs = np.clip(np.rint(samples[..., 0]).astype(int), 0, magnitude.shape[1] - 1)
+        ys = np.clip(np.rint(samples[..., 1]).astype(int), 0, magnitude.shape[0] - 1)
+        profile = magnitude[ys, xs]
+        best = np.clip(profile.argmax(axis=1), 1, len(offsets) - 2)
+        rows = np.arange(len(points))
+        left, peak, right = profile[rows, best - 1], profile[rows, best], profile[rows, best + 1]
+        curvature = left - 2 * peak + right
+        shift = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1), 0)
+        edge = points + (offsets[best] + shift)[:, None] * normal
+        vx, vy, px, py = cv2.fitLine(edge.astype(np.float32), cv2.DIST_HUBER, 0, 0.01, 0.01).ravel()
+        lines.append((np.array([px, py]), np.array([vx, vy])))
+
+    refined = []
+    for index, coarse in enumerate(local):
+        corner = _intersect(lines[index - 1], lines[index])
+        if corner is None or np.linalg.norm(corner - coarse) > 2 * search:
+            corner = coarse
+        refined.append(corner)
+    return (np.array(refined) + (x0, y0)).astype(np.float32)
+
+
+def _content_share(quad: np.ndarray, box: Optional[Tuple[int, int, int, int]], shape: Tuple[int, int]) -> float:
+    """Share of the edge bounding box that lies inside the quadrilateral"""
+    if box is None:
+        return 1.0
+    x0, y0, x1, y1 = box
+    mask = np.zeros(shape, np.uint8)
+    cv2.fillConvexPoly(mask, np.rint(quad).astype(np.int32), 1)
+    return float(mask[y0:y1, x0:x1].mean()) if x1 > x0 and y1 > y0 else 1.0
+
+
+def find_document_quad(image: Image.Image) -> Optional[np.ndarray]:
+    """Corners of the largest convex quadrilateral holding the frame's content, in pixel-centre image coordinates
+
+    None without OpenCV, when no quadrilateral is found, or when the frame
+    already is the document (the candidates are boxes printed on it).
+    """
+    if cv2 is None:
+        return None
+    scale, small = _downscale(image)
+    content = document_box(small.astype(np.float32))
+    if frame_is_document(content, small.shape):
+        return None
+    gray = cv2.GaussianBlur(small, (5, 5), 0)
+    # Closing (not dilating) bridges gaps in the outline without pushing it outwards
+    edges = cv2.morphologyEx(cv2.Canny(gray, 50, 150), cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = CROP_MIN_AREA * gray.shape[0] * gray.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < min_area:
+            break
+        hull = cv2.convexHull(contour)
+        approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+        if len(approx) == 4 and _content_share(approx.reshape(4, 2), content, gray.shape) >= _QUAD_MIN_CONTENT:
+            coarse = _order_corners((approx.reshape(4, 2).astype(np.float32) + 0.5) / scale - 0.5)
+            return refine_corners(image, coarse, search=int(np.ceil(3 / scale)))
+    return None
+
+
+def warp_quad(image: Image.Image, corners: np.ndarray, max_side: int) -> Image.Image:
+    """Perspective-correct the quadrilateral into a rectangle no larger than max_side"""
+    tl, tr, br, bl = corners
+    width = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+    height = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+    scale = min(1.0, max_side / max(width, height))
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    # Corners are outer pixel edges; OpenCV addresses pixel centres, hence the half-pixel offsets
+    target = np.array([[0, 0], [size[0], 0], [size[0], size[1]], [0, size[1]]], dtype=np.float32) - 0.5
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    warped = cv2.warpPerspective(np.asarray(image), matrix, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return Image.fromarray(warped)
+
+
+def _detail(image: Image.Image) -> np.ndarray:
+    gray = np.asarray(image.convert("L").resize((256, 256)), dtype=np.float32)
+    return np.abs(np.diff(gray, axis=0))[:, :-1] + np.abs(np.diff(gray, axis=1))[:-1, :]
+
+
+def _text_runs_vertically(detail: np.ndarray) -> bool:
+    """Lines of text alternate with blank gaps across them, so the profile varies most perpendicular to the text"""
+    rows = detail.mean(axis=1)
+    cols = detail.mean(axis=0)
+    return cols.std() / (cols.mean() + 1e-6) > 1.15 * rows.std() / (rows.mean() + 1e-6)
+
+
+def upright(image: Image.Image) -> Tuple[Image.Image, int]:
+    """Turn a portrait crop whose text runs vertically by 90 degrees
+
+    An open passport booklet is portrait too, but its text is horizontal and
+    it is left alone. The turn direction puts the denser edge band (the MRZ
+    side on passports) at the bottom.
+    """
+    if image.height <= image.width * 1.1:
+        return image, 0
+    detail = _detail(image)
+    if not _text_runs_vertically(detail):
+        return image, 0
+    # Rotation is reported counter-clockwise; turning 90 degrees counter-clockwise brings the left edge to the bottom
+    if detail[:, :64].mean() >= detail[:, -64:].mean():
+        return image.transpose(Image.ROTATE_90), 90
+    return image.transpose(Image.ROTATE_270), 270
+
+
+def normalise_document(image: Image.Image, max_side: int) -> Tuple[Image.Image, Dict[str, Any]]:
+    """EXIF-orient, crop/deskew and upright a decoded image; returns (image, crop info)
+
+    The result is at most 2 x max_side on its long edge so the final LANCZOS
+    resize still has headroom.
+    """
+    info: Dict[str, Any] = {"method": None, "rotation": 0}
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if not DOCUMENT_CROP_ENABLED:
+        return image, info
+
+    source_area = image.width * image.height
+    scale = min(1.0, _DETECT_SIZE / max(image.size))
+    small = np.asarray(image.convert("L").resize((max(1, int(image.width * scale)), max(1, int(image.height * scale)))))
+    box = document_box(small.astype(np.float32))
+    corners = None
+    if frame_is_document(box, small.shape):
+        # Already cropped (a tight scan or an earlier crop); rectangles inside it are the photo or field boxes
+        info["method"] = "frame"
+        info["document_share"] = 1.0
+    else:
+        corners = find_document_quad(image)
+    if corners is not None:
+        info["method"] = "perspective"
+        info["corners"] = [[round(float(x)), round(float(y))] for x, y in corners]
+        info["document_share"] = round(float(cv2.contourArea(corners)) / source_area, 3)
+        image = warp_quad(image, corners, 2 * max_side)
+    elif info["method"] is None and box is not None:
+        x0, y0, x1, y1 = box
+        margin = _BOX_MARGIN * max(small.shape)
+        box = (
+            max(0, int((x0 - margin) / scale)), max(0, int((y0 - margin) / scale)),
+            min(image.width, int((x1 + margin) / scale)), min(image.height, int((y1 + margin) / scale)),
+        )
+        if (box[2] - box[0]) * (box[3] - box[1]) >= CROP_MIN_AREA * source_area:
+            image = image.crop(box)
+            info["method"] = "bounding_box"
+            info["box"] = list(box)
+            info["document_share"] = round(image.width * image.height / source_area, 3)
+
+    if info["method"] is not None:
+        image, info["rotation"] = upright(image)
+    return image, info
@@ -0,0 +1,90 @@
+"""
+Concurrent extraction engine
+Fans the per-file decode -> preprocess -> model call pipeline out across a bounded thread pool
+"""
+
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_MAX_WORKERS = int(os.getenv("EXTRACT_MAX_WORKERS", "4"))
+
+
+class ExtractionEngine:
+    """Bounded thread pool that runs per-file extraction work concurrently"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Create the pool on first use so importing the module stays cheap"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="extract"
+                    )
+        return self._executor
+
+    def map(
+        self,
+        func: Callable[[Any], Any],
+        items: Iterable[Any],
+        on_error: Optional[Callable[[Any, Exception], Any]] = None,
+    ) -> List[Any]:
+        """Run func over items concurrently and return results in input order
+
+        The pool is shared by every request in the process, so the number of
+        in-flight model calls never exceeds max_workers. An exception raised
+        for one item is turned into that item's result via on_error and never
+        affects the other items.
+        """
+        items = list(items)
+        if len(items) <= 1 or self.max_workers == 1:
+            return [self._run(func, item, on_error) for item in items]
+
+        futures = [self._submit(func, item, on_error) for item in items]
+        return [future.result() for future in futures]
+
+    def iter_completed(
+        self,
+        func: Callable[[Any], Any],
+        items: Iterable[Any],
+        on_error: Optional[Callable[[Any, Exception], Any]] = None,
+    ) -> Iterator[Tuple[int, Any]]:
+        """Submit every item up front and yield (index, result) as each one finishes"""
+        futures = {
+            self._submit(func, item, on_error): index
+            for index, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def _submit(self, func, item, on_error):
+        # Each task runs in a copy of the caller's context so log records keep its request id
+        return self.executor.submit(contextvars.copy_context().run, self._run, func, item, on_error)
+
+    @staticmethod
+    def _run(func, item, on_error):
+        try:
+            return func(item)
+        except Exception as e:
+            if on_error is None:
+                return {"error": str(e)}
+            return on_error(item, e)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool; a new one is created on the next call"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+# Shared engine for the web app
+extraction_engine = ExtractionEngine()
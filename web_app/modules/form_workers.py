@@ -0,0 +1,178 @@
+"""
+Batch form generation on a pool of pre-warmed worker processes
+Each worker builds its own JapaneseFormGenerator with the PDF template
+already parsed and python-docx imported, then renders whole families (PDF,
+DOCX and email text) on request. pikepdf and python-docx hold the GIL, so
+processes rather than threads are what let throughput grow with cores.
+Stage timings measured inside a worker are replayed into this process's
+metrics
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from modules.metrics import STAGE_CPU_SECONDS, STAGE_SECONDS
+from modules.request_log import configure_logging, current_request_id, request_id_bound
+
+# Processes rendering forms; 0 renders in the calling thread
+FORM_WORKERS = int(os.getenv("FORM_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Start the workers (and load the template in each) when the app starts rather than on the first batch
+FORM_WORKERS_PREWARM = os.getenv("FORM_WORKERS_PREWARM", "true").strip().lower() in ("1", "true", "yes", "on")
+MAX_BATCH_FAMILIES = int(os.getenv("MAX_BATCH_FAMILIES", "500"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = Lock()
+_inline_lock = Lock()
+
+# Per-process generator, created by the worker initializer
+_generator = None
+
+
+def _init_worker():
+    """Load the mapping, parse the PDF template and import python-docx once per process"""
+    global _generator
+    from docx import Document
+    from modules.pdf_generator import JapaneseFormGenerator
+
+    configure_logging()
+    _generator = JapaneseFormGenerator()
+    _generator.load_template()
+    Document()  # first use reads python-docx's default template and builds its lxml parser
+    return _generator
+
+
+def _warm(hold: float) -> int:
+    time.sleep(hold)  # keep this worker busy so the next warm-up task goes to another one
+    return os.getpid()
+
+
+def _inline_generator():
+    with _inline_lock:
+        return _generator or _init_worker()
+
+
+def _stage_totals() -> Dict[str, Tuple[float, float]]:
+    cpu = {dict(key)["stage"]: value for key, value in STAGE_CPU_SECONDS.values().items()}
+    return {
+        dict(key)["stage"]: (total, cpu.get(dict(key)["stage"], 0.0))
+        for key, (_count, total) in STAGE_SECONDS.totals().items()
+    }
+
+
+def _render_family(members: Dict[str, Dict[str, Any]], output_dir: str, job_id: str,
+                   request_id: str, in_memory: bool) -> Dict[str, Any]:
+    """Render one family's PDF, DOCX and email text; runs inside a worker process"""
+    generator = _generator or _init_worker()
+    before = _stage_totals()
+    with request_id_bound(request_id):
+        result = generator.process_multiple_members(members, output_dir=output_dir, job_id=job_id, in_memory=in_memory)
+    after = _stage_totals()
+    result["stages"] = [
+        (stage, wall - before.get(stage, (0.0, 0.0))[0], cpu - before.get(stage, (0.0, 0.0))[1])
+        for stage, (wall, cpu) in after.items()
+        if wall > before.get(stage, (0.0, 0.0))[0]
+    ]
+    return result
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the app process is multi-threaded by the time the first batch arrives
+            _pool = ProcessPoolExecutor(
+                FORM_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+            )
+        return _pool
+
+
+def _discard(pool: ProcessPoolExecutor):
+    """Drop a pool whose worker died (killed, out of memory) so the next batch starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(fn, *args) -> Tuple[ProcessPoolExecutor, Future]:
+    """Queue a task, replacing the pool first if it is already broken"""
+    pool = _executor()
+    try:
+        return pool, pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _discard(pool)
+        pool = _executor()
+        return pool, pool.submit(fn, *args)
+
+
+def prewarm() -> List[int]:
+    """Start the workers now so they load the template before the first batch; returns the pids that answered"""
+    if FORM_WORKERS <= 0:
+        _inline_generator()
+        return [os.getpid()]
+    # Every submit that finds no idle worker spawns one, and a worker runs the initializer before its first task
+    futures = [_submit(_warm, 0.1)[1] for _ in range(FORM_WORKERS)]
+    return sorted({future.result() for future in futures})
+
+
+def _replay_stages(result: Dict[str, Any]):
+    for stage, wall, cpu in result.pop("stages", []):
+        STAGE_SECONDS.observe(wall, stage=stage)
+        STAGE_CPU_SECONDS.inc(cpu, stage=stage)
+
+
+def render_families(families: List[Tuple[Dict[str, Dict[str, Any]], str, str]],
+                    in_memory: bool = False) -> Iterator[Tuple[int, Any]]:
+    """Yield (index, result or exception) for each (members, job_id, output_dir) as soon as it is rendered
+
+    With in_memory the files come back as bytes in the result and output_dir is unused
+    """
+    families = [(members, job_id, os.path.abspath(output_dir)) for members, job_id, output_dir in families]
+    request_id = current_request_id()
+    if FORM_WORKERS <= 0:
+        for index, (members, job_id, output_dir) in enumerate(families):
+            try:
+                result = _inline_generator().process_multiple_members(members, output_dir=output_dir, job_id=job_id,
+                                                                      in_memory=in_memory)
+                yield index, result
+            except Exception as e:
+                yield index, e
+        return
+
+    # A worker death fails every family in flight; those get one more try on a fresh pool
+    todo = list(enumerate(families))
+    for last_round in (False, True):
+        futures = {}
+        for index, (members, job_id, output_dir) in todo:
+            pool, future = _submit(_render_family, members, output_dir, job_id, request_id, in_memory)
+            futures[future] = (index, pool)
+        todo = []
+        try:
+            for future in as_completed(futures):
+                index, pool = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    _discard(pool)
+                    if last_round:
+                        yield index, e
+                    else:
+                        todo.append((index, families[index]))
+                    continue
+                except Exception as e:
+                    yield index, e
+                    continue
+                _replay_stages(result)
+                yield index, result
+        finally:
+            # A client that disconnects mid-stream should not keep the pool busy
+            for future in futures:
+                future.cancel()
+        if not todo:
+            return
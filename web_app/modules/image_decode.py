@@ -0,0 +1,81 @@
+"""
+Memory-bounded upload decoding
+Rejects oversized uploads before decoding, spools detached uploads to disk,
+and uses JPEG draft mode so large phone photos are never materialised at full resolution
+"""
+
+import os
+import shutil
+import tempfile
+from typing import Any, BinaryIO, Dict, Tuple
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+# Pixel budget: the long edge of the image sent to the model
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+TARGET_SIZE = (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE)
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+MAX_SOURCE_PIXELS = int(float(os.getenv("MAX_SOURCE_MEGAPIXELS", "64")) * 1_000_000)
+SPOOL_THRESHOLD_BYTES = int(os.getenv("UPLOAD_SPOOL_THRESHOLD_BYTES", str(512 * 1024)))
+
+# Pillow keeps multi-band images at 4 bytes per pixel internally
+_BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I": 4, "F": 4}
+
+
+def bitmap_bytes(mode: str, size: Tuple[int, int]) -> int:
+    """Memory Pillow needs to hold a decoded image of this mode and size"""
+    return size[0] * size[1] * _BYTES_PER_PIXEL.get(mode, 4)
+
+
+def stream_size(stream: BinaryIO) -> int:
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def spool_upload(file: FileStorage) -> FileStorage:
+    """Copy an upload off the request body; anything above the threshold goes to a temp file"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD_BYTES)
+    file.stream.seek(0)
+    shutil.copyfileobj(file.stream, spooled)
+    spooled.seek(0)
+    return FileStorage(stream=spooled, filename=file.filename, content_type=file.content_type)
+
+
+def decode_upload(stream: BinaryIO, target_size: Tuple[int, int] = TARGET_SIZE) -> Tuple[Image.Image, Dict[str, Any]]:
+    """Decode an upload at the smallest resolution that still covers target_size
+
+    Only the header is read before the size checks, so oversized files and
+    decompression bombs are rejected without allocating a bitmap. JPEGs are
+    decoded with draft mode (DCT scaling by 1/2, 1/4 or 1/8), keeping at
+    least twice the target so the final LANCZOS resize stays sharp.
+    """
+    upload_bytes = stream_size(stream)
+    if upload_bytes > MAX_UPLOAD_BYTES:
+        raise ValueError(f"File is {upload_bytes / 1048576:.1f} MB; the limit is {MAX_UPLOAD_BYTES / 1048576:.0f} MB")
+
+    image = Image.open(stream)
+    source_size = image.size
+    if source_size[0] * source_size[1] > MAX_SOURCE_PIXELS:
+        raise ValueError(
+            f"Image is {source_size[0]}x{source_size[1]}; the limit is {MAX_SOURCE_PIXELS / 1_000_000:.0f} megapixels"
+        )
+
+    if image.format == "JPEG":
+        scale = min(1.0, target_size[0] / source_size[0], target_size[1] / source_size[1])
+        requested = (int(source_size[0] * scale * 2), int(source_size[1] * scale * 2))
+        image.draft("RGB" if image.mode in ("RGB", "CMYK", "YCbCr") else image.mode, requested)
+
+    image.load()
+    stats = {
+        "format": image.format,
+        "upload_bytes": upload_bytes,
+        "source_size": list(source_size),
+        "decoded_size": list(image.size),
+        "full_bitmap_bytes": bitmap_bytes(image.mode, source_size),
+        "peak_bitmap_bytes": max(bitmap_bytes(image.mode, image.size), bitmap_bytes("RGB", image.size)),
+    }
+    return image, stats
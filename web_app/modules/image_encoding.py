@@ -0,0 +1,81 @@
+"""
+Size-aware image encoding for model payloads
+Picks a lossy format and the highest quality that fits a byte budget,
+and returns raw bytes for the client library instead of a base64 string
+"""
+
+import io
+import os
+from typing import Any, Dict, Tuple
+
+from PIL import Image, features
+
+PAYLOAD_MAX_BYTES = int(os.getenv("MODEL_PAYLOAD_MAX_BYTES", "350000"))
+PAYLOAD_FORMAT = os.getenv("MODEL_PAYLOAD_FORMAT", "JPEG").upper()
+PAYLOAD_MAX_QUALITY = int(os.getenv("MODEL_PAYLOAD_MAX_QUALITY", "90"))
+PAYLOAD_MIN_QUALITY = int(os.getenv("MODEL_PAYLOAD_MIN_QUALITY", "60"))
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        image.save(buffer, format="JPEG", quality=quality, optimize=False, subsampling="4:2:0")
+    elif fmt == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=2)
+    else:
+        image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def payload_format(requested: str = PAYLOAD_FORMAT) -> str:
+    """Fall back to JPEG when this Pillow build cannot write WebP"""
+    if requested == "WEBP" and not features.check("webp"):
+        return "JPEG"
+    return requested if requested in MIME_TYPES else "JPEG"
+
+
+def encode_for_model(
+    image: Image.Image,
+    max_bytes: int = PAYLOAD_MAX_BYTES,
+    fmt: str = PAYLOAD_FORMAT,
+    max_quality: int = PAYLOAD_MAX_QUALITY,
+    min_quality: int = PAYLOAD_MIN_QUALITY,
+) -> Tuple[str, bytes, Dict[str, Any]]:
+    """Encode image as (mime_type, data, info) at the best quality under max_bytes
+
+    Quality is binary-searched between min_quality and max_quality. If even
+    min_quality is over budget the image is downscaled and searched again,
+    so the result always fits unless the image is already tiny.
+    """
+    fmt = payload_format(fmt)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    if fmt == "PNG":
+        data = _encode(image, fmt, 0)
+        return MIME_TYPES[fmt], data, {"format": fmt, "quality": None, "size": image.size, "bytes": len(data)}
+
+    while True:
+        data = _encode(image, fmt, max_quality)
+        quality = max_quality
+        if len(data) > max_bytes:
+            best = None
+            low, high = min_quality, max_quality - 1
+            while low <= high:
+                mid = (low + high) // 2
+                candidate = _encode(image, fmt, mid)
+                if len(candidate) <= max_bytes:
+                    best, quality = candidate, mid
+                    low = mid + 1
+                else:
+                    high = mid - 1
+            if best is None and min(image.size) > 256:
+                width, height = image.size
+                image = image.resize((int(width * 0.8), int(height * 0.8)), Image.LANCZOS)
+                continue
+            data = best if best is not None else _encode(image, fmt, min_quality)
+            if best is None:
+                quality = min_quality
+        return MIME_TYPES[fmt], data, {"format": fmt, "quality": quality, "size": image.size, "bytes": len(data)}
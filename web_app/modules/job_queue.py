@@ -0,0 +1,370 @@
+"""
+Asynchronous batch extraction jobs
+Uploads are queued per file and processed by an in-process worker pool;
+job status and per-file results live in SQLite so any worker can answer a poll.
+Files whose worker died (or whose queue was lost in a restart) are eventually
+marked failed rather than left queued forever
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from modules.request_log import request_id_bound
+
+DEFAULT_JOB_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "jobs.sqlite3")
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "job_spool")
+
+
+class MemoryTaskQueue:
+    """FIFO queue held in process memory"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def put(self, task: Dict[str, Any]):
+        self._queue.put(task)
+
+    def get(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def ack(self, task: Dict[str, Any]):
+        """Tasks leave memory when they are taken; nothing to release"""
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class FileSystemTaskQueue:
+    """FIFO queue spooled to disk, so queued uploads do not sit in RAM
+
+    Tasks are claimed with an atomic rename, which also makes the spool safe
+    to share between gunicorn workers on the same host. A claim is a lease:
+    the task stays on disk until ack(), and a claim older than lease_seconds
+    (its worker died) goes back on the queue, up to max_attempts claims, after
+    which get() hands it out once more marked with a "failure" to record.
+    """
+
+    def __init__(self, spool_dir: str = DEFAULT_SPOOL_DIR, lease_seconds: float = 900.0, max_attempts: int = 3):
+        self.spool_dir = spool_dir
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        os.makedirs(spool_dir, exist_ok=True)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._available = threading.Event()
+        self._next_reclaim = 0.0
+
+    def put(self, task: Dict[str, Any]):
+        with self._lock:
+            self._sequence += 1
+            name = f"{time.time_ns():020d}-{os.getpid()}-{self._sequence:06d}"
+        payload = task.pop("data")
+        data_path = os.path.join(self.spool_dir, name + ".bin")
+        with open(data_path, "wb") as f:
+            f.write(payload)
+        task["data_path"] = data_path
+        tmp_path = os.path.join(self.spool_dir, name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(task, f)
+        os.rename(tmp_path, os.path.join(self.spool_dir, name + ".task"))
+        self._available.set()
+
+    def get(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            expired = self._reclaim_expired()
+            if expired is not None:
+                return expired
+            for name in sorted(n for n in os.listdir(self.spool_dir) if n.endswith(".task")):
+                task_path = os.path.join(self.spool_dir, name)
+                claimed_path = task_path[:-5] + ".claimed"
+                try:
+                    os.rename(task_path, claimed_path)
+                except OSError:
+                    continue  # another worker claimed it first
+                os.utime(claimed_path)  # the lease runs from the claim, not from put()
+                with open(claimed_path, "r", encoding="utf-8") as f:
+                    task = json.load(f)
+                with open(task["data_path"], "rb") as f:
+                    task["data"] = f.read()
+                task["claim_path"] = claimed_path
+                return task
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self._available.clear()
+            self._available.wait(min(remaining, 0.25))
+
+    def ack(self, task: Dict[str, Any]):
+        """Remove a finished task's files, ending its lease"""
+        for path in (task.get("claim_path"), task.get("data_path")):
+            try:
+                os.remove(path)
+            except (OSError, TypeError):
+                pass
+
+    def _reclaim_expired(self) -> Optional[Dict[str, Any]]:
+        """Requeue claims past their lease; returns one that ran out of attempts, marked with its failure"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_reclaim:
+                return None
+            self._next_reclaim = now + min(30.0, self.lease_seconds / 4)
+        cutoff = time.time() - self.lease_seconds
+        for name in sorted(n for n in os.listdir(self.spool_dir) if n.endswith(".claimed")):
+            claimed_path = os.path.join(self.spool_dir, name)
+            reclaim_path = claimed_path[:-8] + ".reclaim"
+            try:
+                if os.stat(claimed_path).st_mtime >= cutoff:
+                    continue
+                os.rename(claimed_path, reclaim_path)  # only one process gets to requeue it
+                with open(reclaim_path, "r", encoding="utf-8") as f:
+                    task = json.load(f)
+            except (OSError, ValueError):
+                continue
+            task["attempts"] = task.get("attempts", 0) + 1
+            if task["attempts"] >= self.max_attempts:
+                task["claim_path"] = reclaim_path
+                task["failure"] = f"Worker did not finish this file after {task['attempts']} attempts"
+                with self._lock:
+                    self._next_reclaim = 0.0  # there may be more
+                return task
+            tmp_path = claimed_path[:-8] + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(task, f)
+            os.rename(tmp_path, claimed_path[:-8] + ".task")
+            os.remove(reclaim_path)
+            self._available.set()
+        return None
+
+    def qsize(self) -> int:
+        return sum(1 for n in os.listdir(self.spool_dir) if n.endswith(".task"))
+
+
+class JobStore:
+    """SQLite record of jobs and their per-file results"""
+
+    def __init__(self, path: str = DEFAULT_JOB_DB_PATH, ttl_seconds: int = 24 * 3600, stale_seconds: int = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        # Files queued or running without an update for this long are failed (their task was lost)
+        self.stale_seconds = stale_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    doc_type TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS job_files (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                )"""
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create(self, job_id: str, doc_type: str, filenames: List[str]):
+        now = time.time()
+        conn = self._connect()
+        try:
+            self._expire(conn, now)
+            conn.execute(
+                "INSERT INTO jobs (id, doc_type, total, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, doc_type, len(filenames), now),
+            )
+            conn.executemany(
+                "INSERT INTO job_files (job_id, idx, filename, status, updated_at) VALUES (?, ?, ?, 'queued', ?)",
+                [(job_id, idx, filename, now) for idx, filename in enumerate(filenames)],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def set_status(self, job_id: str, idx: int, status: str, result: Optional[Dict[str, Any]] = None):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE job_files SET status = ?, result = ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 time.time(), job_id, idx),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job summary plus per-file status and results in upload order"""
+        conn = self._connect()
+        try:
+            self._fail_stale(conn, job_id, time.time())
+            job = conn.execute(
+                "SELECT doc_type, total, created_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            rows = conn.execute(
+                "SELECT idx, filename, status, result FROM job_files WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        files = []
+        for idx, filename, status, result in rows:
+            entry = {"index": idx, "filename": filename, "status": status}
+            if result is not None:
+                entry["result"] = json.loads(result)
+            files.append(entry)
+        completed = sum(1 for f in files if f["status"] == "done")
+        failed = sum(1 for f in files if f["status"] == "failed")
+        if completed + failed == job[1]:
+            status = "failed" if failed == job[1] else "done"
+        else:
+            status = "queued" if all(f["status"] == "queued" for f in files) else "running"
+        return {
+            "job_id": job_id,
+            "doc_type": job[0],
+            "status": status,
+            "total": job[1],
+            "completed": completed,
+            "failed": failed,
+            "created_at": job[2],
+            "files": files,
+        }
+
+    def _fail_stale(self, conn: sqlite3.Connection, job_id: str, now: float):
+        stale = conn.execute(
+            "SELECT idx, filename FROM job_files WHERE job_id = ? AND status IN ('queued', 'running') AND updated_at < ?",
+            (job_id, now - self.stale_seconds),
+        ).fetchall()
+        if not stale:
+            return
+        conn.executemany(
+            "UPDATE job_files SET status = 'failed', result = ?, updated_at = ? "
+            "WHERE job_id = ? AND idx = ? AND status IN ('queued', 'running')",
+            [(json.dumps({"filename": filename, "error": "Processing was interrupted; please resubmit this file"},
+                         ensure_ascii=False), now, job_id, idx) for idx, filename in stale],
+        )
+        conn.commit()
+
+    def _expire(self, conn: sqlite3.Connection, now: float):
+        cutoff = now - self.ttl_seconds
+        conn.execute(
+            "DELETE FROM job_files WHERE job_id IN (SELECT id FROM jobs WHERE created_at < ?)", (cutoff,)
+        )
+        conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,))
+
+
+class JobManager:
+    """Accepts batch jobs and runs their files on a pool of worker threads"""
+
+    def __init__(
+        self,
+        processor: Callable[[str, bytes, str, bool], Dict[str, Any]],
+        task_queue=None,
+        store: Optional[JobStore] = None,
+        workers: int = 4,
+        start: bool = True,
+    ):
+        self.processor = processor
+        self.task_queue = task_queue or MemoryTaskQueue()
+        self.store = store or JobStore()
+        self.workers = max(1, workers)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        if start:
+            # A spooled queue may still hold tasks from before a restart
+            self._ensure_workers()
+
+    def submit(self, doc_type: str, files: List[Tuple[str, bytes]], use_cache: bool = True) -> str:
+        """Queue every file of a batch and return the new job id immediately"""
+        self._ensure_workers()
+        job_id = str(uuid.uuid4())
+        self.store.create(job_id, doc_type, [filename for filename, _ in files])
+        for idx, (filename, data) in enumerate(files):
+            self.task_queue.put({
+                "job_id": job_id,
+                "index": idx,
+                "filename": filename,
+                "doc_type": doc_type,
+                "use_cache": use_cache,
+                "data": data,
+            })
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            task = self.task_queue.get(timeout=1.0)
+            if task is None:
+                continue
+            job_id, idx = task["job_id"], task["index"]
+            if "failure" in task:
+                self.store.set_status(job_id, idx, "failed", {"filename": task["filename"], "error": task["failure"]})
+                self.task_queue.ack(task)
+                continue
+            self.store.set_status(job_id, idx, "running")
+            try:
+                with request_id_bound(job_id):
+                    result = self.processor(task["filename"], task["data"], task["doc_type"], task["use_cache"])
+            except Exception as e:
+                result = {"filename": task["filename"], "error": str(e)}
+            self.store.set_status(job_id, idx, "done", result)
+            self.task_queue.ack(task)
+
+    def stop(self):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self._stopping.clear()
+
+
+def create_task_queue_from_env():
+    """Select the queue backend with JOB_QUEUE_BACKEND (memory or filesystem)"""
+    backend = os.getenv("JOB_QUEUE_BACKEND", "memory").strip().lower()
+    if backend == "filesystem":
+        return FileSystemTaskQueue(
+            os.getenv("JOB_SPOOL_DIR", DEFAULT_SPOOL_DIR),
+            lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "900")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        )
+    if backend != "memory":
+        raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {backend}")
+    return MemoryTaskQueue()
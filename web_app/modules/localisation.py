@@ -0,0 +1,152 @@
+"""
+Japanese names for the countries and places printed on passports
+Country names and codes (ISO 3166-1 and ICAO 9303 nationality codes), US
+states and Japanese prefectures are read once from pdf_config/localisation.json
+into dictionaries keyed by normalised English text, so a lookup is one
+normalisation and one dict probe, and repeated values are answered from a
+cache of results. Values missing from the tables get a fuzzy match (difflib)
+against the known names; anything still unknown is returned unchanged for the
+operator to fix
+"""
+
+import difflib
+import json
+import os
+import re
+import unicodedata
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOCALISATION_PATH = os.path.join(APP_DIR, "pdf_config", "localisation.json")
+
+# Similarity (0-1) a misspelt value needs to take the closest known name; 1 disables fuzzy matching
+FUZZY_CUTOFF = float(os.getenv("LOCALISATION_FUZZY_CUTOFF", "0.85"))
+# Shorter values are codes or abbreviations, where a near miss is usually a different place
+FUZZY_MIN_LENGTH = 4
+RESULT_CACHE_SIZE = 4096
+
+# Japanese suffix of a prefecture -> the romanised suffix passports sometimes print (TOKYO-TO, OSAKA-FU)
+_PREFECTURE_SUFFIXES = {"都": "TO", "府": "FU", "県": "KEN"}
+
+_JOINED = re.compile(r"[.'’`]")
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalise(text: str) -> str:
+    """Upper-case ASCII-folded words: 'Côte d'Ivoire' -> 'COTE DIVOIRE', 'U.S.A.' -> 'USA'"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char)).upper()
+    text = _JOINED.sub("", text).replace("&", " AND ")
+    text = _SEPARATORS.sub(" ", text).strip()
+    return text[4:] if text.startswith("THE ") else text
+
+
+def _name_variants(name: str) -> List[str]:
+    """An ISO name plus its natural word order: 'Korea, Republic of' also as 'Republic of Korea'"""
+    variants = [name]
+    head, _, tail = name.partition(", ")
+    if tail.lower().endswith((" of", " of the")):
+        variants.append(f"{tail} {head}")
+    return variants
+
+
+class LocalisationIndex:
+    """Normalised English name or code -> Japanese, for nationalities and places of birth"""
+
+    def __init__(self, tables: Dict[str, Any]):
+        self.nationalities: Dict[str, str] = {}
+        self.places: Dict[str, str] = {}
+
+        by_alpha3 = {}
+        for alpha2, alpha3, name, japanese, aliases in tables.get("countries", []):
+            by_alpha3[alpha3] = japanese
+            self._add(self.nationalities, japanese, [alpha2, alpha3, *_name_variants(name), *aliases])
+            # Two-letter country codes would shadow US state codes (CA, GA, IN) in places
+            self._add(self.places, japanese, [alpha3, *_name_variants(name), *aliases])
+        for code, alpha3 in tables.get("icao_codes", []):
+            self._add(self.nationalities, by_alpha3[alpha3], [code])
+        for code, name, japanese, aliases in tables.get("icao_special", []):
+            self._add(self.nationalities, japanese, [code, name, *aliases])
+
+        # States and prefectures win over same-named countries: GEORGIA on a US passport is the state
+        for code, name, japanese, aliases in tables.get("us_states", []):
+            self._add(self.places, japanese, [code, name, f"{name} State", *aliases], replace=True)
+        for name, japanese, aliases in tables.get("prefectures", []):
+            suffix = _PREFECTURE_SUFFIXES.get(japanese[-1])
+            forms = [name, f"{name} Prefecture", *([f"{name} {suffix}"] if suffix else []), *aliases]
+            self._add(self.places, japanese, forms, replace=True)
+
+        self._fuzzy_candidates = {
+            id(table): [key for key in table if len(key) >= FUZZY_MIN_LENGTH]
+            for table in (self.nationalities, self.places)
+        }
+        # (table, value as printed) -> Japanese; cleared when full
+        self._results: Dict[tuple, str] = {}
+
+    @staticmethod
+    def _add(table: Dict[str, str], japanese: str, names: Iterable[str], replace: bool = False):
+        for name in names:
+            key = normalise(name)
+            if key and (replace or key not in table):
+                table[key] = japanese
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_LOCALISATION_PATH) -> "LocalisationIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _lookup(self, table: Dict[str, str], value: str, fuzzy: bool = True) -> Optional[str]:
+        key = normalise(value)
+        japanese = table.get(key)
+        if japanese is not None or not fuzzy or len(key) < FUZZY_MIN_LENGTH or not key.isascii():
+            return japanese
+        match = difflib.get_close_matches(key, self._fuzzy_candidates[id(table)], n=1, cutoff=FUZZY_CUTOFF)
+        return table[match[0]] if match else None
+
+    def _cached(self, kind: str, value: str, translate) -> str:
+        if not value:
+            return value
+        cache_key = (kind, value)
+        japanese = self._results.get(cache_key)
+        if japanese is None:
+            japanese = translate(value)
+            if len(self._results) >= RESULT_CACHE_SIZE:
+                self._results.clear()
+            self._results[cache_key] = japanese
+        return japanese
+
+    def nationality(self, value: str) -> str:
+        """Japanese name of a nationality given as a country name, demonym or ISO/ICAO code"""
+        return self._cached("nationality", value, lambda v: self._lookup(self.nationalities, v) or v)
+
+    def place(self, value: str) -> str:
+        """Japanese name of a place of birth; 'CITY, STATE, COUNTRY' translates the parts it knows"""
+        return self._cached("place", value, self._translate_place)
+
+    def _translate_place(self, value: str) -> str:
+        parts = [part.strip() for part in value.split(",") if part.strip()]
+        if len(parts) < 2:
+            return self._lookup(self.places, value) or value
+        japanese = self._lookup(self.places, value, fuzzy=False)
+        if japanese is not None:
+            return japanese
+        translated = [self._lookup(self.places, part) for part in parts]
+        if not any(translated):
+            return value
+        return "、".join(japanese or part for japanese, part in zip(translated, parts))
+
+
+_indexes: Dict[str, LocalisationIndex] = {}
+_indexes_lock = Lock()
+
+
+def load_localisation(path: str = DEFAULT_LOCALISATION_PATH) -> LocalisationIndex:
+    """The index for a tables file, built on first use and shared by every generator in the process"""
+    index = _indexes.get(path)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(path)
+            if index is None:
+                index = _indexes[path] = LocalisationIndex.from_file(path)
+    return index
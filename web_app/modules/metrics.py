@@ -0,0 +1,202 @@
+"""
+Prometheus-style metrics
+A small thread-safe registry of labelled counters and histograms rendered in
+the Prometheus text exposition format at /metrics. Counters that already live
+elsewhere (result cache, call governor, JSON parser) are read at scrape time
+through collectors rather than counted twice. Values are per process; scrape
+every gunicorn worker or run a single worker with threads
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRIC_PREFIX = "idextract_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTE_BUCKETS = (10_000, 25_000, 50_000, 100_000, 200_000, 350_000, 500_000, 1_000_000, 5_000_000, 25_000_000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+# A collected family: (name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    rendered = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + rendered + "}" if rendered else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, one series per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def values(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}_total{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., count, sum]
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return int(series[-2]) if series else 0
+
+    def totals(self) -> Dict[LabelKey, Tuple[int, float]]:
+        """(count, sum) per label combination"""
+        with self._lock:
+            return {key: (int(series[-2]), series[-1]) for key, series in self._series.items()}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {int(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {int(series[-2])}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Owns the metrics of a process and renders them for a scrape"""
+
+    def __init__(self, prefix: str = METRIC_PREFIX):
+        self.prefix = prefix
+        self._metrics: List[object] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._add(Counter(self.prefix + name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help_text, buckets))
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Add a callable returning (name, type, help, samples) families, read on every scrape"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                continue  # a failing source must not break the whole scrape
+            for name, kind, help_text, samples in families:
+                name = self.prefix + name
+                sample_name = name + "_total" if kind == "counter" else name
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{sample_name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry and the pipeline's core metrics
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "stage_seconds", "Time spent in each pipeline stage (decode, preprocess, encode, model_call, parse, fill_pdf, ...)"
+)
+REQUEST_SECONDS = registry.histogram(
+    "request_seconds", "Total HTTP request time by endpoint and status, including streamed bodies"
+)
+STAGE_CPU_SECONDS = registry.counter(
+    "stage_cpu_seconds", "CPU time of the calling thread in each pipeline stage (work in page-render processes is not included)"
+)
+ERRORS = registry.counter("errors", "Failed files and requests by error category")
+PAYLOAD_BYTES = registry.histogram("payload_bytes", "Upload and model payload sizes in bytes", BYTE_BUCKETS)
+
+
+@contextmanager
+def timed(stage: str):
+    """Observe the wall and thread CPU time of the with-block, including blocks that raise"""
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_CPU_SECONDS.inc(time.thread_time() - cpu_start, stage=stage)
@@ -0,0 +1,77 @@
+"""
+Lazy, thread-safe Gemini model provider
+The client is configured on first use instead of at import time, and API
+connectivity is checked by an explicit, cached health probe
+"""
+
+import os
+import time
+from threading import Lock
+from typing import Any, Dict, Optional
+
+DEFAULT_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+HEALTH_CACHE_SECONDS = int(os.getenv("HEALTH_CACHE_SECONDS", "300"))
+
+
+class ModelProvider:
+    """Builds the GenerativeModel once, on the first request that needs it"""
+
+    def __init__(self, api_key: str, model_name: str = DEFAULT_MODEL_NAME):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.model = None
+        self._lock = Lock()
+        self._health: Optional[Dict[str, Any]] = None
+        self._health_lock = Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key) or self.model is not None
+
+    def get(self):
+        """Return the shared model, or None when no API key is configured"""
+        if self.model is None and self.api_key:
+            with self._lock:
+                if self.model is None:
+                    # Deferred: importing the client library alone costs most of a second
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    self.model = genai.GenerativeModel(self.model_name)
+        return self.model
+
+    def set(self, model):
+        """Install a model object directly (offline runs and benchmarks)"""
+        with self._lock:
+            self.model = model
+        with self._health_lock:
+            self._health = None
+
+    def health(self, max_age: int = HEALTH_CACHE_SECONDS) -> Dict[str, Any]:
+        """Probe API connectivity, reusing the last result for max_age seconds
+
+        The probe counts tokens rather than generating content, so it spends
+        no generation quota.
+        """
+        with self._health_lock:
+            if self._health is not None and time.time() - self._health["checked_at"] < max_age:
+                return self._health
+
+            if not self.configured:
+                self._health = {
+                    "status": "unconfigured",
+                    "model": self.model_name,
+                    "error": "No API key found. Check your .env file for GEMINI_API_KEY",
+                    "checked_at": time.time(),
+                }
+                return self._health
+
+            start = time.perf_counter()
+            try:
+                self.get().count_tokens("ping")
+                self._health = {"status": "ok", "model": self.model_name}
+            except Exception as e:
+                self._health = {"status": "error", "model": self.model_name, "error": str(e)}
+            self._health["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._health["checked_at"] = time.time()
+            return self._health
@@ -0,0 +1,188 @@
+"""
+Local MRZ fast path for passports
+Reads the machine-readable zone with an offline OCR engine (Tesseract via
+pytesseract), validates every ICAO 9303 TD3 check digit, and returns a
+structured record without calling the model when the zone is fully legible
+"""
+
+import logging
+import os
+import re
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+MRZ_DOC_TYPES = ("US Passport", "Japanese Passport")
+MRZ_OCR_LANG = os.getenv("MRZ_OCR_LANG", "eng")
+TD3_LINE_LENGTH = 44
+
+_WEIGHTS = (7, 3, 1)
+_TO_DIGIT = str.maketrans("OQDIZSBGL", "001125861")
+_TO_ALPHA = str.maketrans("0125861", "OIZSBGI")
+_OCR_CONFIG = "--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<"
+
+# Country names as the extraction prompts return them, for the issuing/nationality codes we see most
+_NATIONALITY_NAMES = {
+    "USA": "UNITED STATES OF AMERICA",
+    "JPN": "JAPAN",
+}
+
+# pytesseract module once probed, False when it or the tesseract binary is missing
+_tesseract: Any = None
+_tesseract_lock = Lock()
+
+
+def _ocr_engine():
+    """Import pytesseract and run the binary on first use rather than at app import (both are slow)"""
+    global _tesseract
+    if _tesseract is None:
+        with _tesseract_lock:
+            if _tesseract is None:
+                try:
+                    import pytesseract  # optional dependency
+                    pytesseract.get_tesseract_version()
+                    _tesseract = pytesseract
+                except Exception:
+                    logger.warning("MRZ fast path disabled: tesseract OCR is not installed")
+                    _tesseract = False
+    return _tesseract or None
+
+
+def ocr_available() -> bool:
+    """True when pytesseract and the tesseract binary are both installed"""
+    return _ocr_engine() is not None
+
+
+def check_digit(field: str) -> str:
+    """ICAO 9303 check digit: weights 7-3-1, A-Z = 10-35, filler < = 0"""
+    total = 0
+    for position, char in enumerate(field):
+        if char.isdigit():
+            value = int(char)
+        elif char.isalpha():
+            value = ord(char) - 55
+        else:
+            value = 0
+        total += value * _WEIGHTS[position % 3]
+    return str(total % 10)
+
+
+def _digits(text: str) -> str:
+    return text.translate(_TO_DIGIT)
+
+
+def _alpha(text: str) -> str:
+    return text.translate(_TO_ALPHA)
+
+
+def _date(yymmdd: str, future: bool) -> Optional[str]:
+    """YYMMDD -> YYYY-MM-DD; birth dates resolve to the past, expiry dates to the future"""
+    try:
+        parsed = datetime.strptime(yymmdd, "%y%m%d")
+    except ValueError:
+        return None
+    year = parsed.year
+    this_year = datetime.now().year
+    if future and year < this_year - 20:
+        year += 100
+    elif not future and year > this_year:
+        year -= 100
+    return parsed.replace(year=year).strftime("%Y-%m-%d")
+
+
+def _names(field: str) -> Tuple[str, str]:
+    surname, _, given = field.partition("<<")
+    return surname.replace("<", " ").strip(), given.replace("<", " ").strip()
+
+
+def parse_td3(line1: str, line2: str) -> Optional[Dict[str, Any]]:
+    """Parse a two-line TD3 (passport) MRZ; returns None unless every check digit passes
+
+    Positions that can only hold digits are corrected for common OCR
+    letter/digit confusions before validation.
+    """
+    line1 = line1.ljust(TD3_LINE_LENGTH, "<")[:TD3_LINE_LENGTH]
+    line2 = line2.ljust(TD3_LINE_LENGTH, "<")[:TD3_LINE_LENGTH]
+    if line1[0] != "P":
+        return None
+
+    number, number_check = line2[0:9], _digits(line2[9])
+    nationality = _alpha(line2[10:13])
+    birth, birth_check = _digits(line2[13:19]), _digits(line2[19])
+    sex = line2[20]
+    expiry, expiry_check = _digits(line2[21:27]), _digits(line2[27])
+    personal, personal_check = line2[28:42], line2[42]
+    composite_check = _digits(line2[43])
+
+    if personal_check == "<" and set(personal) == {"<"}:
+        personal_check = "0"
+    composite = number + number_check + birth + birth_check + expiry + expiry_check + personal + personal_check
+    checks = (
+        (number, number_check),
+        (birth, birth_check),
+        (expiry, expiry_check),
+        (personal, _digits(personal_check)),
+        (composite, composite_check),
+    )
+    if not all(check_digit(field) == digit for field, digit in checks):
+        return None
+
+    date_of_birth = _date(birth, future=False)
+    date_of_expiration = _date(expiry, future=True)
+    if date_of_birth is None or date_of_expiration is None:
+        return None
+
+    surname, given_names = _names(_alpha(line1[5:]))
+    return {
+        "passport_type": line1[1].replace("<", "") or "P",
+        "passport_number": number.replace("<", ""),
+        "surname": surname,
+        "given_names": given_names,
+        "nationality": _NATIONALITY_NAMES.get(nationality, nationality),
+        "date_of_birth": date_of_birth,
+        "place_of_birth": None,
+        "sex": {"M": "M", "F": "F"}.get(sex, "X"),
+        "date_of_issue": None,
+        "date_of_expiration": date_of_expiration,
+        "issuing_authority": None,
+        "machine_readable_zone": f"{line1}\n{line2}",
+    }
+
+
+def find_td3_lines(text: str) -> Optional[Tuple[str, str]]:
+    """Pick the two consecutive MRZ-looking lines out of raw OCR text"""
+    candidates: List[str] = []
+    for raw in text.upper().splitlines():
+        line = re.sub(r"[^A-Z0-9<]", "", raw.replace(" ", ""))
+        if len(line) >= TD3_LINE_LENGTH - 4 and "<" in line:
+            candidates.append(line)
+    for first, second in zip(candidates, candidates[1:]):
+        if first.startswith("P"):
+            return first, second
+    return None
+
+
+def read_mrz(image: Image.Image) -> Optional[Dict[str, Any]]:
+    """OCR the bottom band of a passport data page and return a validated record, or None"""
+    pytesseract = _ocr_engine()
+    if pytesseract is None:
+        return None
+    width, height = image.size
+    band = image.crop((0, int(height * 0.65), width, height)).convert("L")
+    band = ImageOps.autocontrast(band.resize((band.width * 2, band.height * 2), Image.LANCZOS))
+    for candidate in (band, band.rotate(180)):
+        try:
+            text = pytesseract.image_to_string(candidate, lang=MRZ_OCR_LANG, config=_OCR_CONFIG)
+        except Exception as e:
+            logger.warning("MRZ OCR failed: %s", e)
+            return None
+        lines = find_td3_lines(text)
+        if lines:
+            record = parse_td3(*lines)
+            if record:
+                return record
+    return None
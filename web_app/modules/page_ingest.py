@@ -0,0 +1,233 @@
+"""
+Multi-page document ingestion
+Scanned PDFs and multi-frame TIFFs are split into one pipeline item per page.
+Page counts are read up front without rendering; each page is rasterised
+on demand, straight to the target size, in a pool of worker processes
+(pdfium is not thread-safe), so only the pages currently in flight are held
+in memory
+"""
+
+import multiprocessing
+import os
+import tempfile
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from modules.image_decode import MAX_SOURCE_PIXELS, MAX_UPLOAD_BYTES, TARGET_SIZE, bitmap_bytes, stream_size
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # optional dependency
+    pdfium = None
+
+MAX_DOCUMENT_PAGES = int(os.getenv("MAX_DOCUMENT_PAGES", "50"))
+# Processes rasterising pages; 0 renders in the calling thread (serialised)
+PAGE_RENDER_WORKERS = int(os.getenv("PAGE_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Pages render at twice the pixel budget, like JPEG draft decoding, so the document crop has headroom
+RENDER_SIZE = (2 * TARGET_SIZE[0], 2 * TARGET_SIZE[1])
+
+_TIFF_MAGIC = (b"II*\x00", b"MM\x00*")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = Lock()
+_inline_lock = Lock()
+
+
+def _render(kind: str, path: str, index: int, target_size: Tuple[int, int]) -> Tuple[Image.Image, Dict[str, Any]]:
+    """Rasterise one page to fit target_size; runs inside a worker process"""
+    if kind == "pdf":
+        pdf = pdfium.PdfDocument(path)
+        try:
+            page = pdf[index]
+            width, height = page.get_size()
+            scale = min(target_size[0] / width, target_size[1] / height)
+            image = page.render(scale=scale).to_pil().convert("RGB")
+            page.close()
+        finally:
+            pdf.close()
+        return image, {
+            "format": "PDF",
+            "source_size": [round(width), round(height)],
+            "render_dpi": round(72 * scale),
+        }
+
+    with Image.open(path) as tiff:
+        tiff.seek(index)
+        source_size = tiff.size
+        if source_size[0] * source_size[1] > MAX_SOURCE_PIXELS:
+            raise ValueError(
+                f"Page {index + 1} is {source_size[0]}x{source_size[1]}; "
+                f"the limit is {MAX_SOURCE_PIXELS / 1_000_000:.0f} megapixels"
+            )
+        tiff.load()
+        image = tiff.convert("RGB")
+    image.thumbnail(target_size, Image.LANCZOS)
+    return image, {"format": "TIFF", "source_size": list(source_size)}
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the app process is multi-threaded by the time the first PDF arrives
+            _pool = ProcessPoolExecutor(PAGE_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard(pool: ProcessPoolExecutor):
+    """Drop a pool whose worker died (killed, out of memory) so the next page starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(*args) -> Tuple[ProcessPoolExecutor, Future]:
+    """Queue a render, replacing the pool first if it is already broken"""
+    pool = _executor()
+    try:
+        return pool, pool.submit(_render, *args)
+    except BrokenProcessPool:
+        _discard(pool)
+        pool = _executor()
+        return pool, pool.submit(_render, *args)
+
+
+def _remove(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class _PageSource:
+    """An upload copied to a temp file that worker processes can open; removed once unreferenced"""
+
+    def __init__(self, file: FileStorage, kind: str):
+        self.kind = kind
+        self.upload_bytes = stream_size(file.stream)
+        file.stream.seek(0)
+        with tempfile.NamedTemporaryFile(suffix="." + kind, delete=False) as handle:
+            while True:
+                chunk = file.stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                handle.write(chunk)
+            self.path = handle.name
+        weakref.finalize(self, _remove, self.path)
+
+    def page_count(self) -> int:
+        if self.kind == "pdf":
+            pdf = pdfium.PdfDocument(self.path)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+        with Image.open(self.path) as tiff:
+            return getattr(tiff, "n_frames", 1)
+
+
+class PageUpload:
+    """One page of a multi-page upload, standing in for its FileStorage in the pipeline"""
+
+    def __init__(self, source: _PageSource, filename: str, page: int, page_count: int):
+        self.source = source
+        self.filename = filename
+        self.page = page
+        self.page_count = page_count
+        self._future: Optional[Future] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def prefetch(self):
+        """Start rasterising in the worker pool without waiting for it"""
+        if self._future is None and PAGE_RENDER_WORKERS > 0:
+            self._pool, self._future = _submit(self.source.kind, self.source.path, self.page - 1, RENDER_SIZE)
+
+    def render(self) -> Tuple[Image.Image, Dict[str, Any]]:
+        """Rasterised page and decode stats in the shape decode_upload returns"""
+        if PAGE_RENDER_WORKERS > 0:
+            self.prefetch()
+            try:
+                image, stats = self._future.result()
+            except BrokenProcessPool:
+                # A worker died mid-render; this page gets one more try in a new pool
+                _discard(self._pool)
+                self._future = None
+                self.prefetch()
+                image, stats = self._future.result()
+            self._future = None
+        else:
+            with _inline_lock:
+                image, stats = _render(self.source.kind, self.source.path, self.page - 1, RENDER_SIZE)
+        stats.update({
+            "upload_bytes": self.source.upload_bytes,
+            "decoded_size": list(image.size),
+            "peak_bitmap_bytes": bitmap_bytes("RGB", image.size),
+            "page": self.page,
+            "page_count": self.page_count,
+        })
+        return image, stats
+
+    def provenance(self) -> Dict[str, Any]:
+        return {"page": self.page, "page_count": self.page_count}
+
+
+def document_kind(file: FileStorage) -> Optional[str]:
+    """"pdf" or "tiff" for uploads that may hold several pages, from their magic bytes"""
+    position = file.stream.tell()
+    header = file.stream.read(5)
+    file.stream.seek(position)
+    if header.startswith(b"%PDF"):
+        return "pdf"
+    if header[:4] in _TIFF_MAGIC:
+        return "tiff"
+    return None
+
+
+def _expand(file: FileStorage) -> List[Any]:
+    kind = document_kind(file)
+    if kind is None:
+        return [file]
+    if stream_size(file.stream) > MAX_UPLOAD_BYTES:
+        # decode_upload reports the size limit
+        return [file]
+    if kind == "pdf" and pdfium is None:
+        raise ValueError("PDF uploads need pypdfium2 (pip install pypdfium2)")
+    source = _PageSource(file, kind)
+    try:
+        count = source.page_count()
+    except Exception as e:
+        raise ValueError(f"Could not read {kind.upper()} pages: {e}")
+    if kind == "tiff" and count == 1:
+        file.stream.seek(0)
+        return [file]
+    if count > MAX_DOCUMENT_PAGES:
+        raise ValueError(f"Document has {count} pages; the limit is {MAX_DOCUMENT_PAGES}")
+    return [PageUpload(source, file.filename, page, count) for page in range(1, count + 1)]
+
+
+class UnreadableUpload:
+    """An upload that failed page expansion; the pipeline reports the error for it"""
+
+    def __init__(self, file: FileStorage, error: Exception):
+        self.filename = file.filename
+        self.error = error
+
+
+def expand_pages(uploads: List[FileStorage]) -> List[Any]:
+    """Replace each multi-page upload with one PageUpload per page, keeping order"""
+    items: List[Any] = []
+    for file in uploads:
+        try:
+            items.extend(_expand(file))
+        except Exception as e:
+            items.append(UnreadableUpload(file, e))
+    return items
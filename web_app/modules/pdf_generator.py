@@ -4,11 +4,14 @@ Japanese Immigration Form PDF Generator
 Handles passport data extraction and PDF form population in Japanese
 """
 
+import io
 import json
+import logging
 import tempfile
 import os
+import threading
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import BinaryIO, Dict, List, Any, Optional, Tuple, Union
 from pikepdf import Pdf
 import pikepdf
 from reportlab.pdfgen import canvas
@@ -21,14 +24,74 @@ from PIL import Image
 import base64
 import google.generativeai as genai
 
+from modules.localisation import DEFAULT_LOCALISATION_PATH, load_localisation
+from modules.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG_PATH = os.path.join(APP_DIR, "pdf_config", "visa_form_mapping.json")
+TEMPLATE_DIR = os.path.join(APP_DIR, "template_file")
+
+# A file path, or a binary buffer for in-memory rendering
+Output = Union[str, BinaryIO]
+
+
+class PdfTemplate:
+    """A form template parsed once: its bytes, a field-name index and the member mappings resolved against it
+
+    Fields are indexed by (page number, position in /Annots) rather than by
+    annotation object, so each job opens its own copy of the in-memory master
+    and reaches every field directly without walking the pages.
+    """
+
+    def __init__(self, path: str, config: Dict[str, Any]):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = f.read()
+
+        self.fields: Dict[str, Tuple[int, int]] = {}
+        with Pdf.open(io.BytesIO(self.data)) as pdf:
+            for page_number, page in enumerate(pdf.pages):
+                if '/Annots' in page:
+                    for position, annot in enumerate(page.Annots):
+                        if '/T' in annot:  # Field name
+                            self.fields[str(annot.T)] = (page_number, position)
+        logger.debug("Indexed %d PDF fields in %s", len(self.fields), path)
+
+        # member type -> logical field -> field location; config entries missing from the PDF are reported once here
+        self.mappings: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        for section, mapping_config in config.items():
+            if section == 'primary_applicant':
+                member_type = 'primary'
+            elif section.startswith('accompanying'):
+                member_type = section
+            else:
+                continue
+            resolved = {}
+            for logical_field, pdf_field_name in (mapping_config or {}).items():
+                if pdf_field_name in self.fields:
+                    resolved[logical_field] = self.fields[pdf_field_name]
+                else:
+                    logger.warning("PDF field '%s' (mapped from '%s') for %s not found in PDF template", pdf_field_name, logical_field, member_type)
+            self.mappings[member_type] = resolved
+
+    def open_copy(self) -> Pdf:
+        return Pdf.open(io.BytesIO(self.data))
+
 
 class JapaneseFormGenerator:
     """Main class for generating Japanese immigration forms from passport data"""
     
-    def __init__(self, pdf_config_path: str = "/Users/hugo/passport_project/web_app/pdf_config/visa_form_mapping.json"):
+    def __init__(self, pdf_config_path: str = DEFAULT_CONFIG_PATH, localisation_path: str = DEFAULT_LOCALISATION_PATH):
         self.pdf_config_path = pdf_config_path
         self.config = self.load_config()
+        # Country, state and prefecture names in Japanese, shared by all generators in the process
+        self.localisation = load_localisation(localisation_path)
         self.current_year = datetime.now().year
+        # Parsed templates by path; None records a template that does not exist
+        self._templates: Dict[str, Optional[PdfTemplate]] = {}
+        self._template_lock = threading.Lock()
         # The API key is configured globally in app.py
         
     def load_config(self) -> Dict[str, Any]:
@@ -40,9 +103,12 @@ class JapaneseFormGenerator:
         """Convert ISO date to YYYY年MM月DD日 format"""
         from datetime import datetime
         
-        # Parse the date
+        # Parse the date; anything else is kept as printed
         if iso_date and '-' in iso_date:
-            dt = datetime.strptime(iso_date, '%Y-%m-%d')
+            try:
+                dt = datetime.strptime(iso_date, '%Y-%m-%d')
+            except ValueError:
+                return iso_date
             
             # Format: YYYY年MM月DD日
             return dt.strftime('%Y年%m月%d日')
@@ -50,7 +116,11 @@ class JapaneseFormGenerator:
         return iso_date
 
     def map_passport_to_form_fields(self, passport_data: Dict[str, Any]) -> Dict[str, str]:
-        """Map passport data to PDF form fields"""
+        """Map passport data to PDF form fields
+
+        Extracted records may hold None for any field the model or MRZ could not read; those become empty values.
+        """
+        passport_data = {key: ('' if value is None else str(value)) for key, value in passport_data.items()}
         form_values = {}
         
         # Japanese name formatting (surname first)
@@ -66,30 +136,9 @@ class JapaneseFormGenerator:
         if birth_date:
             form_values['date_of_birth'] = self.convert_to_japanese_calendar(birth_date)
         
-        # Nationality
-        nationality_en = passport_data.get('nationality', '')
-        nationality_map = {
-            'UNITED STATES': 'アメリカ合衆国',
-            'JAPAN': '日本',
-            'UNITED KINGDOM': 'イギリス',
-            'CANADA': 'カナダ',
-            'AUSTRALIA': 'オーストラリア',
-            # Add more as needed
-        }
-        form_values['nationality'] = nationality_map.get(nationality_en.upper(), nationality_en)
-        
-        # Birth place
-        place_of_birth = passport_data.get('place_of_birth', '')
-        place_map = {
-            'UNITED STATES': 'アメリカ合衆国',
-            'CALIFORNIA': 'カリフォルニア州',
-            'NEW YORK': 'ニューヨーク州',
-            # Add more mappings
-        }
-        if place_of_birth.upper() in place_map:
-            form_values['birth_place'] = place_map[place_of_birth.upper()]
-        else:
-            form_values['birth_place'] = place_of_birth
+        # Nationality and birth place in Japanese (unknown values are kept as printed)
+        form_values['nationality'] = self.localisation.nationality(passport_data.get('nationality', ''))
+        form_values['birth_place'] = self.localisation.place(passport_data.get('place_of_birth', ''))
         
         # Issuing authority
         authority = passport_data.get('issuing_authority', '')
@@ -102,71 +151,74 @@ class JapaneseFormGenerator:
         
         return form_values
 
-    def generate_pdf_form(self, member_data: Dict[str, Dict[str, str]], output_path: str) -> str:
+    def load_template(self, template_path: Optional[str] = None) -> Optional[PdfTemplate]:
+        """Parsed template (the configured one by default), read from disk on first use; None if it does not exist"""
+        if template_path is None:
+            template_path = os.path.join(TEMPLATE_DIR, self.config.get('pdf_name', 'visa_request_form.pdf'))
+        template = self._templates.get(template_path, False)
+        if template is not False:
+            return template
+        with self._template_lock:
+            if template_path not in self._templates:
+                self._templates[template_path] = PdfTemplate(template_path, self.config) if os.path.exists(template_path) else None
+            return self._templates[template_path]
+
+    def generate_pdf_form(self, member_data: Dict[str, Dict[str, str]], output_path: Output) -> Output:
         """Generate filled PDF form"""
-        template_path = self.config.get('pdf_name', 'visa_request_form.pdf')
-        full_template_path = os.path.join('template_file', template_path)
-        
-        if os.path.exists(full_template_path):
+        template = self.load_template()
+        if template is not None:
             # Use existing template and fill fields
-            return self.fill_existing_pdf(full_template_path, member_data, output_path)
+            return self.fill_existing_pdf(template.path, member_data, output_path)
         else:
             # Generate new form based on template
             return self.generate_new_pdf(member_data, output_path)
 
-    def fill_existing_pdf(self, template_path: str, data: Dict[str, Dict[str, str]], output_path: str) -> str:
-        """Fill existing PDF template with data"""
+    def fill_existing_pdf(self, template_path: str, data: Dict[str, Dict[str, str]], output_path: Output) -> Output:
+        """Fill a copy of the cached template with data"""
         try:
-            with Pdf.open(template_path) as pdf:
-                # Get the form fields
-                fields = {}
-                for page in pdf.pages:
-                    if '/Annots' in page:
-                        for annot in page.Annots:
-                            if '/T' in annot: # Field name
-                                fields[str(annot.T)] = annot
-                print(f"Found PDF fields: {list(fields.keys())}")
-
+            template = self.load_template(template_path)
+            if template is None:
+                raise FileNotFoundError(template_path)
+            with timed("fill_pdf"), template.open_copy() as pdf:
+                pages = pdf.pages
                 # Iterate through the data and fill the corresponding fields
                 for member_type, member_data in data.items():
-                    # Handle primary applicant
-                    if member_type == 'primary':
-                        mapping_config = self.config.get('primary_applicant', {})
-                    # Handle accompanying members dynamically (accompanying1 through accompanying7)
-                    elif member_type.startswith('accompanying'):
-                        mapping_config = self.config.get(member_type, {})
-                        if not mapping_config:
-                            print(f"Warning: No mapping configuration found for {member_type}")
-                            continue
-                    else:
-                        continue # Skip unknown member types
+                    # Primary applicant and accompanying members (accompanying1 through accompanying7)
+                    mapping = template.mappings.get(member_type)
+                    if mapping is None:
+                        if member_type.startswith('accompanying'):
+                            logger.warning("No mapping configuration found for %s", member_type)
+                        continue  # Skip unknown member types
 
                     for logical_field, extracted_value in member_data.items():
-                        pdf_field_name = mapping_config.get(logical_field)
-                        if pdf_field_name and pdf_field_name in fields:
-                            fields[pdf_field_name].V = extracted_value
-                            fields[pdf_field_name].AP = fields[pdf_field_name].V # Update appearance stream
-                            print(f"Filled PDF field {pdf_field_name} for {member_type} with {extracted_value}")
-                        elif pdf_field_name:
-                            print(f"Warning: PDF field '{pdf_field_name}' (mapped from '{logical_field}') for {member_type} not found in PDF template.")
-                        else:
-                            print(f"Warning: Logical field '{logical_field}' for {member_type} not found in mapping configuration.")
-                
+                        location = mapping.get(logical_field)
+                        if location is None:
+                            logger.debug("Logical field '%s' for %s not mapped to a PDF field", logical_field, member_type)
+                            continue
+                        page_number, position = location
+                        field = pages[page_number].Annots[position]
+                        field.V = extracted_value
+                        field.AP = field.V  # Update appearance stream
+
                 pdf.save(output_path)
                 return output_path
         except Exception as e:
-            print(f"Error filling PDF: {e}")
+            logger.exception("Error filling PDF")
             # If an error occurs, we should not return a corrupted PDF.
             # Re-raise the exception or handle it appropriately.
             raise RuntimeError(f"Failed to fill PDF form: {e}")
 
     # The create_pdf_overlay function is removed as it's not suitable for filling existing forms.
     # The generate_new_pdf function is also removed as it's not used in this context.
-    def generate_new_pdf(self, member_data: Dict[str, Dict[str, str]], output_path: str) -> str:
+    def generate_new_pdf(self, member_data: Dict[str, Dict[str, str]], output_path: Output) -> Output:
         raise NotImplementedError("Generating new PDFs from scratch is not implemented.")
 
-    def generate_word_document(self, data: Dict[str, Dict[str, str]], output_path: str) -> str:
+    def generate_word_document(self, data: Dict[str, Dict[str, str]], output_path: Output) -> Output:
         """Generate Word document with visa form data mimicking PDF content"""
+        with timed("word_document"):
+            return self._write_word_document(data, output_path)
+
+    def _write_word_document(self, data: Dict[str, Dict[str, str]], output_path: Output) -> Output:
         doc = Document()
 
         doc.add_paragraph("重複プロファイル解消のお願い")
@@ -275,9 +327,15 @@ class JapaneseFormGenerator:
             "body": body
         }
 
-    def process_multiple_members(self, members_data: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
-        """Process multiple members and generate combined forms"""
-        print(f"Processing {len(members_data)} members")
+    def process_multiple_members(self, members_data: Dict[str, Dict[str, Any]], output_dir: str = 'generated_forms',
+                                 job_id: Optional[str] = None, in_memory: bool = False) -> Dict[str, Any]:
+        """Process multiple members and generate combined forms
+
+        With a job_id the output files are tagged with it, so concurrent jobs
+        never write to the same timestamped name. With in_memory nothing is
+        written: the result carries pdf_bytes and word_bytes instead of paths.
+        """
+        logger.info("Processing %d members", len(members_data))
         
         # Map each member's passport data
         processed_data = {}
@@ -286,34 +344,43 @@ class JapaneseFormGenerator:
             if passport_data:
                 form_data = self.map_passport_to_form_fields(passport_data)
                 processed_data[member_type] = form_data
-                print(f"Processed {member_type}: {form_data.get('last_name', '')} {form_data.get('first_name', '')}")
-        
-        # Generate output files using current directory structure
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        os.makedirs('generated_forms', exist_ok=True)
-        
-        pdf_output = f"generated_forms/japanese_visa_form_{timestamp}.pdf"
-        word_output = f"generated_forms/japanese_visa_form_{timestamp}.docx"
-        
-        pdf_path = self.generate_pdf_form(processed_data, pdf_output)
-        word_path = self.generate_word_document(processed_data, word_output)
+                logger.debug("Processed %s", member_type)
         
         # Generate email content
         email_content = self.generate_email_content(processed_data)
-        
-        return {
-            "pdf_path": pdf_path,
-            "word_path": word_path,
+        result = {
             "email_subject": email_content["subject"],
             "email_body": email_content["body"],
             "success": True,
             "members_processed": len(processed_data)
         }
 
+        if in_memory:
+            pdf_buffer, word_buffer = io.BytesIO(), io.BytesIO()
+            self.generate_pdf_form(processed_data, pdf_buffer)
+            self.generate_word_document(processed_data, word_buffer)
+            result.update(pdf_path=None, word_path=None,
+                          pdf_bytes=pdf_buffer.getvalue(), word_bytes=word_buffer.getvalue())
+            return result
+
+        # Generate output files using current directory structure
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(output_dir, exist_ok=True)
+        stem = f"japanese_visa_form_{timestamp}_{job_id}" if job_id else f"japanese_visa_form_{timestamp}"
+
+        pdf_output = os.path.join(output_dir, f"{stem}.pdf")
+        word_output = os.path.join(output_dir, f"{stem}.docx")
+        
+        result["pdf_path"] = self.generate_pdf_form(processed_data, pdf_output)
+        result["word_path"] = self.generate_word_document(processed_data, word_output)
+        return result
+
 
 # Utility functions for integration with main app
 japanese_generator = JapaneseFormGenerator()
 
-def generate_japanese_forms_from_passports(members_data: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+def generate_japanese_forms_from_passports(members_data: Dict[str, Dict[str, Any]], job_id: Optional[str] = None,
+                                           output_dir: str = 'generated_forms', in_memory: bool = False) -> Dict[str, Any]:
     """Main interface function for the web app"""
-    return japanese_generator.process_multiple_members(members_data)
\ No newline at end of file
+    return japanese_generator.process_multiple_members(members_data, output_dir=output_dir, job_id=job_id,
+                                                       in_memory=in_memory)
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Image quality pre-screen
+Vectorised NumPy checks run on the decoded image before any model call:
+sharpness (variance of the Laplacian), exposure, glare and how much of the
+frame the document fills. Images below the configured thresholds are
+rejected with a message telling the user what to fix
+"""
+
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+from PIL import Image
+
+from modules.document_crop import document_box
+
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "40"))
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40"))
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "235"))
+QUALITY_MAX_GLARE = float(os.getenv("QUALITY_MAX_GLARE", "0.1"))
+QUALITY_MIN_FILL = float(os.getenv("QUALITY_MIN_FILL", "0.2"))
+# A document below QUALITY_MIN_FILL still passes with this many source pixels on its long side (scans, PDFs)
+QUALITY_MIN_DOCUMENT_SIDE = int(os.getenv("QUALITY_MIN_DOCUMENT_SIDE", "400"))
+
+# Metrics are computed on a grayscale copy no larger than this
+_ANALYSIS_SIZE = (512, 512)
+_CLIPPED = 250
+
+
+class QualityRejected(ValueError):
+    """The image is unusable; carries the scores and the reasons"""
+
+    def __init__(self, issues: List[str], scores: Dict[str, Any]):
+        super().__init__("Image rejected before extraction: " + "; ".join(issues))
+        self.issues = issues
+        self.scores = scores
+
+
+def assess_quality(image: Image.Image) -> Dict[str, Any]:
+    """Sharpness, brightness, glare and fill scores for an image
+
+    Sharpness, brightness and glare are measured inside the document's
+    bounding box, so the blank paper around a copy or the white bed of a
+    flatbed scan does not count against them. document_side is the
+    document's long side in source pixels.
+    """
+    small = image.convert("L")
+    small.thumbnail(_ANALYSIS_SIZE, Image.BILINEAR)
+    gray = np.asarray(small, dtype=np.float32)
+    scale = max(image.size) / max(small.size)
+
+    box = document_box(gray)
+    if box is None:
+        document, fill, side = gray, 0.0, 0
+    else:
+        x0, y0, x1, y1 = box
+        document = gray[y0:y1, x0:x1]
+        fill = (x1 - x0) * (y1 - y0) / gray.size
+        side = max(x1 - x0, y1 - y0) * scale
+    laplacian = (
+        document[:-2, 1:-1] + document[2:, 1:-1] + document[1:-1, :-2] + document[1:-1, 2:] - 4 * document[1:-1, 1:-1]
+    )
+    return {
+        "sharpness": round(float(laplacian.var()) if laplacian.size else 0.0, 1),
+        "brightness": round(float(document.mean()), 1),
+        "glare": round(float(np.mean(document >= _CLIPPED)), 4),
+        "fill": round(float(fill), 3),
+        "document_side": int(side),
+    }
+
+
+def quality_issues(scores: Dict[str, Any]) -> List[str]:
+    """Actionable reasons the scores fall below the configured thresholds
+
+    Exposure is judged first: a dark or washed-out frame also reads as
+    blurry and glary, so only the root cause is reported. Likewise blur
+    erases the edges the fill estimate relies on. A small document is only
+    rejected when it also lacks the pixels to be read, so scans and PDFs
+    with wide margins pass.
+    """
+    if scores["brightness"] < QUALITY_MIN_BRIGHTNESS:
+        return ["image is too dark; retake it in better light"]
+    if scores["brightness"] > QUALITY_MAX_BRIGHTNESS:
+        return ["image is overexposed; reduce the light or turn off the flash"]
+    if scores["sharpness"] < QUALITY_MIN_SHARPNESS:
+        return ["image is blurry; hold the camera steady and refocus"]
+    issues = []
+    if scores["glare"] > QUALITY_MAX_GLARE:
+        issues.append("glare covers part of the document; tilt it away from the light")
+    if scores["fill"] < QUALITY_MIN_FILL and scores.get("document_side", 0) < QUALITY_MIN_DOCUMENT_SIDE:
+        issues.append("the document is too small in the frame; move closer or crop")
+    return issues
+
+
+def screen_image(image: Image.Image) -> Dict[str, Any]:
+    """Score an image and raise QualityRejected when the gate is on and it fails"""
+    scores = assess_quality(image)
+    issues = quality_issues(scores)
+    scores["passed"] = not issues
+    if issues and QUALITY_GATE_ENABLED:
+        raise QualityRejected(issues, scores)
+    return scores
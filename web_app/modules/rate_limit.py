@@ -0,0 +1,238 @@
+"""
+Rate limiting and adaptive concurrency for model calls
+A token bucket keeps the request rate under quota (optionally shared across
+gunicorn workers through SQLite), and an AIMD controller shrinks the number of
+concurrent calls on throttling errors and grows it back while calls succeed
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Any, Dict, Optional
+
+DEFAULT_BUCKET_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "rate_limit.sqlite3")
+
+_THROTTLE_MARKERS = ("429", "resource has been exhausted", "resourceexhausted", "quota", "rate limit", "too many requests")
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """True for quota / 429 style failures that call for backing off"""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _THROTTLE_MARKERS)
+
+
+class RateLimitTimeout(RuntimeError):
+    """Raised when a call waited longer than allowed for a rate or concurrency slot"""
+
+
+class TokenBucket:
+    """In-process token bucket; rate is tokens per second"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token; returns 0 on success, otherwise seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def available(self) -> float:
+        with self._lock:
+            return min(self.burst, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+
+class SQLiteTokenBucket:
+    """Token bucket whose state lives in SQLite, shared by every process on the host"""
+
+    def __init__(self, rate: float, burst: float, path: str = DEFAULT_BUCKET_PATH, name: str = "model"):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.path = path
+        self.name = name
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            conn.execute(
+                "INSERT OR IGNORE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (name, self.burst, time.time()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _refill(self, conn: sqlite3.Connection, now: float) -> float:
+        tokens, updated = conn.execute(
+            "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        return min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+
+    def try_acquire(self) -> float:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            tokens = self._refill(conn, now)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute("UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?", (tokens, now, self.name))
+            conn.execute("COMMIT")
+            return wait
+        finally:
+            conn.close()
+
+    def available(self) -> float:
+        conn = self._connect()
+        try:
+            return self._refill(conn, time.time())
+        finally:
+            conn.close()
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on in-flight calls
+
+    Each success adds 1/limit, so the limit grows by about one per window of
+    healthy calls; a throttling error multiplies it by decrease_factor, at
+    most once per cooldown so one burst of 429s only counts once. Other
+    failures (timeouts, 5xx) leave the limit where it is.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16,
+                 decrease_factor: float = 0.5, cooldown: float = 2.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.waiting = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._condition = Condition()
+
+    def acquire(self, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise RateLimitTimeout("Timed out waiting for a model call slot")
+                    self._condition.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, succeeded: bool, throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            elif succeeded:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class ModelCallGovernor:
+    """Combines the rate bucket and the AIMD limiter around each model call"""
+
+    def __init__(self, bucket=None, limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                 max_wait: float = 120.0):
+        self.bucket = bucket
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.max_wait = max_wait
+        self.calls = 0
+        self._lock = Lock()
+
+    @contextmanager
+    def slot(self, max_wait: Optional[float] = None):
+        """Wait for a concurrency slot and a rate token, then run the body
+
+        Waiting longer than max_wait (default: the governor's) raises
+        RateLimitTimeout. Exceptions from the body propagate unchanged; only a
+        body that returns counts as a success for the limiter, and throttling
+        errors are fed back so it backs off.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        self.limiter.acquire(timeout=max_wait)
+        throttled = succeeded = False
+        try:
+            if self.bucket is not None:
+                while True:
+                    wait = self.bucket.try_acquire()
+                    if wait <= 0:
+                        break
+                    if time.monotonic() + wait > deadline:
+                        raise RateLimitTimeout("Timed out waiting for the model rate limit")
+                    time.sleep(wait)
+            with self._lock:
+                self.calls += 1
+            yield
+            succeeded = True
+        except Exception as e:
+            throttled = is_throttle_error(e)
+            raise
+        finally:
+            self.limiter.release(succeeded, throttled=throttled)
+
+    def snapshot(self) -> Dict[str, Any]:
+        limiter = self.limiter
+        return {
+            "concurrency_limit": int(limiter.limit),
+            "concurrency_min": limiter.minimum,
+            "concurrency_max": limiter.maximum,
+            "in_flight": limiter.in_flight,
+            "queue_depth": limiter.waiting,
+            "throttled_total": limiter.throttled,
+            "calls_total": self.calls,
+            "rate_per_minute": round(self.bucket.rate * 60, 2) if self.bucket else None,
+            "tokens_available": round(self.bucket.available(), 2) if self.bucket else None,
+            "shared_across_workers": isinstance(self.bucket, SQLiteTokenBucket),
+        }
+
+
+def create_governor_from_env() -> ModelCallGovernor:
+    """Build the governor from MODEL_* / RATE_LIMIT_* environment variables
+
+    MODEL_RATE_PER_MINUTE=0 disables the token bucket; RATE_LIMIT_BACKEND=sqlite
+    shares it between worker processes.
+    """
+    per_minute = float(os.getenv("MODEL_RATE_PER_MINUTE", "0"))
+    bucket = None
+    if per_minute > 0:
+        burst = float(os.getenv("MODEL_RATE_BURST", str(max(1, per_minute / 10))))
+        if os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower() == "sqlite":
+            bucket = SQLiteTokenBucket(per_minute / 60, burst, os.getenv("RATE_LIMIT_DB_PATH", DEFAULT_BUCKET_PATH))
+        else:
+            bucket = TokenBucket(per_minute / 60, burst)
+    limiter = AdaptiveConcurrencyLimiter(
+        initial=int(os.getenv("MODEL_CONCURRENCY_INITIAL", "4")),
+        minimum=int(os.getenv("MODEL_CONCURRENCY_MIN", "1")),
+        maximum=int(os.getenv("MODEL_CONCURRENCY_MAX", "16")),
+    )
+    return ModelCallGovernor(bucket, limiter, max_wait=float(os.getenv("MODEL_QUEUE_TIMEOUT", "120")))
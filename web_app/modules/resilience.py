@@ -0,0 +1,208 @@
+"""
+Deadlines, retries and hedged requests for model calls
+Each attempt runs under a deadline, retryable failures are retried with
+exponential full-jitter backoff, and a duplicate request can be fired when an
+attempt runs past the observed p95 latency. When calls go through a rate
+limiter slot, the slot is taken before the deadline clock starts, so time
+spent queueing never turns into a timeout and a retry
+"""
+
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Event, Lock
+from typing import Any, Callable, ContextManager, Dict, Optional
+
+from modules.rate_limit import RateLimitTimeout, is_throttle_error
+
+_RETRYABLE_MARKERS = (
+    "timeout", "timed out", "deadline", "unavailable", "503", "500", "502", "504",
+    "internal", "connection", "reset by peer", "temporarily",
+)
+_PERMANENT_MARKERS = ("api_key_invalid", "permission", "invalid argument", "400", "api key expired")
+
+
+class CallTimeout(TimeoutError):
+    """An attempt did not finish within its deadline"""
+
+
+class CallCancelled(RuntimeError):
+    """An attempt was abandoned (timed out, or a hedge won) before it reached the backend"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Transient failures worth another attempt; bad keys and bad requests are not"""
+    if isinstance(error, RateLimitTimeout):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)) or is_throttle_error(error):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    if any(marker in text for marker in _PERMANENT_MARKERS):
+        return False
+    return any(marker in text for marker in _RETRYABLE_MARKERS)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class ResilientCaller:
+    """Runs fn(timeout) with a per-attempt deadline, bounded retries and optional hedging"""
+
+    def __init__(self, deadline: float = 60.0, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, hedge: bool = False, hedge_percentile: float = 0.95,
+                 hedge_min_samples: int = 20, max_threads: int = 32):
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.tracker = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="model-call")
+        self._lock = Lock()
+        self.counters = {"attempts": 0, "retries": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before the given retry attempt (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Latency after which a duplicate request is fired, once enough samples exist"""
+        if not self.hedge or len(self.tracker) < self.hedge_min_samples:
+            return None
+        return self.tracker.percentile(self.hedge_percentile)
+
+    def call(self, fn: Callable[[float], Any], slot: Optional[Callable[..., ContextManager]] = None) -> Any:
+        """Call fn(timeout) until it succeeds, fails permanently or attempts run out
+
+        slot, when given, is a context manager factory (ModelCallGovernor.slot)
+        held around each backend call; its wait is not part of the deadline.
+        """
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self._count("retries")
+                time.sleep(self.backoff(attempt))
+            try:
+                return self._attempt(fn, slot)
+            except Exception as e:
+                if attempt == self.max_attempts - 1 or not is_retryable_error(e):
+                    raise
+
+    def _start(self, fn, timeout, slot, cancelled: Event, max_wait: Optional[float] = None):
+        """Take a slot in the calling thread, then run fn in the pool; the worker gives the slot back"""
+        held = None
+        if slot is not None:
+            held = slot() if max_wait is None else slot(max_wait=max_wait)
+            held.__enter__()
+        return self._executor.submit(self._timed, fn, timeout, held, cancelled)
+
+    @staticmethod
+    def _timed(fn, timeout, held, cancelled: Event):
+        try:
+            if cancelled.is_set():
+                raise CallCancelled("Attempt abandoned before the model was called")
+            start = time.monotonic()
+            result = fn(timeout)
+            latency = time.monotonic() - start
+        except BaseException as e:
+            if held is not None:
+                held.__exit__(type(e), e, e.__traceback__)
+            raise
+        if held is not None:
+            held.__exit__(None, None, None)
+        return result, latency
+
+    def _attempt(self, fn, slot=None):
+        self._count("attempts")
+        # Set once this attempt has a result or gave up, so queued calls never reach the backend
+        cancelled = Event()
+        primary = self._start(fn, self.deadline, slot, cancelled)
+        deadline = time.monotonic() + self.deadline
+        pending = {primary}
+
+        try:
+            hedge_delay = self.hedge_delay()
+            if hedge_delay is not None and hedge_delay < self.deadline:
+                done, _ = wait(pending, timeout=hedge_delay)
+                remaining = deadline - time.monotonic()
+                if not done and remaining > 0:
+                    try:
+                        # A hedge only goes out if a slot is free right now; it never queues
+                        pending.add(self._start(fn, remaining, slot, cancelled, max_wait=0))
+                        self._count("hedges")
+                    except RateLimitTimeout:
+                        pass
+
+            error = None
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        result, latency = future.result()
+                        self.tracker.record(latency)
+                        if future is not primary:
+                            self._count("hedge_wins")
+                        return result
+                    error = future.exception()
+        finally:
+            cancelled.set()
+
+        if pending:
+            self._count("timeouts")
+            raise CallTimeout(f"Model call exceeded the {self.deadline:g}s deadline")
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        p50 = self.tracker.percentile(0.5)
+        p95 = self.tracker.percentile(0.95)
+        stats.update({
+            "deadline_seconds": self.deadline,
+            "max_attempts": self.max_attempts,
+            "hedging": self.hedge,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        })
+        return stats
+
+
+def create_caller_from_env() -> ResilientCaller:
+    """Build the caller from MODEL_CALL_DEADLINE, MODEL_MAX_ATTEMPTS, MODEL_RETRY_* and MODEL_HEDGE_*"""
+    return ResilientCaller(
+        deadline=float(os.getenv("MODEL_CALL_DEADLINE", "60")),
+        max_attempts=int(os.getenv("MODEL_MAX_ATTEMPTS", "3")),
+        base_delay=float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.5")),
+        max_delay=float(os.getenv("MODEL_RETRY_MAX_DELAY", "8")),
+        hedge=os.getenv("MODEL_HEDGE_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on"),
+        hedge_percentile=float(os.getenv("MODEL_HEDGE_PERCENTILE", "0.95")),
+    )
@@ -0,0 +1,168 @@
+"""
+Content-addressed cache for extraction results
+Keys are built from the preprocessed image bytes, the document type and the prompt text,
+so a re-uploaded scan returns the stored result without another model call
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "extraction_cache.sqlite3")
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def image_digest(image: Image.Image) -> str:
+    """Digest of the decoded pixels, independent of the upload's container format"""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def prompt_version(prompt: str) -> str:
+    """Short hash of a prompt so edited prompts never reuse stale results"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class ExtractionCache:
+    """SQLite-backed result cache with TTL and entry-count eviction"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = Lock()
+        self._initialized = False
+        self._init_lock = Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        """CREATE TABLE IF NOT EXISTS results (
+                            key TEXT PRIMARY KEY,
+                            payload TEXT NOT NULL,
+                            created_at REAL NOT NULL,
+                            accessed_at REAL NOT NULL
+                        )"""
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    @staticmethod
+    def make_key(image: Image.Image, doc_type: str, prompt: str) -> str:
+        return f"{image_digest(image)}:{doc_type}:{prompt_version(prompt)}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key, or None on a miss"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT payload, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+            if row is not None:
+                conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+        finally:
+            conn.close()
+
+        with self._counter_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store a successful result and evict expired or least recently used entries"""
+        if not self.enabled:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, payload, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), now, now),
+            )
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                """DELETE FROM results WHERE key IN (
+                    SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM results")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        entries = 0
+        if self.enabled:
+            conn = self._connect()
+            try:
+                entries = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            finally:
+                conn.close()
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def create_cache_from_env() -> ExtractionCache:
+    """Build the cache from EXTRACTION_CACHE_* environment variables"""
+    path = os.getenv("EXTRACTION_CACHE_PATH", DEFAULT_CACHE_PATH)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return ExtractionCache(
+        path=path,
+        ttl_seconds=int(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600))),
+        max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000")),
+        enabled=_env_flag("EXTRACTION_CACHE_ENABLED", "true"),
+    )
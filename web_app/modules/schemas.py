@@ -0,0 +1,137 @@
+"""
+Typed response schemas and tolerant JSON parsing for model output
+Schemas are derived from the JSON template in each PROMPTS entry and sent as
+the model's response schema; the parser recovers JSON wrapped in prose and
+salvages complete fields from truncated objects
+"""
+
+import json
+import re
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+_FIELD_TYPES = {
+    "string": {"type": "string", "nullable": True},
+    "YYYY-MM-DD": {"type": "string", "nullable": True, "description": "Date in YYYY-MM-DD format"},
+    "boolean": {"type": "boolean", "nullable": True},
+}
+
+_parse_stats = {"clean": 0, "recovered": 0, "salvaged": 0, "failed": 0}
+_parse_stats_lock = Lock()
+
+
+def template_fields(prompt: str) -> Dict[str, str]:
+    """Field name -> declared type from the JSON template embedded in a prompt"""
+    return dict(re.findall(r'"(\w+)":\s*"([^"]*)"', prompt[prompt.find("{"):]))
+
+
+def build_schema(prompt: str) -> Dict[str, Any]:
+    """Object schema for the fields a prompt asks for; every field is required but nullable"""
+    fields = template_fields(prompt)
+    return {
+        "type": "object",
+        "properties": {name: dict(_FIELD_TYPES.get(declared, _FIELD_TYPES["string"])) for name, declared in fields.items()},
+        "required": list(fields),
+    }
+
+
+def batch_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Array-of-objects schema for batched requests, with an image_index per item"""
+    item = dict(schema, properties=dict(schema["properties"], image_index={"type": "integer"}))
+    item["required"] = list(schema.get("required", [])) + ["image_index"]
+    return {"type": "array", "items": item}
+
+
+def coerce_record(record: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Bring field values to their schema types (e.g. "true" -> True, 12 -> "12")"""
+    properties = schema.get("properties", {})
+    for name, value in list(record.items()):
+        field_type = properties.get(name, {}).get("type")
+        if value is None or field_type is None:
+            continue
+        if field_type == "boolean" and not isinstance(value, bool):
+            record[name] = str(value).strip().lower() in ("true", "yes", "y", "1", "present")
+        elif field_type == "string" and not isinstance(value, str):
+            record[name] = json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else str(value)
+    return record
+
+
+def _count(outcome: str):
+    with _parse_stats_lock:
+        _parse_stats[outcome] += 1
+
+
+def parse_stats() -> Dict[str, int]:
+    with _parse_stats_lock:
+        return dict(_parse_stats)
+
+
+def _salvage(text: str) -> Optional[Any]:
+    """Close a truncated JSON document at the last point where every member was complete
+
+    Scans once, tracking string state and the bracket stack, and records a
+    cut point before every top-level-or-nested comma and after every closed
+    container. Candidates are tried from the longest down.
+    """
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_string = escape = False
+    for position, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            cuts.append((position + 1, "".join(reversed(stack))))
+            if not stack:
+                break
+        elif char == "," and stack:
+            cuts.append((position, "".join(reversed(stack))))
+
+    for cut, closing in reversed(cuts[-64:]):
+        try:
+            return json.loads(text[:cut] + closing)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_model_json(text: str) -> Any:
+    """Parse model output as JSON, recovering from fences, surrounding prose and truncation
+
+    Raises ValueError only when no complete field can be recovered.
+    """
+    cleaned = text.strip().replace("```json", "").replace("```", "").strip()
+    try:
+        value = json.loads(cleaned)
+        _count("clean")
+        return value
+    except ValueError:
+        pass
+
+    starts = [i for i in (cleaned.find("{"), cleaned.find("[")) if i >= 0]
+    if starts:
+        start = min(starts)
+        try:
+            value, _ = json.JSONDecoder().raw_decode(cleaned, start)
+            _count("recovered")
+            return value
+        except ValueError:
+            value = _salvage(cleaned[start:])
+            if value:
+                _count("salvaged")
+                return value
+
+    _count("failed")
+    raise ValueError(f"No JSON object found in model response: {cleaned[:80]!r}")
@@ -1,4 +1,13 @@
 // Enhanced drag and drop with folder support
+
+// Images, plus scanned PDFs and TIFFs, which the server splits into one item per page
+const SUPPORTED_UPLOAD = /\.(jpe?g|png|tiff?|pdf)$/i;
+
+function isSupportedUpload(file) {
+    return Boolean(file) && ((file.type || '').startsWith('image/') || file.type === 'application/pdf' ||
+        SUPPORTED_UPLOAD.test(file.name || ''));
+}
+
 class DragDropUploader {
     constructor() {
         this.files = [];
@@ -19,7 +28,7 @@ class DragDropUploader {
             uploadMultiple: true,
             parallelUploads: 10,
             maxFilesize: 50,
-            acceptedFiles: 'image/*',
+            acceptedFiles: 'image/*,application/pdf,image/tiff',
             addRemoveLinks: false,
             clickable: true,
             createImageThumbnails: false,
@@ -31,7 +40,7 @@ class DragDropUploader {
         // Set up Dropzone to accept files without processing them
         this.dropzone.on("addedfile", (file) => {
             console.log('Dropzone added file:', file.name);
-            if (file && file.type && file.type.startsWith('image/')) {
+            if (isSupportedUpload(file)) {
                 this.addFiles([file]);
                 this.dropzone.removeFile(file);
             }
@@ -90,7 +99,7 @@ class DragDropUploader {
                     await this.traverseFileTree(entry, newFiles);
                 } else {
                     const file = item.getAsFile();
-                    if (file && file.type.startsWith('image/')) {
+                    if (isSupportedUpload(file)) {
                         newFiles.push(file);
                     }
                 }
@@ -102,7 +111,7 @@ class DragDropUploader {
     }
 
     async traverseFileTree(entry, files, path = "") {
-        if (entry.isFile && entry.name.match(/\.(jpe?g|png)$/i)) {
+        if (entry.isFile && SUPPORTED_UPLOAD.test(entry.name)) {
             try {
                 const file = await this.getFileFromEntry(entry);
                 if (file) files.push(file);
@@ -230,7 +239,8 @@ class DragDropUploader {
         });
 
         try {
-            const response = await fetch('/extract', {
+            // Stream results so each file shows up as soon as it is extracted
+            const response = await fetch('/extract?stream=ndjson', {
                 method: 'POST',
                 body: formData
             });
@@ -239,13 +249,28 @@ class DragDropUploader {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
-            const data = await response.json();
+            const results = [];
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
 
-            // Handle both single and array responses
-            const results = Array.isArray(data) ? data : [data];
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
 
-            this.displayDragDropResults(results);
-            this.showDownloadButtons(results);
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+
+                lines.filter(line => line.trim()).forEach(line => {
+                    const event = JSON.parse(line);
+                    results[event.index] = event.result;
+                });
+
+                const received = results.filter(item => item);
+                this.displayDragDropResults(received);
+                this.showDownloadButtons(received);
+            }
 
         } catch (error) {
             console.error('Error:', error);
@@ -303,7 +328,7 @@ class DragDropUploader {
                 
                 // List each field vertically
                 Object.entries(item).forEach(([key, value]) => {
-                    if (value !== undefined && value !== null && value !== '') {
+                    if (value !== undefined && value !== null && value !== '' && typeof value !== 'object') {
                         html += `
                             <div class="result-item">
                                 <strong>${this.formatHeader(key)}:</strong>
@@ -348,7 +373,7 @@ class DragDropUploader {
     downloadFile(data, format) {
         if (!Array.isArray(data)) data = [data];
 
-        const headers = Object.keys(data[0] || {});
+        const headers = Object.keys(data[0] || {}).filter(key => typeof data[0][key] !== 'object');
         let content = '';
 
         if (format === 'csv') {
@@ -66,7 +66,7 @@ class VisaFormGenerator {
             <h3>Accompanying Family Member ${memberNumber} (同行家族${japaneseNumber})</h3>
             <div class="upload-area">
                 <label for="member${memberNumber}-passport">Upload FM${memberNumber} Passport:</label>
-                <input type="file" id="member${memberNumber}-passport" class="member-file" accept="image/png, image/jpeg, image/jpg" multiple>
+                <input type="file" id="member${memberNumber}-passport" class="member-file" accept="image/png, image/jpeg, image/jpg, image/tiff, application/pdf" multiple>
                 <div class="preview-zone" id="member${memberNumber}-preview">
                     <p>No passport uploaded yet</p>
                 </div>
@@ -147,8 +147,9 @@ class VisaFormGenerator {
         
         this.members[memberType].files = Array.from(files);
         console.log(`Files stored for ${memberType}:`, this.members[memberType].files);
+        this.members[memberType].data = null;
         this.displayPreviews(memberType);
-        this.extractPassportData(memberType);
+        this.updateGenerateButtonState();
     }
 
     displayPreviews(memberType) {
@@ -173,57 +174,14 @@ class VisaFormGenerator {
         }
     }
 
-    async extractPassportData(memberType) {
-        console.log(`extractPassportData called for ${memberType}`);
-        const files = this.members[memberType].files;
-        if (!files.length) {
-            console.log('No files to extract');
-            return;
-        }
-
+    showMemberError(memberType, message) {
         const previewId = this.getPreviewId(memberType);
         const dataElement = document.getElementById(`${previewId}-data`);
-        if (!dataElement) {
-            console.error(`Data element not found for ${previewId}-data`);
-            return;
-        }
-
+        if (!dataElement) return;
         dataElement.style.display = 'block';
-        
-        // Show loading message
         const displayElement = dataElement.querySelector('.data-display');
         if (displayElement) {
-            displayElement.innerHTML = '<div class="loading">Extracting passport data...</div>';
-        }
-        
-        try {
-            const formData = new FormData();
-            formData.append('doc_type', 'US Passport');
-            files.forEach(file => formData.append('file', file));
-
-            console.log(`Sending extraction request for ${memberType}`);
-            const response = await fetch('/extract', {
-                method: 'POST',
-                body: formData
-            });
-            
-            console.log(`Response received for ${memberType}:`, response.status);
-            const result = await response.json();
-            console.log(`Extraction result for ${memberType}:`, result);
-            
-            if (result.length > 0 && !result[0].error) {
-                this.members[memberType].data = result[0];
-                this.displayExtractedData(memberType, result[0]);
-            } else {
-                throw new Error(result[0]?.error || 'Failed to extract data');
-            }
-        } catch (error) {
-            console.error(`Extraction error for ${memberType}:`, error);
-            if (displayElement) {
-                displayElement.innerHTML = `
-                    <div class="error-message">Error: ${error.message}</div>
-                `;
-            }
+            displayElement.innerHTML = `<div class="error-message">Error: ${message}</div>`;
         }
     }
 
@@ -232,6 +190,7 @@ class VisaFormGenerator {
         const dataElement = document.getElementById(`${previewId}-data`);
         const displayElement = dataElement.querySelector('.data-display');
         
+        dataElement.style.display = 'block';
         displayElement.innerHTML = '';
         
         const fields = [
@@ -244,17 +203,35 @@ class VisaFormGenerator {
             { key: 'issuing_authority', label: 'Issuing Authority' }
         ];
 
+        // Editable, so OCR mistakes can be corrected before they go onto the form
         fields.forEach(field => {
             const div = document.createElement('div');
             div.className = 'data-item';
-            div.innerHTML = `
-                <strong>${field.label}:</strong>
-                <span>${data[field.key] || 'N/A'}</span>
-            `;
+            const label = document.createElement('strong');
+            label.textContent = `${field.label}:`;
+            const input = document.createElement('input');
+            input.type = 'text';
+            input.className = 'data-input';
+            input.value = data[field.key] || '';
+            input.addEventListener('input', () => {
+                this.members[memberType].data[field.key] = input.value;
+            });
+            div.appendChild(label);
+            div.appendChild(input);
             displayElement.appendChild(div);
         });
+    }
 
-        this.updateGenerateButtonState();
+    activeMemberKeys() {
+        const memberKeys = ['primary'];
+        for (let i = 1; i <= this.currentMemberCount; i++) {
+            memberKeys.push(`accompanying${i}`);
+        }
+        return memberKeys;
+    }
+
+    allMembersReviewed() {
+        return this.activeMemberKeys().every(memberKey => this.members[memberKey].data);
     }
 
     removeImage(memberType, index) {
@@ -276,12 +253,12 @@ class VisaFormGenerator {
         if (!generateBtn) return;
 
         // Always require primary applicant
-        const hasPrimaryData = this.members.primary.data !== null;
+        const hasPrimaryData = this.members.primary.files.length > 0;
         
-        // Check if all visible family members have data
+        // Check if all visible family members have a passport scan
         let allFamilyMembersReady = true;
         for (let i = 1; i <= this.currentMemberCount; i++) {
-            if (!this.members[`accompanying${i}`].data) {
+            if (!this.members[`accompanying${i}`].files.length) {
                 allFamilyMembersReady = false;
                 break;
             }
@@ -294,6 +271,8 @@ class VisaFormGenerator {
             generateBtn.textContent = 'Upload primary applicant passport first';
         } else if (!allFamilyMembersReady && this.currentMemberCount > 0) {
             generateBtn.textContent = 'Upload all family member passports';
+        } else if (!this.allMembersReviewed()) {
+            generateBtn.textContent = 'Read Passports';
         } else {
             generateBtn.textContent = 'Generate Visa Application Forms';
         }
@@ -301,7 +280,15 @@ class VisaFormGenerator {
 
     async generateForms() {
         if (this.isProcessing) return;
+        // First click reads every passport for review; the next renders the reviewed data
+        if (this.allMembersReviewed()) {
+            await this.renderForms();
+        } else {
+            await this.readPassports();
+        }
+    }
 
+    async withProgress(task) {
         const generateBtn = document.getElementById('generate-forms');
         const loadingContainer = document.getElementById('loading-container');
         const resultsContainer = document.getElementById('results-container');
@@ -314,24 +301,60 @@ class VisaFormGenerator {
                 loadingContainer.style.display = 'block';
                 resultsContainer.style.display = 'none';
             }
+            await task();
+        } catch (error) {
+            console.error('Generation error:', error);
+            this.showError(error.message);
+        } finally {
+            this.isProcessing = false;
+            if (loadingContainer) loadingContainer.style.display = 'none';
+            this.updateGenerateButtonState();
+        }
+    }
 
-            // Prepare member data
-            const memberData = {};
-            
-            // Always include primary
-            if (this.members.primary.data) {
-                memberData.primary = this.members.primary.data;
-            }
-            
-            // Include family members based on current count
-            for (let i = 1; i <= this.currentMemberCount; i++) {
-                const memberKey = `accompanying${i}`;
-                if (this.members[memberKey].data) {
-                    memberData[memberKey] = this.members[memberKey].data;
+    async readPassports() {
+        await this.withProgress(async () => {
+            // One request extracts every member's passport concurrently
+            const formData = new FormData();
+            formData.append('doc_type', 'US Passport');
+            formData.append('preview', 'true');
+            this.activeMemberKeys().forEach(memberKey => {
+                const files = this.members[memberKey].files;
+                if (files.length) formData.append(memberKey, files[0]);
+            });
+
+            const response = await fetch('/api/generate-japanese-forms/from-passports', {
+                method: 'POST',
+                body: formData
+            });
+
+            const result = await response.json();
+
+            // Show what was read from each passport, or why it could not be
+            Object.entries(result.members || {}).forEach(([memberKey, data]) => {
+                if (data.error) {
+                    this.members[memberKey].data = null;
+                    this.showMemberError(memberKey, data.error);
+                } else {
+                    this.members[memberKey].data = data;
+                    this.displayExtractedData(memberKey, data);
                 }
+            });
+
+            if (!result.success) {
+                throw new Error(result.error || 'Failed to read passports');
             }
+        });
+    }
 
-            // Call backend to generate forms
+    async renderForms() {
+        await this.withProgress(async () => {
+            const memberData = {};
+            this.activeMemberKeys().forEach(memberKey => {
+                memberData[memberKey] = this.members[memberKey].data;
+            });
+
+            // Call backend to generate forms from the reviewed data
             const response = await fetch('/api/generate-japanese-forms', {
                 method: 'POST',
                 headers: {
@@ -356,15 +379,7 @@ class VisaFormGenerator {
             } else {
                 throw new Error(result.error || 'Failed to generate forms');
             }
-
-        } catch (error) {
-            console.error('Generation error:', error);
-            this.showError(error.message);
-        } finally {
-            this.isProcessing = false;
-            if (loadingContainer) loadingContainer.style.display = 'none';
-            this.updateGenerateButtonState();
-        }
+        });
     }
 
     displayResults(result) {
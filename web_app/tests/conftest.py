@@ -0,0 +1,46 @@
+"""
+Shared fixtures
+Run from web_app/: python -m pytest. The synthetic passport pages come from
+the document crop benchmark, so tests and bench score the same images.
+"""
+
+import os
+import random
+import sys
+
+import pytest
+from PIL import Image
+
+WEB_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_APP)
+sys.path.insert(0, os.path.join(WEB_APP, "bench"))
+
+from bench_document_crop import photograph, render_page  # noqa: E402
+
+
+@pytest.fixture
+def passport_page():
+    """Tight scan: the 1250x880 data page is the whole frame"""
+    return render_page(random.Random(5))[0]
+
+
+@pytest.fixture
+def passport_photo(passport_page):
+    """(photo, page corners): the page on a textured table, about 30% of the frame"""
+    return photograph(passport_page, random.Random(5))
+
+
+@pytest.fixture
+def a4_copy(passport_page):
+    """Photocopy of the data page near the top of an A4 sheet at 150 dpi"""
+    sheet = Image.new("RGB", (1240, 1754), (250, 250, 250))
+    sheet.paste(passport_page.resize((900, 634)), (170, 150))
+    return sheet
+
+
+@pytest.fixture
+def card_on_bed(passport_page):
+    """ID-1 sized document in the corner of a 300 dpi flatbed scan"""
+    bed = Image.new("RGB", (2480, 3508), (253, 253, 253))
+    bed.paste(passport_page.resize((1011, 712)), (150, 150))
+    return bed
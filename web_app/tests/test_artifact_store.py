@@ -0,0 +1,117 @@
+import os
+import time
+
+import pytest
+
+from modules.artifact_store import ArtifactStore
+
+
+def write_job(store, job_id, size=100):
+    directory = store.job_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, job_id + ".pdf")
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "forms"), ttl_seconds=60, max_bytes=1000, sweep_interval=3600)
+
+
+def test_registered_job_is_served_from_its_path(store):
+    path = write_job(store, "job1")
+    store.register("job1", pdf=path)
+    assert store.get("job1", "pdf") == path
+    assert store.get("job1", "word") is None
+    assert store.get("unknown", "pdf") is None
+
+
+def test_invalid_job_ids_are_refused(store):
+    assert store.get("../etc", "pdf") is None
+    with pytest.raises(ValueError):
+        store.job_dir("../etc")
+
+
+def test_expired_job_is_dropped_with_its_directory(store):
+    path = write_job(store, "old")
+    store.register("old", created_at=time.time() - 120, pdf=path)
+    assert store.get("old", "pdf") is None
+    assert not os.path.exists(os.path.dirname(path))
+
+
+def test_size_cap_evicts_oldest_jobs_first(store):
+    for job_id in ("a", "b", "c"):
+        store.register(job_id, pdf=write_job(store, job_id, size=400))
+    assert store.get("a", "pdf") is None
+    assert store.get("b", "pdf") and store.get("c", "pdf")
+    assert store.stats()["bytes"] == 800
+
+
+def test_job_from_another_process_is_found_on_disk(store):
+    path = write_job(store, "elsewhere")
+    assert store.get("elsewhere", "pdf") == path
+
+
+def test_sweep_removes_expired_directories(store):
+    path = write_job(store, "stale")
+    old = time.time() - 120
+    os.utime(os.path.dirname(path), (old, old))
+    write_job(store, "fresh")
+    assert store.sweep() == 1
+    assert not os.path.exists(os.path.dirname(path))
+    assert store.get("fresh", "pdf")
+
+
+def memory_store(tmp_path, **kwargs):
+    return ArtifactStore(str(tmp_path / "forms"), ttl_seconds=60, max_bytes=10000, sweep_interval=3600,
+                         memory_max_bytes=250, **kwargs)
+
+
+def test_memory_jobs_are_served_as_bytes(tmp_path):
+    store = memory_store(tmp_path)
+    store.put("m1", pdf=b"p" * 100, word=b"w" * 20)
+    assert store.get("m1", "pdf") == b"p" * 100
+    assert store.get("m1", "word") == b"w" * 20
+    assert not os.path.exists(store.job_dir("m1"))
+
+
+def test_least_recently_used_job_spills_to_disk(tmp_path):
+    store = memory_store(tmp_path)
+    store.put("m1", pdf=b"1" * 100)
+    store.put("m2", pdf=b"2" * 100)
+    store.get("m1", "pdf")  # m2 is now the least recently used
+    store.put("m3", pdf=b"3" * 100)
+    assert store.get("m1", "pdf") == b"1" * 100
+    spilled = store.get("m2", "pdf")
+    assert isinstance(spilled, str)
+    with open(spilled, "rb") as f:
+        assert f.read() == b"2" * 100
+    assert store.stats()["spilled"] == 1
+    assert store.stats()["memory_jobs"] == 2
+
+
+def test_overflow_is_dropped_when_spilling_is_off(tmp_path):
+    store = memory_store(tmp_path, spill=False)
+    store.put("m1", pdf=b"1" * 200)
+    store.put("m2", pdf=b"2" * 200)
+    assert store.get("m1", "pdf") is None
+    assert store.get("m2", "pdf") == b"2" * 200
+    assert store.stats()["evicted"] == 1
+
+
+def test_job_larger_than_the_budget_goes_straight_to_disk(tmp_path):
+    store = memory_store(tmp_path)
+    store.put("big", pdf=b"b" * 300)
+    assert isinstance(store.get("big", "pdf"), str)
+    assert store.stats()["memory_jobs"] == 0
+
+
+def test_expired_memory_job_is_dropped(tmp_path, monkeypatch):
+    store = memory_store(tmp_path)
+    store.put("m1", pdf=b"1" * 100)
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.get("m1", "pdf") is None
+    assert store.stats()["memory_bytes"] == 0
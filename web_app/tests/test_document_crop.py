@@ -0,0 +1,42 @@
+import numpy as np
+
+from bench_document_crop import PAGE_SIZE
+from modules.document_crop import find_document_quad, normalise_document
+
+
+def test_tight_scan_has_no_quad(passport_page):
+    # The portrait photo is the largest rectangle on the page; it must not be taken for the document
+    assert find_document_quad(passport_page) is None
+
+
+def test_tight_scan_is_kept_whole(passport_page):
+    image, info = normalise_document(passport_page, 1024)
+    assert info["method"] == "frame"
+    assert info["document_share"] == 1.0
+    assert info["rotation"] == 0
+    assert image.size == PAGE_SIZE
+
+
+def test_photo_quad_matches_page_corners(passport_photo):
+    photo, corners = passport_photo
+    quad = find_document_quad(photo)
+    assert quad is not None
+    expected = np.array(corners)
+    error = [np.min(np.linalg.norm(expected - point, axis=1)) for point in quad]
+    assert max(error) < 0.02 * max(photo.size)
+
+
+def test_photo_is_rectified(passport_photo):
+    image, info = normalise_document(passport_photo[0], 1024)
+    assert info["method"] == "perspective"
+    assert 0.25 < info["document_share"] < 0.35
+    assert abs(image.width / image.height - PAGE_SIZE[0] / PAGE_SIZE[1]) < 0.1
+
+
+def test_padded_scan_is_cropped_to_the_document(card_on_bed):
+    image, info = normalise_document(card_on_bed, 1024)
+    assert info["method"] == "bounding_box"
+    x0, y0, x1, y1 = info["box"]
+    # The card sits at (150, 150)-(1161, 862) on a 2480x3508 bed
+    assert x0 <= 150 and y0 <= 150 and x1 >= 1100 and y1 >= 800
+    assert info["document_share"] < 0.2
@@ -0,0 +1,52 @@
+from modules.mrz import check_digit, find_td3_lines, parse_td3
+
+# ICAO 9303 part 4 specimen
+LINE1 = "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<"
+LINE2 = "L898902C36UTO7408122F1204159ZE184226B<<<<<10"
+
+
+def test_check_digit_matches_specimen():
+    assert check_digit("L898902C3") == "6"
+    assert check_digit("740812") == "2"
+    assert check_digit("120415") == "9"
+    assert check_digit("ZE184226B<<<<<") == "1"
+
+
+def test_parse_td3_specimen():
+    record = parse_td3(LINE1, LINE2)
+    assert record["passport_number"] == "L898902C3"
+    assert record["surname"] == "ERIKSSON"
+    assert record["given_names"] == "ANNA MARIA"
+    assert record["nationality"] == "UTO"
+    assert record["date_of_birth"] == "1974-08-12"
+    assert record["sex"] == "F"
+    assert record["date_of_expiration"] == "2012-04-15"
+    assert record["place_of_birth"] is None
+    assert record["machine_readable_zone"] == f"{LINE1}\n{LINE2}"
+
+
+def test_parse_td3_corrects_ocr_confusions_in_digit_fields():
+    record = parse_td3(LINE1, LINE2.replace("7408122", "74O8I22"))
+    assert record["date_of_birth"] == "1974-08-12"
+
+
+def test_parse_td3_pads_short_lines():
+    assert parse_td3(LINE1.rstrip("<"), LINE2) is not None
+
+
+def test_parse_td3_rejects_bad_check_digit():
+    assert parse_td3(LINE1, LINE2.replace("L898902C36", "L898902C37")) is None
+
+
+def test_parse_td3_rejects_bad_composite():
+    assert parse_td3(LINE1, LINE2[:-1] + "1") is None
+
+
+def test_parse_td3_rejects_non_passport():
+    assert parse_td3("I" + LINE1[1:], LINE2) is None
+
+
+def test_find_td3_lines_skips_surrounding_text():
+    text = f"PASSPORT\nSurname ERIKSSON\n{LINE1[:20]} {LINE1[20:]}\n{LINE2}\n"
+    assert find_td3_lines(text) == (LINE1, LINE2)
+    assert find_td3_lines("no zone here") is None
@@ -0,0 +1,42 @@
+import random
+
+from PIL import ImageFilter
+
+from bench_document_crop import photograph
+from modules.quality import assess_quality, quality_issues
+
+
+def issues(image):
+    return quality_issues(assess_quality(image))
+
+
+def test_tight_scan_passes(passport_page):
+    assert issues(passport_page) == []
+
+
+def test_photo_passes(passport_photo):
+    assert issues(passport_photo[0]) == []
+
+
+def test_margins_do_not_count_against_a_scan(a4_copy, card_on_bed):
+    for scan in (a4_copy, card_on_bed):
+        scores = assess_quality(scan)
+        assert scores["brightness"] < 235
+        assert quality_issues(scores) == []
+
+
+def test_blurry_photo_is_rejected(passport_photo):
+    assert issues(passport_photo[0].filter(ImageFilter.GaussianBlur(6)))[0].startswith("image is blurry")
+
+
+def test_exposure_is_reported_before_blur(passport_photo):
+    photo = passport_photo[0]
+    assert issues(photo.point(lambda v: v // 6)) == ["image is too dark; retake it in better light"]
+    assert issues(photo.point(lambda v: min(255, v + 150)))[0].startswith("image is overexposed")
+
+
+def test_distant_document_is_rejected(passport_page):
+    far, _ = photograph(passport_page, random.Random(5), coverage=0.01)
+    scores = assess_quality(far)
+    assert scores["fill"] < 0.05
+    assert issues(far) == ["the document is too small in the frame; move closer or crop"]
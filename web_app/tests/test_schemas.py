@@ -0,0 +1,37 @@
+import pytest
+
+from modules.schemas import parse_model_json
+
+
+def test_clean_json():
+    assert parse_model_json('{"surname": "DOE"}') == {"surname": "DOE"}
+
+
+def test_code_fences_are_stripped():
+    assert parse_model_json('```json\n{"surname": "DOE"}\n```') == {"surname": "DOE"}
+
+
+def test_json_inside_prose_is_recovered():
+    text = 'Here is the data: {"surname": "DOE", "sex": "F"} Let me know if you need more.'
+    assert parse_model_json(text) == {"surname": "DOE", "sex": "F"}
+
+
+def test_truncated_object_keeps_complete_fields():
+    text = '{"surname": "DOE", "given_names": "JANE", "place_of_birth": "CALIF'
+    assert parse_model_json(text) == {"surname": "DOE", "given_names": "JANE"}
+
+
+def test_truncated_batch_keeps_complete_fields():
+    text = '[{"image_index": 1, "surname": "DOE"}, {"image_index": 2, "surname": "RO'
+    assert parse_model_json(text) == [{"image_index": 1, "surname": "DOE"}, {"image_index": 2}]
+
+
+def test_braces_inside_strings_do_not_confuse_salvage():
+    text = '{"note": "see {page} 2", "surname": "DOE", "sex": '
+    assert parse_model_json(text) == {"note": "see {page} 2", "surname": "DOE"}
+
+
+@pytest.mark.parametrize("text", ["", "Sorry, I cannot read this image.", '{"surname": '])
+def test_unrecoverable_responses_raise(text):
+    with pytest.raises(ValueError):
+        parse_model_json(text)